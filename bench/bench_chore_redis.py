@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+"""
+Benchmarks for the ChoreRedis hot paths
+
+Runs create, get, next, remind and list against the in memory backend and,
+if asked, a real Redis, at several numbers of chores.  Reports ops/sec,
+p50 and p99 latency, round trips and bytes per operation, optionally saving
+JSON results and comparing them to a previous run.
+
+    PYTHONPATH=lib python bench/bench_chore_redis.py --output bench.json
+    PYTHONPATH=lib python bench/bench_chore_redis.py --redis localhost:6379/15 --compare bench.json
+"""
+
+import sys
+import copy
+import json
+import time
+import argparse
+import platform
+
+import redis
+
+import chore_redis
+import chore_backend
+import chore_metrics
+
+
+TEMPLATE = {
+    "text": "get ready",
+    "language": "en",
+    "tasks": [
+        {
+            "text": "wake up",
+            "interval": 0
+        },
+        {
+            "text": "get dressed",
+            "interval": 0
+        },
+        {
+            "text": "brush teeth",
+            "interval": 0
+        }
+    ]
+}
+
+
+class CountingPipeline(object):
+    """
+    Wraps a pipeline, counting bytes per command and a round trip per execute
+    """
+
+    def __init__(self, counter, pipeline):
+
+        self.counter = counter
+        self.pipeline = pipeline
+
+    def __getattr__(self, name):
+
+        method = getattr(self.pipeline, name)
+
+        def command(*args, **kwargs):
+            self.counter.sent += chore_metrics.size(args) + chore_metrics.size(kwargs)
+            method(*args, **kwargs)
+            return self
+
+        return command
+
+    def execute(self):
+
+        self.counter.round_trips += 1
+        results = self.pipeline.execute()
+        self.counter.received += chore_metrics.size(results)
+
+        return results
+
+
+class CountingRedis(object):
+    """
+    Wraps a client, counting round trips and bytes each way
+    """
+
+    def __init__(self, client):
+
+        self.client = client
+        self.round_trips = 0
+        self.sent = 0
+        self.received = 0
+
+    def pipeline(self, transaction=True):
+
+        return CountingPipeline(self, self.client.pipeline(transaction=transaction))
+
+    def __getattr__(self, name):
+
+        method = getattr(self.client, name)
+
+        def command(*args, **kwargs):
+            self.round_trips += 1
+            self.sent += chore_metrics.size(args) + chore_metrics.size(kwargs)
+            result = method(*args, **kwargs)
+            self.received += chore_metrics.size(result)
+            return result
+
+        return command
+
+
+def percentile(latencies, fraction):
+    """
+    Nearest rank percentile of sorted latencies
+    """
+
+    return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+
+def measure(counter, operation, count, setup, run):
+    """
+    Times count runs, each given what setup made for it outside the timing
+    """
+
+    latencies = []
+    round_trips = sent = received = 0
+
+    for index in range(count):
+
+        argument = setup(index)
+
+        before = (counter.round_trips, counter.sent, counter.received)
+        start = time.perf_counter()
+
+        run(argument)
+
+        latencies.append(time.perf_counter() - start)
+        round_trips += counter.round_trips - before[0]
+        sent += counter.sent - before[1]
+        received += counter.received - before[2]
+
+    latencies.sort()
+
+    return {
+        "operation": operation,
+        "ops": count,
+        "ops_per_sec": count / sum(latencies) if sum(latencies) else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "round_trips": round_trips / count,
+        "bytes": (sent + received) / count
+    }
+
+
+def bench(engine, client, chores, ops):
+    """
+    Runs each operation against a client populated with a number of chores
+    """
+
+    counter = CountingRedis(client)
+
+    subject = chore_redis.ChoreRedis(None, None, "bench", backend=counter)
+
+    nodes = [f"bench-{index}" for index in range(chores)]
+
+    # Populate outside of any timing
+
+    created = subject.create_many(TEMPLATE, [("kid", node) for node in nodes], chunk=1000)
+
+    # Store each seeded chore so every timed call does the real transition
+
+    def started(index):
+        chore = copy.deepcopy(created[index % chores])
+        chore["tasks"][0]["notified"] = 0
+        subject.set(chore)
+        return chore
+
+    results = [
+        measure(counter, "create", ops, lambda index: nodes[index % chores],
+                lambda node: subject.create(TEMPLATE, "kid", node)),
+        measure(counter, "get", ops, lambda index: nodes[index % chores], subject.get),
+        measure(counter, "next", ops, started, subject.next),
+        measure(counter, "remind", ops, started, subject.remind),
+        measure(counter, "list", max(3, min(ops, 100000 // chores)), lambda index: None,
+                lambda argument: subject.list())
+    ]
+
+    # Clean up just what we made
+
+    for offset in range(0, chores, 1000):
+        client.delete(*[f"/chore/{node}" for node in nodes[offset:offset + 1000]])
+
+    for result in results:
+        result.update({"engine": engine, "chores": chores})
+
+    return results
+
+
+def compare(results, previous):
+    """
+    Prints how each result's ops/sec changed from a previous run
+    """
+
+    before = {
+        (result["engine"], result["chores"], result["operation"]): result
+        for result in previous["results"]
+    }
+
+    for result in results:
+        key = (result["engine"], result["chores"], result["operation"])
+        if key in before and before[key]["ops_per_sec"]:
+            change = result["ops_per_sec"] / before[key]["ops_per_sec"] - 1
+            print(f"{key[0]:>6} {key[1]:>7} {key[2]:>7} {change:+8.1%}")
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Benchmark ChoreRedis hot paths")
+    parser.add_argument("--chores", default="10,1000,100000", help="comma separated numbers of chores")
+    parser.add_argument("--ops", type=int, default=1000, help="operations per measurement")
+    parser.add_argument("--redis", help="host:port/db of a Redis to also run against")
+    parser.add_argument("--output", help="file to save JSON results to")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare to")
+    args = parser.parse_args(argv)
+
+    engines = [("memory", chore_backend.MemoryBackend)]
+
+    if args.redis:
+        address, _, db = args.redis.partition("/")
+        host, _, port = address.partition(":")
+        engines.append(("redis", lambda: redis.StrictRedis(host=host, port=int(port or 6379), db=int(db or 0))))
+
+    results = []
+
+    print(f"{'engine':>6} {'chores':>7} {'op':>7} {'ops/sec':>10} {'p50 us':>8} {'p99 us':>8} {'trips':>6} {'bytes':>8}")
+
+    for engine, client in engines:
+        for chores in [int(chores) for chores in args.chores.split(",")]:
+            for result in bench(engine, client(), chores, args.ops):
+                results.append(result)
+                print(
+                    f"{engine:>6} {chores:>7} {result['operation']:>7} {result['ops_per_sec']:>10.0f} "
+                    f"{result['p50'] * 1e6:>8.1f} {result['p99'] * 1e6:>8.1f} "
+                    f"{result['round_trips']:>6.1f} {result['bytes']:>8.0f}"
+                )
+
+    if args.compare:
+        with open(args.compare, "r") as previous:
+            compare(results, json.load(previous))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({
+                "timestamp": time.time(),
+                "python": platform.python_version(),
+                "results": results
+            }, output, indent=2)
+
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Replays a trace recorded with chore_trace.Recorder as fast as possible
+
+    PYTHONPATH=lib python bench/replay_trace.py morning.jsonl.gz
+    PYTHONPATH=lib python bench/replay_trace.py morning.jsonl.gz --redis localhost:6379/15
+"""
+
+import sys
+import json
+import argparse
+
+import redis
+
+import chore_redis
+import chore_trace
+import chore_backend
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Replay a ChoreRedis trace")
+    parser.add_argument("trace", help="trace file, gzipped if it ends in .gz")
+    parser.add_argument("--redis", help="host:port/db of a Redis to replay against instead of in memory")
+    args = parser.parse_args(argv)
+
+    if args.redis:
+        address, _, db = args.redis.partition("/")
+        host, _, port = address.partition(":")
+        backend = redis.StrictRedis(host=host, port=int(port or 6379), db=int(db or 0))
+    else:
+        backend = chore_backend.MemoryBackend()
+
+    report = chore_trace.Replayer(args.trace).replay(chore_redis.ChoreRedis(None, None, "speech", backend=backend))
+
+    print(json.dumps(report, indent=2))
+
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
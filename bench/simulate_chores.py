@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Simulates a day (or however long) of chores on virtual time
+
+    PYTHONPATH=lib python bench/simulate_chores.py --nodes 5000 --hours 2 --sweep 10
+"""
+
+import sys
+import json
+import argparse
+
+import chore_simulator
+
+
+TEMPLATE = {
+    "text": "get ready",
+    "language": "en",
+    "tasks": [
+        {
+            "text": "wake up",
+            "interval": 60
+        },
+        {
+            "text": "get dressed",
+            "interval": 60
+        },
+        {
+            "text": "brush teeth",
+            "delay": 30,
+            "interval": 90
+        }
+    ]
+}
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Simulate chores on virtual time")
+    parser.add_argument("--nodes", type=int, default=1000, help="number of virtual nodes")
+    parser.add_argument("--hours", type=float, default=1, help="virtual hours to run for")
+    parser.add_argument("--sweep", type=float, default=10, help="seconds between reminder sweeps")
+    parser.add_argument("--pace", type=float, default=120, help="average seconds a kid takes per task")
+    parser.add_argument("--seed", type=int, help="random seed, for repeatable runs")
+    args = parser.parse_args(argv)
+
+    simulator = chore_simulator.Simulator(TEMPLATE, args.nodes, sweep=args.sweep, pace=args.pace, seed=args.seed)
+    report = simulator.run(args.hours * 3600)
+
+    print(json.dumps(report, indent=2))
+
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
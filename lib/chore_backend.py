@@ -0,0 +1,544 @@
+"""
+Storage backends for chores
+
+ChoreRedis only uses a small part of the StrictRedis interface, so a backend
+is anything providing get, set, mget, scan, scan_iter, keys, delete, publish
+and pipeline, plus lists (lpush, ltrim, lrange), hashes (hset, hdel, hincrby,
+hincrbyfloat, hgetall), streams (XADD, XRANGE through execute_command), the
+PUBLISH_ONCE script (register_script, evalsha and script_load), config_get
+and config_set for keyspace notifications and lock for locking in Redis for
+the optional features.  redis.StrictRedis is the Redis engine.  MemoryBackend
+is the in process engine for single node setups and tests.
+"""
+
+import time
+import uuid
+import hashlib
+import queue
+import fnmatch
+import threading
+
+import redis
+
+
+# Publishes only if the key isn't set, setting it for so many seconds, so
+# something's only said once however many times it's sent
+
+PUBLISH_ONCE = """
+if redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[1]) then
+    return redis.call('PUBLISH', ARGV[2], ARGV[3])
+end
+return -1
+"""
+
+
+def sha(script):
+    """
+    The SHA1 Redis knows a script by
+    """
+
+    return hashlib.sha1(script.encode("utf-8")).hexdigest()
+
+
+def encode(value):
+    """
+    Stores values the way Redis returns them, as bytes
+    """
+
+    if isinstance(value, bytes):
+        return value
+
+    if isinstance(value, float):
+        return repr(value).encode("utf-8")
+
+    return str(value).encode("utf-8")
+
+
+class MemoryPipeline(object):
+    """
+    Queues commands and runs them all at once, atomically, on execute
+    """
+
+    def __init__(self, backend):
+
+        self.backend = backend
+        self.commands = []
+
+        # Like redis-py's, for scripts to load before running, though we
+        # already know all of ours
+
+        self.scripts = set()
+
+    def __getattr__(self, name):
+
+        method = getattr(self.backend, name)
+
+        def command(*args, **kwargs):
+            self.commands.append((method, args, kwargs))
+            return self
+
+        return command
+
+    def execute(self):
+
+        commands, self.commands = self.commands, []
+
+        with self.backend.mutex:
+            return [method(*args, **kwargs) for method, args, kwargs in commands]
+
+
+class MemoryScript(object):
+    """
+    Runs a script by its SHA1, loading it if that's not known, like the
+    redis-py Script register_script gives
+    """
+
+    def __init__(self, backend, script):
+
+        self.backend = backend
+        self.script = script
+        self.sha = sha(script)
+
+    def __call__(self, keys=[], args=[], client=None):
+
+        client = self.backend if client is None else client
+        args = tuple(keys) + tuple(args)
+
+        try:
+            return client.evalsha(self.sha, len(keys), *args)
+        except redis.exceptions.NoScriptError:
+            self.sha = client.script_load(self.script)
+            return client.evalsha(self.sha, len(keys), *args)
+
+
+class MemoryPubSub(object):
+    """
+    Subscriber, giving messages in the same form as redis-py's PubSub
+    """
+
+    def __init__(self, backend):
+
+        self.backend = backend
+        self.channels = set()
+        self.patterns = set()
+        self.messages = queue.Queue()
+
+    def subscribe(self, *channels):
+
+        with self.backend.mutex:
+            self.channels.update(encode(channel) for channel in channels)
+            self.backend.subscribers.add(self)
+
+    def psubscribe(self, *patterns):
+
+        with self.backend.mutex:
+            self.patterns.update(encode(pattern) for pattern in patterns)
+            self.backend.subscribers.add(self)
+
+    def unsubscribe(self, *channels):
+
+        with self.backend.mutex:
+            self.channels.difference_update(encode(channel) for channel in channels or list(self.channels))
+
+    def punsubscribe(self, *patterns):
+
+        with self.backend.mutex:
+            self.patterns.difference_update(encode(pattern) for pattern in patterns or list(self.patterns))
+
+    def close(self):
+
+        with self.backend.mutex:
+            self.channels.clear()
+            self.patterns.clear()
+            self.backend.subscribers.discard(self)
+
+    def deliver(self, channel, data):
+        """
+        Queues a published message if we're interested, returning how many times
+        """
+
+        delivered = 0
+
+        if channel in self.channels:
+            self.messages.put({"type": "message", "pattern": None, "channel": channel, "data": data})
+            delivered += 1
+
+        for pattern in self.patterns:
+            if fnmatch.fnmatchcase(channel.decode("utf-8"), pattern.decode("utf-8")):
+                self.messages.put({"type": "pmessage", "pattern": pattern, "channel": channel, "data": data})
+                delivered += 1
+
+        return delivered
+
+    def get_message(self, ignore_subscribe_messages=False, timeout=0):
+
+        try:
+            return self.messages.get(timeout=timeout) if timeout else self.messages.get_nowait()
+        except queue.Empty:
+            return None
+
+    def listen(self):
+
+        while self.channels or self.patterns:
+            yield self.messages.get()
+
+
+class MemoryLock(object):
+    """
+    Lock held by setting a key to a token only we know, like redis-py's Lock
+    """
+
+    def __init__(self, backend, name, timeout=None, sleep=0.1, blocking_timeout=None):
+
+        self.backend = backend
+        self.name = name
+        self.timeout = timeout
+        self.sleep = sleep
+        self.blocking_timeout = blocking_timeout
+        self.token = None
+
+    def acquire(self, blocking=True, blocking_timeout=None):
+
+        token = uuid.uuid4().hex
+        blocking_timeout = blocking_timeout if blocking_timeout is not None else self.blocking_timeout
+        stop = None if blocking_timeout is None else time.time() + blocking_timeout
+
+        while not self.backend.set(self.name, token, ex=self.timeout, nx=True):
+            if not blocking or (stop is not None and time.time() >= stop):
+                return False
+            time.sleep(self.sleep)
+
+        self.token = token
+
+        return True
+
+    def release(self):
+
+        with self.backend.mutex:
+
+            if self.token is None or self.backend.get(self.name) != self.token.encode("utf-8"):
+                raise redis.exceptions.LockError("Cannot release a lock that's no longer owned")
+
+            self.backend.delete(self.name)
+            self.token = None
+
+    def __enter__(self):
+
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+
+        self.release()
+
+
+class MemoryBackend(object):
+    """
+    Thread safe, in process stand in for Redis, expiring keys and making
+    stream ids by clock, like the one ChoreRedis is given
+    """
+
+    def __init__(self, clock=None):
+
+        self.clock = clock
+        self.mutex = threading.RLock()
+        self.data = {}
+        self.expires = {}
+        self.subscribers = set()
+        self.sequence = (0, 0)
+        self.config = {"notify-keyspace-events": ""}
+
+    def now(self):
+        """
+        The time according to our clock if we have one, else the real time
+        """
+
+        return self.clock() if self.clock is not None else time.time()
+
+    def config_get(self, pattern="*"):
+
+        with self.mutex:
+            return {name: value for name, value in self.config.items() if fnmatch.fnmatchcase(name, pattern)}
+
+    def config_set(self, name, value):
+
+        with self.mutex:
+            self.config[name] = value
+            return True
+
+    def notify(self, key, event, kind):
+        """
+        Publishes a keyspace notification if they're on for this kind of event
+        """
+
+        flags = self.config["notify-keyspace-events"]
+
+        if "K" in flags and (kind in flags or "A" in flags):
+            self.publish(f"__keyspace@0__:{key}", event)
+
+    def live(self, key):
+        """
+        Whether a key exists, dropping it if it's expired
+        """
+
+        if key in self.expires and self.expires[key] <= self.now():
+            del self.data[key]
+            del self.expires[key]
+            self.notify(key, "expired", "x")
+
+        return key in self.data
+
+    def pipeline(self, transaction=True):
+
+        return MemoryPipeline(self)
+
+    def pubsub(self):
+
+        return MemoryPubSub(self)
+
+    def lock(self, name, timeout=None, sleep=0.1, blocking_timeout=None):
+
+        return MemoryLock(self, name, timeout, sleep, blocking_timeout)
+
+    def publish(self, channel, message):
+
+        channel = encode(channel)
+        message = encode(message)
+
+        with self.mutex:
+            return sum(subscriber.deliver(channel, message) for subscriber in list(self.subscribers))
+
+    def get(self, key):
+
+        with self.mutex:
+            return self.data[key] if self.live(key) else None
+
+    def set(self, key, value, ex=None, nx=False):
+
+        with self.mutex:
+
+            if nx and self.live(key):
+                return None
+
+            self.data[key] = encode(value)
+            self.expires.pop(key, None)
+
+            if ex is not None:
+                self.expires[key] = self.now() + ex
+
+            self.notify(key, "set", "$")
+
+            return True
+
+    def mget(self, keys):
+
+        with self.mutex:
+            return [self.data[key] if self.live(key) else None for key in keys]
+
+    def delete(self, *keys):
+
+        with self.mutex:
+            deleted = [key for key in keys if self.live(key)]
+            for key in deleted:
+                del self.data[key]
+                self.expires.pop(key, None)
+                self.notify(key, "del", "g")
+            return len(deleted)
+
+    def expire(self, key, seconds):
+
+        with self.mutex:
+            if not self.live(key):
+                return False
+            self.expires[key] = self.now() + seconds
+            self.notify(key, "expire", "g")
+            return True
+
+    def keys(self, pattern="*"):
+
+        with self.mutex:
+            return [
+                key.encode("utf-8") for key in list(self.data)
+                if fnmatch.fnmatchcase(key, pattern) and self.live(key)
+            ]
+
+    def scan(self, cursor=0, match=None, count=None):
+
+        keys = sorted(self.keys(match or "*"))
+        start = int(cursor)
+        end = start + (count or 10)
+
+        return (end if end < len(keys) else 0), keys[start:end]
+
+    def scan_iter(self, match=None, count=None):
+
+        return iter(self.keys(match or "*"))
+
+    def lpush(self, key, *values):
+
+        with self.mutex:
+            items = self.data[key] if self.live(key) else []
+            items[0:0] = [encode(value) for value in reversed(values)]
+            self.data[key] = items
+            return len(items)
+
+    def ltrim(self, key, start, stop):
+
+        with self.mutex:
+            if self.live(key):
+                self.data[key] = self.data[key][start:stop + 1 if stop != -1 else None]
+            return True
+
+    def lrange(self, key, start, stop):
+
+        with self.mutex:
+            return list(self.data[key][start:stop + 1 if stop != -1 else None]) if self.live(key) else []
+
+    def hset(self, key, field, value):
+
+        with self.mutex:
+            if not self.live(key):
+                self.data[key] = {}
+            added = encode(field) not in self.data[key]
+            self.data[key][encode(field)] = encode(value)
+            return int(added)
+
+    def hdel(self, key, *fields):
+
+        with self.mutex:
+            if not self.live(key):
+                return 0
+            deleted = [field for field in map(encode, fields) if self.data[key].pop(field, None) is not None]
+            if not self.data[key]:
+                del self.data[key]
+            return len(deleted)
+
+    def hincrby(self, key, field, amount=1):
+
+        with self.mutex:
+            if not self.live(key):
+                self.data[key] = {}
+            fields = self.data[key]
+            fields[encode(field)] = encode(int(fields.get(encode(field), b"0")) + amount)
+            return int(fields[encode(field)])
+
+    def hincrbyfloat(self, key, field, amount=1.0):
+
+        with self.mutex:
+            if not self.live(key):
+                self.data[key] = {}
+            fields = self.data[key]
+            fields[encode(field)] = encode(float(fields.get(encode(field), b"0")) + amount)
+            return float(fields[encode(field)])
+
+    def hgetall(self, key):
+
+        with self.mutex:
+            return dict(self.data[key]) if self.live(key) else {}
+
+    def execute_command(self, command, *args):
+        """
+        Just the stream commands, which redis-py 2.10 doesn't wrap
+        """
+
+        if command == "XADD":
+            return self.xadd(*args)
+
+        if command == "XRANGE":
+            return self.xrange(*args)
+
+        # Like Redis would for a command it doesn't have
+
+        raise redis.ResponseError(f"unknown command '{command}', not supported in memory")
+
+    def register_script(self, script):
+
+        return MemoryScript(self, script)
+
+    def script_load(self, script):
+
+        if script != PUBLISH_ONCE:
+            raise redis.ResponseError("only PUBLISH_ONCE is supported in memory")
+
+        return sha(script)
+
+    def evalsha(self, digest, numkeys, *args):
+        """
+        Runs the scripts ChoreRedis runs, which are always loaded
+        """
+
+        if digest != sha(PUBLISH_ONCE):
+            raise redis.exceptions.NoScriptError("No matching script. Please use EVAL.")
+
+        return self.publish_once(*args)
+
+    def publish_once(self, key, seconds, channel, message):
+
+        with self.mutex:
+
+            if not self.set(key, 1, ex=int(seconds), nx=True):
+                return -1
+
+            return self.publish(channel, message)
+
+    def xadd(self, key, *args):
+
+        # Pull out the optional MAXLEN, the (always generated) id and the fields
+
+        maxlen = None
+
+        if args[0] == "MAXLEN":
+            args = args[1:]
+            if args[0] in ["~", "="]:
+                args = args[1:]
+            maxlen, args = int(args[0]), args[1:]
+
+        values = [encode(value) for value in args[1:]]
+
+        with self.mutex:
+
+            # Ids are milliseconds and a sequence within the same millisecond
+
+            milliseconds = int(self.now() * 1000)
+
+            if milliseconds <= self.sequence[0]:
+                self.sequence = (self.sequence[0], self.sequence[1] + 1)
+            else:
+                self.sequence = (milliseconds, 0)
+
+            entry = f"{self.sequence[0]}-{self.sequence[1]}".encode("utf-8")
+
+            if not self.live(key):
+                self.data[key] = []
+            stream = self.data[key]
+            stream.append([entry, values])
+
+            if maxlen is not None:
+                del stream[:-maxlen or len(stream)]
+
+            return entry
+
+    def xrange(self, key, start, end, *args):
+
+        count = int(args[1]) if args and args[0] == "COUNT" else None
+
+        # Ends without a sequence include the whole millisecond
+
+        def position(id, default, sequence=0):
+            if id in ["-", "+"]:
+                return default
+            milliseconds, _, given = (id.decode("utf-8") if isinstance(id, bytes) else str(id)).partition("-")
+            return (int(milliseconds), int(given) if given else sequence)
+
+        low = position(start, (0, 0))
+        high = position(end, (float("inf"), 0), float("inf"))
+
+        with self.mutex:
+
+            entries = [
+                [entry, list(values)]
+                for entry, values in (self.data[key] if self.live(key) else [])
+                if low <= position(entry, None) <= high
+            ]
+
+        return entries[:count] if count is not None else entries
@@ -0,0 +1,148 @@
+"""
+Hooks around ChoreRedis calls and the Redis commands they make
+
+A hook gets before() and after() for every ChoreRedis call (kind "call")
+and every Redis command (kind "command", with pipelines as one "execute"
+command listing what was queued).  Each gets a context dict that's the same
+object in both, so hooks can keep things like spans in it, and after() gets
+the seconds taken and the exception if one was raised.  Calls carry the chore
+id, action and task id they're working on.  Commands carry the call they were
+made from as "parent".
+"""
+
+import time
+import threading
+import contextlib
+
+
+class Hook(object):
+    """
+    Does nothing, so hooks only need what they care about
+    """
+
+    def before(self, kind, name, context):
+        pass
+
+    def after(self, kind, name, context, seconds, error):
+        pass
+
+
+class Hooks(object):
+    """
+    Runs a list of hooks around things, tracking the calls each thread is in
+    """
+
+    def __init__(self, hooks):
+
+        self.hooks = list(hooks)
+        self.local = threading.local()
+
+    def stack(self):
+        """
+        This thread's calls, innermost last
+        """
+
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+
+        return self.local.stack
+
+    @contextlib.contextmanager
+    def around(self, kind, name, context):
+        """
+        Runs the hooks before and after whatever's in the block
+        """
+
+        stack = self.stack()
+        context["parent"] = stack[-1] if stack else None
+
+        for hook in self.hooks:
+            hook.before(kind, name, context)
+
+        if kind == "call":
+            stack.append(context)
+
+        error = None
+        start = time.perf_counter()
+
+        try:
+            yield context
+        except Exception as exception:
+            error = exception
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+
+            if kind == "call":
+                stack.pop()
+
+            for hook in reversed(self.hooks):
+                hook.after(kind, name, context, seconds, error)
+
+    def wrap(self, client):
+
+        return HookedRedis(self, client)
+
+
+class HookedPipeline(object):
+    """
+    Queues commands, running the hooks around the execute
+    """
+
+    def __init__(self, hooks, pipeline):
+
+        self.hooks = hooks
+        self.pipeline = pipeline
+        self.commands = []
+
+    def __getattr__(self, name):
+
+        method = getattr(self.pipeline, name)
+
+        if not callable(method):
+            return method
+
+        def command(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            method(*args, **kwargs)
+            return self
+
+        return command
+
+    def execute(self):
+
+        commands, self.commands = self.commands, []
+
+        with self.hooks.around("command", "execute", {"commands": commands}) as context:
+            context["result"] = self.pipeline.execute()
+
+        return context["result"]
+
+
+class HookedRedis(object):
+    """
+    Runs the hooks around each command, passing everything else through
+    """
+
+    def __init__(self, hooks, client):
+
+        self.hooks = hooks
+        self.client = client
+
+    def pipeline(self, transaction=True):
+
+        return HookedPipeline(self.hooks, self.client.pipeline(transaction=transaction))
+
+    def __getattr__(self, name):
+
+        attribute = getattr(self.client, name)
+
+        if not callable(attribute) or name in ["pubsub", "lock", "register_script"]:
+            return attribute
+
+        def command(*args, **kwargs):
+            with self.hooks.around("command", name, {"args": args, "kwargs": kwargs}) as context:
+                context["result"] = attribute(*args, **kwargs)
+            return context["result"]
+
+        return command
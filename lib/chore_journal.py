@@ -0,0 +1,116 @@
+"""
+Local write ahead journal for chores
+
+When Redis can't be reached, ChoreRedis appends chores it couldn't set to a
+Journal on disk instead of losing them.  Once Redis is back the journal's
+replayed in pipelined batches, the newest version of each chore winning over
+whatever's in Redis, then cleared.
+"""
+
+import os
+import json
+import threading
+
+
+def version(chore):
+    """
+    When a chore last changed, the latest of all its timestamps
+    """
+
+    stamps = [chore.get(field, 0) for field in ["start", "end", "notified"]]
+
+    for task in chore.get("tasks", []):
+        stamps.extend(task.get(field, 0) for field in ["start", "end", "notified"])
+
+    return max(stamps)
+
+
+class Journal(object):
+    """
+    Append only file of chores waiting to be set
+    """
+
+    def __init__(self, path, sync=True):
+
+        self.path = path
+        self.sync = sync
+        self.lock = threading.Lock()
+
+        # Anything left from before we (re)started still needs replaying
+
+        self.pending = os.path.exists(path) and os.path.getsize(path) > 0
+
+    def append(self, chore):
+
+        line = json.dumps({"version": version(chore), "chore": chore}, separators=(",", ":"))
+
+        with self.lock:
+            with open(self.path, "a") as journal:
+                journal.write(line + "\n")
+                if self.sync:
+                    journal.flush()
+                    os.fsync(journal.fileno())
+            self.pending = True
+
+    def entries(self):
+        """
+        The latest entry for each chore, in the order they were last journaled
+        """
+
+        latest = {}
+
+        with self.lock:
+
+            if not os.path.exists(self.path):
+                return []
+
+            with open(self.path, "r") as journal:
+                for line in journal:
+
+                    # A crash mid write can leave a partial last line
+
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+
+                    latest.pop(entry["chore"]["id"], None)
+                    latest[entry["chore"]["id"]] = entry
+
+        return list(latest.values())
+
+    def replay(self, chore_redis, batch=100):
+        """
+        Sets journaled chores unless Redis has a newer version, then clears the
+        journal.  If Redis fails partway, or more was journaled meanwhile, the
+        journal's kept for next time, replaying being safe to repeat.
+        """
+
+        with self.lock:
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+        entries = self.entries()
+        replayed = skipped = 0
+
+        for offset in range(0, len(entries), batch):
+
+            chunk = entries[offset:offset + batch]
+            current = chore_redis.get_many([entry["chore"]["id"] for entry in chunk])
+
+            with chore_redis.batch():
+                for entry, stored in zip(chunk, current):
+                    if stored is not None and version(stored) > entry["version"]:
+                        skipped += 1
+                    else:
+                        chore_redis.set(entry["chore"])
+                        replayed += 1
+
+        with self.lock:
+            if not os.path.exists(self.path) or os.path.getsize(self.path) == size:
+                open(self.path, "w").close()
+                self.pending = False
+
+        return {
+            "replayed": replayed,
+            "skipped": skipped
+        }
@@ -0,0 +1,123 @@
+"""
+What chores say, in the chore's language
+
+A Catalog has the phrases for each kind of thing said, by language, falling
+back to the default language for any it doesn't have.  Each phrase is looked
+up and compiled into a renderer only once, and the JSON message for the
+speaking channel is serialized ahead of time for each language, leaving just
+the timestamp, node and text to fill in.
+"""
+
+import json
+import json.encoder
+
+
+# {text} is the chore or task's text, addressed to the {person}
+
+MESSAGES = {
+    "en": {
+        "address": "{person}, {text}",
+        "start": "time to {text}",
+        "please": "please {text}",
+        "wait": "you do not have to {text} yet",
+        "resume": "you do have to {text} now",
+        "did": "you did {text}",
+        "finished": "thank you. You did {text}",
+        "skip": "you do not have to {text}",
+        "unskip": "you do have to {text}",
+        "undone": "I'm sorry but you did not {text} yet"
+    },
+    "es": {
+        "address": "{person}, {text}",
+        "start": "es hora de {text}",
+        "please": "por favor, {text}",
+        "wait": "todavía no tienes que {text}",
+        "resume": "ahora sí tienes que {text}",
+        "did": "ya terminaste de {text}",
+        "finished": "gracias. Terminaste de {text}",
+        "skip": "no tienes que {text}",
+        "unskip": "sí tienes que {text}",
+        "undone": "lo siento, pero todavía no terminaste de {text}"
+    },
+    "fr": {
+        "address": "{person}, {text}",
+        "start": "c'est l'heure de {text}",
+        "please": "s'il te plaît, {text}",
+        "wait": "tu n'as pas encore à {text}",
+        "resume": "maintenant tu dois {text}",
+        "did": "tu as fini de {text}",
+        "finished": "merci. Tu as fini de {text}",
+        "skip": "tu n'as pas à {text}",
+        "unskip": "tu dois {text}",
+        "undone": "désolé, mais tu n'as pas encore fini de {text}"
+    }
+}
+
+# Same as json.dumps gives for a string, without the overhead
+
+encode = json.encoder.encode_basestring_ascii
+
+
+class Catalog(object):
+    """
+    Phrases by language, compiled and cached on first use
+    """
+
+    def __init__(self, messages=None, default="en"):
+
+        # Start with ours, and add or replace with any given
+
+        self.messages = {language: dict(phrases) for language, phrases in MESSAGES.items()}
+
+        for language, phrases in (messages or {}).items():
+            self.messages.setdefault(language, {}).update(phrases)
+
+        self.default = default
+        self.renderers = {}
+        self.envelopes = {}
+
+    def renderer(self, language, kind):
+        """
+        Function filling in a kind of phrase in a language, or the default
+        language if we don't have it in that one
+        """
+
+        try:
+            return self.renderers[(language, kind)]
+        except KeyError:
+            pass
+
+        phrases = self.messages.get(language, {})
+        template = phrases[kind] if kind in phrases else self.messages[self.default][kind]
+
+        self.renderers[(language, kind)] = template.format
+
+        return self.renderers[(language, kind)]
+
+    def render(self, language, kind, **fields):
+
+        return self.renderer(language, kind)(**fields)
+
+    def envelope(self, language):
+        """
+        The message as JSON, with just the timestamp, node and text to fill in
+        """
+
+        try:
+            return self.envelopes[language]
+        except KeyError:
+            pass
+
+        self.envelopes[language] = (
+            '{"timestamp": %s, "node": %s, "text": %s, "language": ' +
+            json.dumps(language).replace("%", "%%") + '}'
+        )
+
+        return self.envelopes[language]
+
+    def message(self, timestamp, node, language, text):
+        """
+        The JSON message for the speaking channel, as json.dumps would make it
+        """
+
+        return self.envelope(language) % (repr(timestamp), encode(node), encode(text))
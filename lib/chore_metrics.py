@@ -0,0 +1,256 @@
+"""
+Metrics for chores, in Prometheus text format
+
+A Registry holds counters, gauges and histograms.  Instrumentation is a
+hook timing ChoreRedis calls and counting the Redis commands, round trips
+and bytes each one takes.
+"""
+
+import bisect
+import threading
+
+# Installed, these are in the pi_k8s_fitches package, else on the path
+
+try:
+    from . import chore_hooks
+except ImportError:
+    import chore_hooks
+
+
+LATENCY = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+COUNTS = [1, 2, 3, 5, 10, 25, 50, 100, 250, 1000]
+BYTES = [64, 256, 1024, 4096, 16384, 65536, 262144, 1048576]
+
+
+def size(value):
+    """
+    Roughly how many bytes something is on the wire
+    """
+
+    if isinstance(value, bytes):
+        return len(value)
+
+    if isinstance(value, (list, tuple)):
+        return sum(size(item) for item in value)
+
+    if isinstance(value, dict):
+        return sum(size(key) + size(item) for key, item in value.items())
+
+    if value is None:
+        return 0
+
+    return len(str(value).encode("utf-8"))
+
+
+def labeled(name, labels, extra=None):
+    """
+    Formats a sample name with its labels
+    """
+
+    pairs = list(labels) + ([extra] if extra else [])
+
+    if not pairs:
+        return name
+
+    return name + "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class Metric(object):
+    """
+    Values by labels, guarded by the registry's lock
+    """
+
+    kind = None
+
+    def __init__(self, registry, name, help):
+
+        self.lock = registry.lock
+        self.name = name
+        self.help = help
+        self.values = {}
+
+    def lines(self):
+
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+        for labels, value in sorted(self.values.items()):
+            yield f"{labeled(self.name, labels)} {value}"
+
+
+class Counter(Metric):
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+
+        labels = tuple(sorted(labels.items()))
+
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+
+        with self.lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+
+class Histogram(Metric):
+
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, buckets):
+
+        super(Histogram, self).__init__(registry, name, help)
+        self.buckets = list(buckets)
+
+    def observe(self, value, **labels):
+
+        labels = tuple(sorted(labels.items()))
+
+        with self.lock:
+
+            # Each is counts per bucket, sum and count
+
+            counts, total, count = self.values.get(labels, ([0] * len(self.buckets), 0, 0))
+            counts = list(counts)
+
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(counts):
+                counts[index] += 1
+
+            self.values[labels] = (counts, total + value, count + 1)
+
+    def lines(self):
+
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+        for labels, (counts, total, count) in sorted(self.values.items()):
+
+            cumulative = 0
+
+            for bucket, bucketed in zip(self.buckets, counts):
+                cumulative += bucketed
+                yield f"{labeled(self.name + '_bucket', labels, ('le', bucket))} {cumulative}"
+
+            yield f"{labeled(self.name + '_bucket', labels, ('le', '+Inf'))} {count}"
+            yield f"{labeled(self.name + '_sum', labels)} {total}"
+            yield f"{labeled(self.name + '_count', labels)} {count}"
+
+
+class Registry(object):
+    """
+    Holds metrics by name, creating them as they're first asked for
+    """
+
+    def __init__(self):
+
+        self.lock = threading.RLock()
+        self.metrics = {}
+
+    def metric(self, kind, name, help, *args):
+
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = kind(self, name, help, *args)
+            return self.metrics[name]
+
+    def counter(self, name, help):
+
+        return self.metric(Counter, name, help)
+
+    def gauge(self, name, help):
+
+        return self.metric(Gauge, name, help)
+
+    def histogram(self, name, help, buckets=LATENCY):
+
+        return self.metric(Histogram, name, help, buckets)
+
+    def exposition(self):
+        """
+        All metrics in the Prometheus text format
+        """
+
+        with self.lock:
+            return "".join(
+                line + "\n"
+                for name in sorted(self.metrics)
+                for line in self.metrics[name].lines()
+            )
+
+
+class Instrumentation(chore_hooks.Hook):
+    """
+    Hook recording ChoreRedis calls and the Redis work done for them
+    """
+
+    def __init__(self, registry):
+
+        self.registry = registry
+        self.local = threading.local()
+
+        self.seconds = registry.histogram("chore_redis_call_seconds", "ChoreRedis call latency")
+        self.errors = registry.counter("chore_redis_call_errors_total", "ChoreRedis calls that raised")
+        self.commands = registry.histogram("chore_redis_call_commands", "Redis commands per ChoreRedis call", COUNTS)
+        self.trips = registry.histogram("chore_redis_call_round_trips", "Redis round trips per ChoreRedis call", COUNTS)
+        self.bytes = registry.histogram("chore_redis_call_bytes", "Bytes to and from Redis per ChoreRedis call", BYTES)
+        self.total = registry.counter("chore_redis_commands_total", "Redis commands sent")
+        self.sent = registry.counter("chore_redis_sent_bytes_total", "Bytes sent to Redis")
+        self.received = registry.counter("chore_redis_received_bytes_total", "Bytes received from Redis")
+
+    def counts(self):
+        """
+        This thread's commands, round trips and bytes since the outermost call started
+        """
+
+        if not hasattr(self.local, "counts"):
+            self.local.counts = [0, 0, 0]
+
+        return self.local.counts
+
+    def before(self, kind, name, context):
+
+        if kind == "call" and context["parent"] is None:
+            self.local.counts = [0, 0, 0]
+
+    def after(self, kind, name, context, seconds, error):
+
+        counts = self.counts()
+
+        # A command's a round trip, pipelines being one for all they queued
+
+        if kind == "command":
+
+            for command, args, kwargs in context.get("commands", [(name, context.get("args"), context.get("kwargs"))]):
+                sent = size(args) + size(kwargs)
+                self.total.inc(command=command)
+                self.sent.inc(sent, command=command)
+                counts[0] += 1
+                counts[2] += sent
+
+            received = size(context.get("result"))
+            self.received.inc(received)
+            counts[1] += 1
+            counts[2] += received
+
+            return
+
+        # Calls are all timed, but the Redis work is the outermost's
+
+        self.seconds.observe(seconds, method=name)
+
+        if error is not None:
+            self.errors.inc(method=name)
+
+        if context["parent"] is None:
+            commands, trips, bytes = counts
+            self.commands.observe(commands, method=name)
+            self.trips.observe(trips, method=name)
+            self.bytes.observe(bytes, method=name)
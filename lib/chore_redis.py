@@ -1,41 +1,735 @@
 """
 Main module for interacting with chores in Redis
+
+A ChoreRedis can be shared between threads.  Batches are per thread, and
+transitions hold a lock for their chore, in process and, if given locking, in
+Redis too, so transitions of the same chore never interleave.  Given reread,
+or locking, they also re-read the chore once they have it, in case another
+thread or process changed it since it was got.  remind_batch() and
+apply_batch() hold theirs until their pipeline's sent.
 """
 
 import time
 import copy
 import json
+import zlib
+import heapq
+import inspect
+import functools
+import threading
+import contextlib
+import concurrent.futures
 
 import redis
 
+# Installed, these are in the pi_k8s_fitches package, else on the path
+
+try:
+    from . import chore_hooks
+    from . import chore_watch
+    from . import chore_backend
+    from . import chore_metrics
+    from . import chore_messages
+except ImportError:
+    import chore_hooks
+    import chore_watch
+    import chore_backend
+    import chore_metrics
+    import chore_messages
+
+
+STATE = ["start", "end", "notified", "paused", "skipped"]
+
+ACTIONS = ["remind", "next", "pause", "unpause", "skip", "unskip", "complete", "incomplete"]
+
+TASKS = ["pause", "unpause", "skip", "unskip", "complete", "incomplete"]
+
+METRICS = {
+    "next": "completed",
+    "complete": "completed",
+    "skip": "skipped",
+    "remind": "reminded"
+}
+
+
+def due(chore):
+    """
+    When the current task's next reminder is due, None if it isn't going to be
+    """
+
+    for task in chore["tasks"]:
+        if "start" in task and "end" not in task:
+
+            if task.get("paused") or "interval" not in task:
+                return None
+
+            return max(task["notified"] + task["interval"], task["start"] + task.get("delay", 0))
+
+    return None
+
+
+def describe(name, args, kwargs):
+    """
+    What a call's working on, for hooks
+    """
+
+    context = {"args": args, "kwargs": kwargs, "id": None, "action": None, "task": None}
+
+    if name == "get" and args:
+        context["id"] = args[0]
+    elif name == "create" and len(args) > 2:
+        context["id"] = args[2]
+    elif args and isinstance(args[0], dict):
+        context["id"] = args[0].get("id")
+
+    # Transitions are what they're called, and set is told
+
+    if name in ACTIONS:
+        context["action"] = name
+    elif name == "set" and len(args) > 1:
+        context["action"] = args[1]
+
+    if name in TASKS and len(args) > 1:
+        context["task"] = args[1]
+    elif name == "set" and len(args) > 2 and args[2] is not None:
+        context["task"] = args[2]["id"]
+
+    return context
+
+
+def materialized(name):
+    """
+    Makes an argument a list before anything, hooks included, sees it, so a
+    generator can be gone through more than once, like by a trace
+    """
+
+    def decorator(method):
+
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+
+            bound = signature.bind(*args, **kwargs)
+            bound.arguments[name] = list(bound.arguments[name])
+
+            return method(*bound.args, **bound.kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def instrumented(method):
+    """
+    Runs the hooks around a method's calls if there are any, else just calls it
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+
+        if self.hooks is None:
+            return method(self, *args, **kwargs)
+
+        with self.hooks.around("call", method.__name__, describe(method.__name__, args, kwargs)):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def locked(method):
+    """
+    Holds the chore's lock while transitioning it, first bringing the chore up
+    to what it is now if others might have changed it since the caller got it
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, chore, *args, **kwargs):
+
+        with self.lock(chore["id"]) as outermost:
+
+            if outermost:
+                self.refresh(chore, self.latest([chore["id"]])[0])
+
+            return method(self, chore, *args, **kwargs)
+
+    return wrapper
+
 
 class ChoreRedis(object):
     """
     Main class for interacting with chores in Redis
     """
 
-    def __init__(self, host, port, channel):
+    def __init__(self, host, port, channel, events=None, ttl=None, archive=None, history=None,
+                 statistics=False, backend=None, metrics=None, hooks=None, clock=None, resilience=None,
+                 journal=None, coalesce=None, prefix="/chore", cluster=False, shards=None,
+                 replica=None, sentinel=None, service=None, staleness=None, locking=None, stripes=64,
+                 idempotency=None, catalog=None, reread=False):
+
+        # Use the backend if given (like chore_backend.MemoryBackend), else the
+        # primary a redis.sentinel.Sentinel found for the service, else Redis.
+        # A cluster needs a client that follows its slots, which redis-py 2.10
+        # doesn't have, so that has to be the backend.
+
+        if cluster and backend is None:
+            raise ValueError("cluster needs a cluster aware client, like rediscluster.StrictRedisCluster, as backend")
+
+        if backend is not None:
+            self.redis = backend
+        elif sentinel is not None:
+            self.redis = sentinel.master_for(service)
+        else:
+            self.redis = redis.StrictRedis(host=host, port=port)
+
+        # If given a replica, or one of the service's from the Sentinel, read from
+        # that while it's no more than staleness seconds behind
+
+        self.replica = replica
+
+        if self.replica is None and sentinel is not None:
+            self.replica = sentinel.slave_for(service)
+
+        # If given clients for each primary of a cluster, list by scanning them all
+
+        self.shards = list(shards or [])
+
+        # If given a chore_resilience.Resilience, retry and break with that,
+        # a breaker for each client
+
+        if resilience is not None:
+            self.redis = resilience.wrap(self.redis)
+            self.replica = self.replica and resilience.wrap(self.replica, "replica")
+            self.shards = [resilience.wrap(shard, f"shard-{index}") for index, shard in enumerate(self.shards)]
+
+        # Run any hooks (like chore_hooks.Hook) around everything we do, and
+        # if given a chore_metrics.Registry, record everything there too
+
+        hooks = list(hooks or [])
+
+        if metrics is not None:
+            hooks.append(chore_metrics.Instrumentation(metrics))
+
+        self.hooks = None
+
+        if hooks:
+            self.hooks = chore_hooks.Hooks(hooks)
+            self.redis = self.hooks.wrap(self.redis)
+            self.replica = self.replica and self.hooks.wrap(self.replica)
+            self.shards = [self.hooks.wrap(shard) for shard in self.shards]
+
+        # Deduplicated announcements run the script by its SHA1, loading it only
+        # if Redis doesn't have it.  redis-py only loads scripts for pipelines
+        # it knows are pipelines, not ones wrapped in hooks or resilience, so
+        # speak() adds it to ours itself.
+
+        self.publish_once = self.redis.register_script(chore_backend.PUBLISH_ONCE)
 
-        self.redis = redis.StrictRedis(host=host, port=port)
         self.channel = channel
+        self.events = events
+        self.ttl = ttl
+        self.archive = archive
+        self.history = history
+        self.statistics = statistics
+
+        # Batches are per thread, so keep the pipeline there
+
+        self.local = threading.local()
+        self.pipe = None
+
+        # Chores hash to one of a fixed number of in process locks, and if
+        # locking, also lock in Redis for that many seconds at most
+
+        self.locks = [threading.RLock() for stripe in range(stripes)]
+        self.locking = locking
+
+        # If other threads or processes transition the same chores, or we're
+        # locking in Redis, re-read each chore once its lock is held
+
+        self.reread = reread
+
+        # If given, say things with a key only once in that many seconds
+
+        self.idempotency = idempotency
+
+        # What we say, in each language (like chore_messages.Catalog)
+
+        self.catalog = catalog if catalog is not None else chore_messages.Catalog()
+
+        # Where each chore's tasks are by id, and how many tasks there were,
+        # so transitions don't search, forgotten when a chore's done
+
+        self.indexes = {}
+        self.clock = clock
+        self.journal = journal
+
+        # In a cluster, the id's a hash tag so all of a chore's keys share a slot
+
+        self.prefix = prefix
+        self.cluster = cluster
+
+        self.staleness = staleness
+        self.checked = None
+        self.fresh = False
+
+        # If coalescing, chores to write (as JSON, so they're as they were when
+        # set) by id, flushed after that many seconds
+
+        self.coalesce = coalesce
+        self.dirty = {}
+        self.dirty_lock = threading.Lock()
+        self.timer = None
+
+    @property
+    def pipe(self):
+        """
+        This thread's batch pipeline, if it's batching
+        """
+
+        return getattr(self.local, "pipe", None)
+
+    @pipe.setter
+    def pipe(self, pipe):
+
+        self.local.pipe = pipe
+
+    @contextlib.contextmanager
+    def lock(self, id):
+        """
+        Holds a chore's lock, which this thread can take again while holding it,
+        yielding whether this is the outermost hold
+        """
+
+        held = self.local.__dict__.setdefault("held", set())
+
+        if id in held:
+            yield False
+            return
+
+        with self.locks[self.stripe(id)]:
+
+            # Only the outermost hold needs to lock in Redis
+
+            lock = None
+
+            if self.locking:
+                lock = self.redis.lock(self.key(id, "lock"), timeout=self.locking)
+                lock.acquire()
+
+            held.add(id)
+
+            try:
+                yield True
+            finally:
+                held.discard(id)
+
+                if lock is not None:
+                    lock.release()
+
+    def stripe(self, id):
+        """
+        Which of the in process locks is a chore's
+        """
+
+        return zlib.crc32(str(id).encode("utf-8")) % len(self.locks)
+
+    @contextlib.contextmanager
+    def holding(self, ids):
+        """
+        Holds several chores' locks, taken in the same order everywhere so
+        batches can't deadlock each other
+        """
+
+        with contextlib.ExitStack() as stack:
+
+            for id in sorted(set(ids), key=lambda id: (self.stripe(id), str(id))):
+                stack.enter_context(self.lock(id))
+
+            yield
+
+    def latest(self, ids):
+        """
+        What chores are now, if others might have changed them, None for any
+        we can't tell, like when Redis is down and we're journaling
+        """
+
+        ids = list(ids)
+
+        if not self.reread and not self.locking:
+            return [None] * len(ids)
+
+        try:
+            return self.get_many(ids)
+        except redis.ConnectionError:
+            if self.journal is None:
+                raise
+            return [None] * len(ids)
+
+    @staticmethod
+    def refresh(chore, latest):
+        """
+        Makes a chore what it is now, if it's still stored
+        """
+
+        if latest is not None and latest != chore:
+            chore.clear()
+            chore.update(latest)
+
+    def now(self):
+        """
+        The time according to our clock if we have one, else the real time
+        """
+
+        return self.clock() if self.clock is not None else time.time()
+
+    def key(self, id, *suffix):
+        """
+        Where a chore, or something of it like its history, is kept
+        """
+
+        key = f"{self.prefix}/{{{id}}}" if self.cluster else f"{self.prefix}/{id}"
+
+        return "/".join([key] + list(suffix))
+
+    def shared(self, name, *suffix):
+        """
+        Where something of all the chores, like the archive, is kept, beside
+        rather than under the prefix so it's never mistaken for a chore
+        """
+
+        return "/".join([f"{self.prefix}-{name}"] + [str(part) for part in suffix])
+
+    def pipeline(self):
+        """
+        A pipeline for our writes, a transaction unless we're in a cluster,
+        where the chore, archive and stats keys are in different slots
+        """
+
+        return self.redis.pipeline(transaction=not self.cluster)
+
+    def parse(self, key):
+        """
+        The id of the chore kept at a key, None if it's not a chore's key
+        """
+
+        if isinstance(key, bytes):
+            key = key.decode("utf-8")
+
+        if not key.startswith(f"{self.prefix}/"):
+            return None
+
+        id = key[len(self.prefix) + 1:]
+
+        # Make sure there's nothing hinky, like it being a chore's history
+
+        if self.cluster:
+            if not id.startswith("{") or not id.endswith("}") or "}" in id[1:-1]:
+                return None
+            id = id[1:-1]
+
+        if not id or "/" in id:
+            return None
+
+        return id
+
+    def reader(self):
+        """
+        Where to read from, the replica if there is one that's fresh enough, else the primary
+        """
+
+        if self.replica is None:
+            return self.redis
+
+        now = self.now()
+
+        # Without a tolerance, use it unless it failed in the last second
+
+        if self.staleness is None:
+            return self.redis if self.checked is not None and now - self.checked < 1 else self.replica
+
+        # Check how far behind the replica is at most once a second
+
+        if self.checked is None or now - self.checked >= 1:
+
+            self.checked = now
+
+            try:
+                info = self.replica.info("replication")
+                self.fresh = (
+                    info.get("master_link_status") == "up" and
+                    info.get("master_last_io_seconds_ago", 0) <= self.staleness
+                )
+            except redis.ConnectionError:
+                self.fresh = False
+
+        return self.replica if self.fresh else self.redis
+
+    def read(self, call):
+        """
+        Calls with where to read from, falling back to the primary if the replica's gone
+        """
+
+        client = self.reader()
+
+        try:
+            return call(client)
+        except redis.ConnectionError:
+            if client is self.redis:
+                raise
+            self.fresh = False
+            self.checked = self.now()
+            return call(self.redis)
+
+    @instrumented
+    def set(self, chore, action=None, task=None, before=None):
+        """
+        Sets a chore in Redis, recording the transition if there was one
+        """
+
+        # Use the batch's pipeline if there is one, else one of our own
+
+        pipeline = self.pipe or self.pipeline()
+
+        # If we're coalescing, hold onto it for the next flush, else write it
+
+        if self.coalesce and self.pipe is None:
+            self.defer(chore)
+        else:
+            self.write(pipeline, chore)
+            self.settle(chore["id"])
+
+        # If this was a transition, let everyone else know what changed
+        # and keep track of it
+
+        if action is not None and (self.events or self.history):
+            diff = self.diff(before or {}, self.state(chore))
+            self.event(pipeline, chore, action, task, diff)
+            self.record(pipeline, chore, action, task, diff)
+
+        # Keep a running tally for the reports
+
+        if action in METRICS and self.statistics:
+            self.tally(pipeline, chore, action, task)
+
+        if pipeline is self.pipe:
+            self.local.batched[chore["id"]] = chore
+            return
+
+        # If we're journaling, keep what we couldn't set for when Redis is back,
+        # and if it is back, catch up on anything we'd kept
+
+        if self.journal is None:
+            pipeline.execute()
+            return
+
+        try:
+            pipeline.execute()
+        except redis.ConnectionError:
+            if chore["id"] not in self.dirty:
+                self.journal.append(chore)
+            return
+
+        if self.journal.pending:
+            try:
+                self.journal.replay(self)
+            except redis.ConnectionError:
+                pass
+
+    def write(self, pipeline, chore, data=None):
+        """
+        Queues writing a chore, following the retention policy
+        """
+
+        key = self.key(chore["id"])
+        data = data if data is not None else json.dumps(chore)
+
+        # Once it's done, there's no more need to find its tasks quickly
+
+        if "end" in chore:
+            self.indexes.pop(chore["id"], None)
+
+        # If it's done and we're archiving, compress it onto the capped archive
+        # and take it out of the live chores
+
+        if "end" in chore and self.archive:
+            pipeline.lpush(self.shared("archive"), zlib.compress(data.encode("utf-8")))
+            pipeline.ltrim(self.shared("archive"), 0, self.archive - 1)
+            pipeline.delete(key)
+
+        # If it's done and we're expiring, let Redis clean it up
+
+        elif "end" in chore and self.ttl:
+            pipeline.set(key, data, ex=self.ttl)
+
+        # Else just set using the node and dumped data
+
+        else:
+            pipeline.set(key, data)
+
+    def defer(self, chore):
+        """
+        Marks a chore as needing writing, starting the flush timer if it isn't already
+        """
+
+        data = json.dumps(chore)
+
+        with self.dirty_lock:
+            self.dirty[chore["id"]] = data
+            self.arm()
+
+    def arm(self):
+        """
+        Starts the flush timer if it isn't already, with dirty_lock held
+        """
+
+        if self.timer is None:
+            self.timer = threading.Timer(self.coalesce, self.flushing)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flushing(self):
+        """
+        Flushes on the timer, where there's no one to tell Redis is down, the
+        chores having been kept for next time
+        """
+
+        try:
+            self.flush()
+        except redis.ConnectionError:
+            pass
+
+    def settle(self, id):
+        """
+        Forgets a chore waiting to be written, as it's been written since
+        """
+
+        if self.dirty:
+            with self.dirty_lock:
+                self.dirty.pop(id, None)
+
+    def pending(self, ids=None):
+        """
+        Copies of the chores waiting to be written, of those ids if given
+        """
+
+        if not self.dirty:
+            return {}
+
+        with self.dirty_lock:
+            return {id: json.loads(data) for id, data in self.dirty.items() if ids is None or id in ids}
 
-    def set(self, chore):
+    def current(self, chores):
         """
-        Sets a chore in Redis
+        Chores read from Redis, replaced by any newer waiting to be written,
+        plus those waiting that aren't in Redis yet
         """
 
-        # Just set using the node and dumped data
+        pending = self.pending()
 
-        self.redis.set(f"/chore/{chore['id']}", json.dumps(chore))
+        if not pending:
+            return chores
 
+        current = [pending.pop(chore["id"], chore) for chore in chores] + list(pending.values())
+
+        # Those that'll be archived when written aren't active anymore
+
+        return [chore for chore in current if not ("end" in chore and self.archive)]
+
+    @instrumented
+    def flush(self):
+        """
+        Writes all the coalesced chores in one pipeline
+        """
+
+        with self.dirty_lock:
+
+            chores, self.dirty = list(self.dirty.items()), {}
+
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+        if not chores:
+            return 0
+
+        pipeline = self.pipeline()
+
+        for id, data in chores:
+            self.write(pipeline, json.loads(data), data)
+
+        # Like set, journal them if we can't reach Redis and are journaling,
+        # else keep them, unless they've changed since, to try again
+
+        try:
+            pipeline.execute()
+        except redis.ConnectionError:
+
+            if self.journal is not None:
+                for id, data in chores:
+                    self.journal.append(json.loads(data))
+                return len(chores)
+
+            with self.dirty_lock:
+                for id, data in chores:
+                    self.dirty.setdefault(id, data)
+                self.arm()
+
+            raise
+
+        return len(chores)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Queues all writes and announcements into a single pipeline,
+        sent when the block completes
+        """
+
+        # If we're already batching, the outer batch will send
+
+        if self.pipe is not None:
+            yield self.pipe
+            return
+
+        self.pipe = self.redis.pipeline(transaction=False)
+        self.local.batched = {}
+
+        # Like set, journal the batch's chores if we can't reach Redis and
+        # are journaling
+
+        try:
+            yield self.pipe
+
+            try:
+                self.pipe.execute()
+            except redis.ConnectionError:
+
+                if self.journal is None:
+                    raise
+
+                for chore in self.local.batched.values():
+                    if chore["id"] not in self.dirty:
+                        self.journal.append(chore)
+        finally:
+            self.pipe = None
+            self.local.batched = {}
+
+    @instrumented
     def get(self, id):
         """
         Get chore from Redis
         """
 
+        # If it's waiting to be written, that's the latest
+
+        pending = self.pending([id])
+
+        if id in pending:
+            return pending[id]
+
         # Get the data and if it's there, parse and return.
 
-        chore = self.redis.get(f"/chore/{id}")
+        chore = self.read(lambda client: client.get(self.key(id)))
 
         if chore:
             return json.loads(chore)
@@ -44,43 +738,477 @@ class ChoreRedis(object):
 
         return None
 
-    def speak(self, chore, text):
+    @instrumented
+    def get_many(self, ids):
+        """
+        Gets several chores from Redis at once, None for those missing
+        """
+
+        chores = [json.loads(chore) if chore else None for chore in self.fetch(self.redis, ids)]
+
+        # Any waiting to be written are the latest
+
+        pending = self.pending(set(ids))
+
+        if pending:
+            chores = [pending.get(id, chore) for id, chore in zip(ids, chores)]
+
+        return chores
+
+    def journaled(self, ids):
+        """
+        Gets several chores, and if Redis is down and we're journaling, goes
+        on from what was journaled, None for those that weren't
+        """
+
+        try:
+            return self.get_many(ids)
+        except redis.ConnectionError:
+            if self.journal is None:
+                raise
+
+        journaled = {entry["chore"]["id"]: entry["chore"] for entry in self.journal.entries()}
+        pending = self.pending(set(ids))
+
+        return [pending.get(id, journaled.get(id)) for id in ids]
+
+    def watch(self, handler, **kwargs):
+        """
+        Calls handler with {id: chore} for batches of chores as they change,
+        returning the started chore_watch.Watcher to stop() when done
+        """
+
+        return chore_watch.Watcher(self, handler, **kwargs).start()
+
+    def task(self, chore, id):
+        """
+        Finds a chore's task by its id, with a cached map of ids to positions,
+        checked on use so it's only rebuilt when the tasks have moved
+        """
+
+        tasks = chore["tasks"]
+
+        # Most tasks are where their id says, so look there first
+
+        if isinstance(id, int) and 0 <= id < len(tasks) and tasks[id].get("id", id) == id:
+            return tasks[id]
+
+        # Ids that aren't any task's are cached as None, good while there's
+        # as many tasks
+
+        length, indexes = self.indexes.get(chore["id"], (None, {}))
+        index = indexes.get(id, -1)
+
+        if (
+            index == -1 or
+            (index is None and length != len(tasks)) or
+            (index is not None and (index >= len(tasks) or tasks[index].get("id", index) != id))
+        ):
+            indexes = {task.get("id", index): index for index, task in enumerate(tasks)}
+            indexes.setdefault(id, None)
+            self.indexes[chore["id"]] = (len(tasks), indexes)
+            index = indexes[id]
+
+        # If it's not an id, it's where the task is, like it used to be
+
+        if index is None:
+            return tasks[id]
+
+        return tasks[index]
+
+    def phrase(self, chore, kind, text):
+        """
+        A kind of thing to say about some text, in the chore's language
+        """
+
+        return self.catalog.renderer(chore["language"], kind)(text=text)
+
+    def utterance(self, before, action, task=None):
+        """
+        Key telling apart what a transition says, by the action, the task if
+        any and when the task, else the chore, was notified before
+        """
+
+        if task is None:
+            notified = before.get("notified")
+        else:
+            notified = before.get("tasks", {}).get(task["id"], {}).get("notified")
+
+        return f"{action}/{'' if task is None else task['id']}/{notified}"
+
+    @instrumented
+    def speak(self, chore, text, key=None):
+        """
+        Says something on the speaking channel, only once if given a key and
+        we're deduplicating
+        """
+
+        # Follows the standards format, addressed to the person
+
+        node, language = chore["node"], chore["language"]
+        text = self.catalog.renderer(language, "address")(person=chore["person"], text=text)
+        message = self.catalog.message(self.now(), node, language, text)
+
+        # If we're journaling, carry on without Redis, there being no one
+        # to say it to anyway
+
+        client = self.pipe or self.redis
+
+        try:
+            if key is not None and self.idempotency:
+                if self.pipe is not None:
+                    self.pipe.scripts.add(self.publish_once)
+                self.publish_once(
+                    keys=[self.key(chore["id"], "spoken", key)],
+                    args=[self.idempotency, self.channel, message], client=client
+                )
+            else:
+                client.publish(self.channel, message)
+        except redis.ConnectionError:
+            if self.journal is None:
+                raise
+
+    @instrumented
+    def archived(self, start=0, stop=-1):
+        """
+        Gets completed chores from the archive, newest first
         """
-        Says something on the speaking channel
+
+        return [
+            json.loads(zlib.decompress(data).decode("utf-8"))
+            for data in self.redis.lrange(self.shared("archive"), start, stop)
+        ]
+
+    def state(self, chore):
         """
+        Snapshots just the fields transitions change
+        """
+
+        state = {field: chore[field] for field in STATE if field in chore}
+        state["tasks"] = {}
 
-        # Follows the standards format
+        for task in chore.get("tasks", []):
+            state["tasks"][task["id"]] = {field: task[field] for field in STATE if field in task}
 
-        self.redis.publish(self.channel, json.dumps({
-            "timestamp": time.time(),
+        return state
+
+    def diff(self, before, after):
+        """
+        Compares two snapshots, with removed fields as None
+        """
+
+        diff = {}
+
+        for field in set(before) | set(after):
+
+            # Tasks are compared one level down, only keeping those that are
+            # new or changed
+
+            if field == "tasks":
+                tasks = {}
+                for id in after.get("tasks", {}):
+                    if id not in before.get("tasks", {}):
+                        tasks[id] = after["tasks"][id]
+                        continue
+                    changes = self.diff(before["tasks"][id], after["tasks"][id])
+                    if changes:
+                        tasks[id] = changes
+                if tasks:
+                    diff["tasks"] = tasks
+
+            elif before.get(field) != after.get(field):
+                diff[field] = after.get(field)
+
+        return diff
+
+    def event(self, pipeline, chore, action, task, diff):
+        """
+        Publishes a machine readable state change on the events channel
+        """
+
+        # Only if someone asked for them
+
+        if not self.events:
+            return
+
+        pipeline.publish(self.events, json.dumps({
+            "timestamp": self.now(),
+            "id": chore["id"],
             "node": chore["node"],
-            "text": f"{chore['person']}, {text}",
-            "language": chore["language"]
+            "action": action,
+            "task": task["id"] if task is not None else None,
+            "diff": diff
         }))
 
+    def record(self, pipeline, chore, action, task, diff):
+        """
+        Appends a state change to the chore's capped history stream
+        """
+
+        # Only if someone asked for it
+
+        if not self.history:
+            return
+
+        pipeline.execute_command(
+            "XADD", self.key(chore["id"], "history"), "MAXLEN", "~", self.history, "*",
+            "timestamp", self.now(),
+            "action", action,
+            "task", json.dumps(task["id"] if task is not None else None),
+            "diff", json.dumps(diff)
+        )
+
+    def tally(self, pipeline, chore, action, task):
+        """
+        Increments the statistics a transition affects
+        """
+
+        metric = METRICS[action]
+
+        # Update by person, by template (what the chore is), both, and overall
+        # so any combination is a single read
+
+        for person in [chore["person"], "*"]:
+            for template in [chore["text"], "*"]:
+
+                key = self.shared("stats", person, template)
+
+                for name in [task["text"], "*"]:
+
+                    pipeline.hincrby(key, f"{name}/{metric}", 1)
+
+                    if metric == "completed":
+                        pipeline.hincrbyfloat(key, f"{name}/duration", task["end"] - task["start"])
+
+    @instrumented
+    def stats(self, person=None, template=None):
+        """
+        Gets statistics by task, for a person and/or template if specified
+        """
+
+        stats = {}
+
+        for field, value in self.redis.hgetall(self.shared("stats", person or "*", template or "*")).items():
+            name, metric = field.decode("utf-8").rsplit("/", 1)
+            stats.setdefault(name, {})[metric] = float(value) if metric == "duration" else int(value)
+
+        # Averages are simpler to calculate here than store
+
+        for task in stats.values():
+            if task.get("completed"):
+                task["average"] = task["duration"] / task["completed"]
+
+        return stats
+
+    def transitions(self, id, start=None, end=None, batch=100):
+        """
+        Yields batches of a chore's history, optionally within a time range
+        """
+
+        # Stream ids start with milliseconds so we can range on those
+
+        start = "-" if start is None else str(int(start * 1000))
+        end = "+" if end is None else str(int(end * 1000))
+
+        while True:
+
+            entries = self.redis.execute_command(
+                "XRANGE", self.key(id, "history"), start, end, "COUNT", batch
+            )
+
+            if not entries:
+                return
+
+            history = []
+
+            for entry, values in entries:
+                fields = dict(zip(values[::2], values[1::2]))
+                history.append({
+                    "id": entry.decode("utf-8"),
+                    "timestamp": float(fields[b"timestamp"]),
+                    "action": fields[b"action"].decode("utf-8"),
+                    "task": json.loads(fields[b"task"]),
+                    "diff": json.loads(fields[b"diff"])
+                })
+
+            yield history
+
+            # If we got less than a full batch, that's all of them
+
+            if len(entries) < batch:
+                return
+
+            # Else continue right after the last one we saw
+
+            milliseconds, sequence = history[-1]["id"].split("-")
+            start = f"{milliseconds}-{int(sequence) + 1}"
+
+    @instrumented
     def list(self):
         """
         Lists nodes with an active chore
         """
 
-        chores = []
+        # With a single Redis, just scan that (or its replica), else scan every
+        # primary at once
+
+        if not self.shards:
+            chores = self.read(self.scan)
+        else:
+            with concurrent.futures.ThreadPoolExecutor(len(self.shards)) as pool:
+                chores = [chore for chores in pool.map(self.scan, self.shards) for chore in chores]
+
+        # Any waiting to be written are the latest
+
+        return self.current(chores)
+
+    @instrumented
+    def remind_all(self, workers=None, batch=100):
+        """
+        Sends any reminders due for all the chores, each batch of chores in one
+        pipeline, with batches spread over that many threads if given workers.
+        Returns how many reminders went out.
+        """
+
+        # Just the ids, with any waiting to be written, so each batch gets and
+        # decodes its chores the once, under their locks
+
+        ids = list(dict.fromkeys(self.ids(batch=batch) + list(self.pending())))
+        batches = [ids[offset:offset + batch] for offset in range(0, len(ids), batch)]
+
+        if not workers or workers == 1:
+            return sum(map(self.remind_ids, batches))
+
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            return sum(pool.map(self.remind_ids, batches))
+
+    @instrumented
+    def remind_due(self, budget=None, priorities=None, batch=100):
+        """
+        Sends reminders that are due, most urgent first, how late they are times
+        the priority of their template (their text, 1 unless in priorities).
+        Only sends up to budget, if given, leaving the rest for the next sweep.
+        Returns how many reminders went out.
+        """
+
+        now = self.now()
+        priorities = priorities or {}
+
+        # Heap of the most urgent, the index breaking ties so chores aren't compared
+
+        urgent = []
+
+        for index, chore in enumerate(self.list()):
+
+            when = due(chore)
+
+            if when is not None and when < now:
+                urgent.append((-(now - when) * priorities.get(chore["text"], 1), index, chore))
+
+        heapq.heapify(urgent)
+
+        reminded = 0
+
+        while urgent and (budget is None or reminded < budget):
+
+            size = min(batch, len(urgent), budget - reminded if budget is not None else batch)
+
+            reminded += self.remind_batch([heapq.heappop(urgent)[2] for pop in range(size)])
+
+        return reminded
+
+    def remind_batch(self, chores):
+        """
+        Sends any reminders due for some chores in one pipeline, holding their
+        locks until it's sent
+        """
 
-        # Get all the keys in Redis matching our storage pattern
+        chores = list(chores)
+        ids = [chore["id"] for chore in chores]
 
-        for key in self.redis.keys('/chore/*'):
-            pieces = key.decode("utf-8").split('/')
+        with self.holding(ids):
 
-            # If we're sure there's nothing hinky, get the actual chore
+            for chore, current in zip(chores, self.latest(ids)):
+                self.refresh(chore, current)
 
-            if len(pieces) == 3 and pieces[1] == "chore":
-                chores.append(self.get(pieces[2]))
+            with self.batch():
+                return len([chore for chore in chores if self.remind(chore)])
+
+    def remind_ids(self, ids):
+        """
+        Sends any reminders due for some chores by id in one pipeline, getting
+        them once their locks are held, which are held until it's sent
+        """
+
+        ids = list(ids)
+
+        with self.holding(ids):
+
+            chores = [chore for chore in self.get_many(ids) if chore is not None]
+
+            with self.batch():
+                return len([chore for chore in chores if self.remind(chore)])
+
+    def fetch(self, client, ids):
+        """
+        Gets the raw data for several chores from a client in one round trip
+        """
+
+        if not ids:
+            return []
+
+        # In a cluster the keys are likely in different slots, which MGET won't
+        # allow, so pipeline the GETs instead
+
+        if not self.cluster:
+            return client.mget([self.key(id) for id in ids])
+
+        pipeline = client.pipeline(transaction=False)
+
+        for id in ids:
+            pipeline.get(self.key(id))
+
+        return pipeline.execute()
+
+    def ids(self, client=None, batch=100):
+        """
+        The ids of all the chores on a client, else on every primary
+        """
+
+        # With a single Redis, just scan that, else scan every primary at once
+
+        if client is None and not self.shards:
+            return self.ids(self.redis, batch)
+
+        if client is None:
+            with concurrent.futures.ThreadPoolExecutor(len(self.shards)) as pool:
+                return [id for ids in pool.map(lambda shard: self.ids(shard, batch), self.shards) for id in ids]
+
+        return [id for id in map(self.parse, client.scan_iter(match=f"{self.prefix}/*", count=batch)) if id]
+
+    def scan(self, client, batch=100):
+        """
+        Gets all the chores on a client, without blocking it like KEYS would
+        """
+
+        ids = self.ids(client, batch)
+
+        chores = []
+
+        for offset in range(0, len(ids), batch):
+            chores.extend(
+                json.loads(chore) for chore in self.fetch(client, ids[offset:offset + batch]) if chore
+            )
 
         return chores
 
-    def check(self, chore):
+    @instrumented
+    @locked
+    def check(self, chore, key=None):
         """
         Checks to see if there's tasks remaining, if so, starts one.
-        If not completes the task
+        If not completes the task.  Given the key of what the transition
+        that got us here said, what this says is keyed from it.
         """
 
         # Go through all the tasks
@@ -99,21 +1227,20 @@ class ChoreRedis(object):
             # If not start, start it, and let 'em know
 
             if "start" not in task:
-                task["start"] = time.time()
+                task["start"] = self.now()
                 task["notified"] = task["start"]
 
-                if "paused" in task and task["paused"]:
-                    self.speak(chore, f"you do not have to {task['text']} yet")
-                else:
-                    self.speak(chore, f"please {task['text']}")
+                kind = "wait" if task.get("paused") else "please"
+                self.speak(chore, self.phrase(chore, kind, task["text"]), key and f"{key}/start/{task['id']}")
                 return
 
         # If we're here, all are done, so complete the chore
 
-        chore["end"] = time.time()
+        chore["end"] = self.now()
         chore["notified"] = chore["end"] 
-        self.speak(chore, f"thank you. You did {chore['text']}")
+        self.speak(chore, self.phrase(chore, "finished", chore["text"]), key and f"{key}/finished")
 
+    @instrumented
     def create(self, template, person, node):
         """
         Creates a chore from a template
@@ -134,22 +1261,85 @@ class ChoreRedis(object):
         # We've start the overall chore.  Notify the person
         # record that we did so.
 
-        chore["start"] = time.time()
+        chore["start"] = self.now()
         chore["notified"] = chore["start"] 
-        self.speak(chore, f"time to {chore['text']}")
 
-        # Check for the first tasks and set our changes. 
+        # Creating the same chore for the node again, like a request sent
+        # twice, only says so once
 
-        self.check(chore)
-        self.set(chore)
+        key = f"create/{chore['text']}"
+        self.speak(chore, self.phrase(chore, "start", chore["text"]), key)
+
+        # Check for the first tasks and set our changes, holding the lock so
+        # check() doesn't mistake any chore this replaces for this one
+
+        with self.lock(node):
+            self.indexes.pop(node, None)
+            self.check(chore, key)
+            self.set(chore, "create")
 
         return chore
 
+    @materialized("assignments")
+    @instrumented
+    def create_many(self, template, assignments, chunk=100):
+        """
+        Creates chores from a template for many (person, node) assignments,
+        sending a pipeline per chunk
+        """
+
+        chores = []
+
+        for offset in range(0, len(assignments), chunk):
+            with self.batch():
+                for person, node in assignments[offset:offset + chunk]:
+                    chores.append(self.create(template, person, node))
+
+        return chores
+
+    @materialized("commands")
+    @instrumented
+    def apply_batch(self, commands):
+        """
+        Applies many (id, action, args) transitions, fetching all the chores
+        at once and sending all the changes in one pipeline. Returns each
+        action's result, None if the chore wasn't found.
+        """
+
+        # Make sure they're all things we can do before doing any of them
+
+        for id, action, args in commands:
+            if action not in ACTIONS:
+                raise ValueError(f"unknown action {action}")
+
+        # Get each chore once, under its lock until the changes are sent, so
+        # multiple actions on the same one build up
+
+        ids = list(dict.fromkeys(id for id, action, args in commands))
+        results = []
+
+        with self.holding(ids):
+
+            chores = dict(zip(ids, self.journaled(ids)))
+
+            with self.batch():
+                for id, action, args in commands:
+                    if chores[id] is None:
+                        results.append(None)
+                    else:
+                        results.append(getattr(self, action)(chores[id], *args))
+
+        return results
+
+    @instrumented
+    @locked
     def remind(self, chore):
         """
         Sees if any reminders need to go out
         """
 
+        before = self.state(chore)
+
         # Go through all the tasks to find the current one
 
         for task in chore["tasks"]:
@@ -160,7 +1350,7 @@ class ChoreRedis(object):
                 
                 # If it has a delay and isn't time yet, don't bother yet
 
-                if "delay" in task and task["delay"] + task["start"] > time.time():
+                if "delay" in task and task["delay"] + task["start"] > self.now():
                     return False
 
                 # If it's paused, don't bother either
@@ -170,14 +1360,15 @@ class ChoreRedis(object):
 
                 # If it has an interval and it's more been more than that since the last notification
 
-                if "interval" in task and time.time() > task["notified"] + task["interval"]:
+                if "interval" in task and self.now() > task["notified"] + task["interval"]:
 
                     # Notify and sotre that we did, breaking out of the current chore 
                     # because we only want to notify one at a time
 
-                    task["notified"] = time.time()
-                    self.speak(chore, f"please {task['text']}")
-                    self.set(chore)
+                    task["notified"] = self.now()
+                    self.speak(chore, self.phrase(chore, "please", task["text"]),
+                               self.utterance(before, "remind", task))
+                    self.set(chore, "remind", task, before)
 
                     return True
 
@@ -187,82 +1378,98 @@ class ChoreRedis(object):
 
         return False
 
+    @instrumented
+    @locked
     def next(self, chore):
         """
         Completes the current task and starts the next. This is used
         with a button press.  
         """
 
+        before = self.state(chore)
+
         # Go through all the tasks, complete the first one found
         # that's ongoing and break
 
         for task in chore["tasks"]:
             if "start" in task and "end" not in task:
-                task["end"] = time.time()
+                task["end"] = self.now()
                 task["notified"] = task["end"]
-                self.speak(chore, f"you did {task['text']}")
+                key = self.utterance(before, "next", task)
+                self.speak(chore, self.phrase(chore, "did", task["text"]), key)
 
                 # Check to see if there's another one and set
 
-                self.check(chore)
-                self.set(chore)
+                self.check(chore, key)
+                self.set(chore, "next", task, before)
 
                 return True
 
         return False
 
+    @instrumented
+    @locked
     def pause(self, chore, id):
         """
         Pauses a specific task
         """
 
-        task = chore["tasks"][id]
+        task = self.task(chore, id)
+        before = self.state(chore)
 
         # Pause if it isn't. 
 
         if "paused" not in task or not task["paused"]:
 
             task["paused"] = True
-            task["notified"] = time.time()
-            self.speak(chore, f"you do not have to {task['text']} yet")
+            task["notified"] = self.now()
+            self.speak(chore, self.phrase(chore, "wait", task["text"]),
+                       self.utterance(before, "pause", task))
 
             # Set it
 
-            self.set(chore)
+            self.set(chore, "pause", task, before)
 
             return True
 
         return False
 
+    @instrumented
+    @locked
     def unpause(self, chore, id):
         """
         Resumes a specific task
         """
 
-        task = chore["tasks"][id]
+        task = self.task(chore, id)
+        before = self.state(chore)
 
         # Resume if it's paused
 
         if "paused" in task and task["paused"]:
 
             task["paused"] = False
-            task["notified"] = time.time()
-            self.speak(chore, f"you do have to {task['text']} now")
+            task["notified"] = self.now()
+            self.speak(chore, self.phrase(chore, "resume", task["text"]),
+                       self.utterance(before, "unpause", task))
 
             # Set it
 
-            self.set(chore)
+            self.set(chore, "unpause", task, before)
 
             return True
 
         return False
 
+    @instrumented
+    @locked
     def skip(self, chore, id):
         """
         Skips a specific task
         """
 
-        task = chore["tasks"][id]
+        task = self.task(chore, id)
+        before = self.state(chore)
 
         # Pause if it isn't. 
 
@@ -270,31 +1477,35 @@ class ChoreRedis(object):
 
             task["skipped"] = True
 
-            task["end"] = time.time()
+            task["end"] = self.now()
 
             # If it hasn't been started, do so now
 
             if "start" not in task:
                 task["start"] = task["end"]
                 
-            task["notified"] = time.time()
-            self.speak(chore, f"you do not have to {task['text']}")
+            task["notified"] = self.now()
+            key = self.utterance(before, "skip", task)
+            self.speak(chore, self.phrase(chore, "skip", task["text"]), key)
 
             # Check to see if there's another one and set
 
-            self.check(chore)
-            self.set(chore)
+            self.check(chore, key)
+            self.set(chore, "skip", task, before)
 
             return True
 
         return False
 
+    @instrumented
+    @locked
     def unskip(self, chore, id):
         """
         Unskips specific task
         """
 
-        task = chore["tasks"][id]
+        task = self.task(chore, id)
+        before = self.state(chore)
 
         # Pause if it isn't. 
 
@@ -304,36 +1515,41 @@ class ChoreRedis(object):
 
             del task["end"]
                 
-            task["notified"] = time.time()
-            self.speak(chore, f"you do have to {task['text']}")
+            task["notified"] = self.now()
+            self.speak(chore, self.phrase(chore, "unskip", task["text"]),
+                       self.utterance(before, "unskip", task))
 
             # And incomplete the overall chore too if needed
 
             if "end" in chore:
                 del chore["end"]
-                chore["notified"] = time.time()
-                self.speak(chore, f"I'm sorry but you did not {chore['text']} yet")
+                chore["notified"] = self.now()
+                self.speak(chore, self.phrase(chore, "undone", chore["text"]),
+                           self.utterance(before, "unskip"))
 
             # Check to see if there's another one and set
 
-            self.set(chore)
+            self.set(chore, "unskip", task, before)
 
             return True
 
         return False
 
+    @instrumented
+    @locked
     def complete(self, chore, id):
         """
         Completes a specific task
         """
 
-        task = chore["tasks"][id]
+        task = self.task(chore, id)
+        before = self.state(chore)
 
         # Complete if it isn't. 
 
         if "end" not in task:
 
-            task["end"] = time.time()
+            task["end"] = self.now()
 
             # If it hasn't been started, do so now
 
@@ -341,23 +1557,27 @@ class ChoreRedis(object):
                 task["start"] = task["end"]
 
             task["notified"] = task["end"]
-            self.speak(chore, f"you did {task['text']}")
+            key = self.utterance(before, "complete", task)
+            self.speak(chore, self.phrase(chore, "did", task["text"]), key)
 
             # See if there's a next one, save our changes
 
-            self.check(chore)
-            self.set(chore)
+            self.check(chore, key)
+            self.set(chore, "complete", task, before)
 
             return True
 
         return False
 
+    @instrumented
+    @locked
     def incomplete(self, chore, id):
         """
         Undoes a specific task
         """
 
-        task = chore["tasks"][id]
+        task = self.task(chore, id)
+        before = self.state(chore)
 
         # Delete completed from the task.  This'll leave the current task started.
         # It's either that or restart it.  This action is done if a kid said they
@@ -365,19 +1585,21 @@ class ChoreRedis(object):
 
         if "end" in task:
             del task["end"]
-            task["notified"] = time.time()
-            self.speak(chore, f"I'm sorry but you did not {task['text']} yet")
+            task["notified"] = self.now()
+            self.speak(chore, self.phrase(chore, "undone", task["text"]),
+                       self.utterance(before, "incomplete", task))
 
             # And incomplete the overall chore too if needed
 
             if "end" in chore:
                 del chore["end"]
-                chore["notified"] = time.time()
-                self.speak(chore, f"I'm sorry but you did not {chore['text']} yet")
+                chore["notified"] = self.now()
+                self.speak(chore, self.phrase(chore, "undone", chore["text"]),
+                           self.utterance(before, "incomplete"))
 
             # Don't check because we know one is started. But set out changes.
 
-            self.set(chore)
+            self.set(chore, "incomplete", task, before)
 
             return True
 
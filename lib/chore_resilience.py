@@ -0,0 +1,261 @@
+"""
+Resilient Redis access for chores
+
+Resilience wraps a Redis client so reads that are safe to repeat are retried
+with jittered exponential backoff, and everything goes through a circuit
+breaker that fails fast once Redis looks down, instead of every caller
+hammering it while it fails over.  Each client wrapped gets its own breaker,
+so a replica or shard being down doesn't fail fast for the others.  Failing
+fast raises CircuitOpen, which is a redis.ConnectionError so existing handling
+still applies.
+"""
+
+import time
+import random
+import threading
+
+import redis
+
+
+READS = ["get", "mget", "keys", "scan", "exists", "ttl", "lrange", "hgetall", "info"]
+
+FAILURES = (redis.ConnectionError, redis.TimeoutError)
+
+STATES = {
+    "closed": 0,
+    "half_open": 1,
+    "open": 2
+}
+
+
+class CircuitOpen(redis.ConnectionError):
+    """
+    Raised instead of trying Redis while the breaker's open
+    """
+
+
+class CircuitBreaker(object):
+    """
+    Opens after enough failures in a row, letting one call try again after a while
+    """
+
+    def __init__(self, failures=5, reset=30, clock=time.time, gauge=None, labels=None):
+
+        self.failures = failures
+        self.reset = reset
+        self.clock = clock
+        self.gauge = gauge
+        self.labels = labels or {}
+        self.lock = threading.Lock()
+
+        self.state = "closed"
+        self.failed = 0
+        self.opened = None
+        self.trying = False
+
+        self.record()
+
+    def record(self):
+
+        if self.gauge is not None:
+            self.gauge.set(STATES[self.state], **self.labels)
+
+    def allow(self):
+        """
+        Raises if we shouldn't even try
+        """
+
+        with self.lock:
+
+            if self.state == "open" and self.clock() >= self.opened + self.reset:
+                self.state = "half_open"
+                self.trying = False
+                self.record()
+
+            # Half open lets just one through to see if things are back
+
+            if self.state == "half_open" and not self.trying:
+                self.trying = True
+                return
+
+            if self.state != "closed":
+                raise CircuitOpen("Redis circuit breaker is open")
+
+    def success(self):
+
+        with self.lock:
+            self.state = "closed"
+            self.failed = 0
+            self.trying = False
+            self.record()
+
+    def failure(self):
+
+        with self.lock:
+
+            self.failed += 1
+
+            if self.state == "half_open" or self.failed >= self.failures:
+                self.state = "open"
+                self.opened = self.clock()
+                self.trying = False
+                self.record()
+
+
+class ResilientPipeline(object):
+    """
+    Sends a pipeline through its client's breaker, never retrying since it may write
+    """
+
+    def __init__(self, client, pipeline):
+
+        self.client = client
+        self.pipeline = pipeline
+
+    def __getattr__(self, name):
+
+        method = getattr(self.pipeline, name)
+
+        if not callable(method):
+            return method
+
+        def command(*args, **kwargs):
+            method(*args, **kwargs)
+            return self
+
+        return command
+
+    def execute(self):
+
+        return self.client.attempt(self.pipeline.execute, retry=False)
+
+
+class ResilientRedis(object):
+    """
+    Sends each command through the client's breaker, retrying reads
+    """
+
+    def __init__(self, resilience, client, breaker):
+
+        self.resilience = resilience
+        self.client = client
+        self.breaker = breaker
+
+    def attempt(self, call, retry):
+
+        return self.resilience.attempt(self.breaker, call, retry)
+
+    def pipeline(self, transaction=True):
+
+        return ResilientPipeline(self, self.client.pipeline(transaction=transaction))
+
+    def scan_iter(self, match=None, count=None):
+        """
+        Scans a page at a time, each page a read through the breaker
+        """
+
+        cursor = 0
+
+        while True:
+
+            cursor, keys = self.attempt(
+                lambda: self.client.scan(cursor=cursor, match=match, count=count), retry=True
+            )
+
+            for key in keys:
+                yield key
+
+            if int(cursor) == 0:
+                return
+
+    def __getattr__(self, name):
+
+        attribute = getattr(self.client, name)
+
+        if not callable(attribute) or name in ["pubsub", "lock", "register_script"]:
+            return attribute
+
+        def command(*args, **kwargs):
+
+            retry = name in READS or (name == "execute_command" and args and args[0] == "XRANGE")
+
+            return self.attempt(lambda: attribute(*args, **kwargs), retry=retry)
+
+        return command
+
+
+class Resilience(object):
+    """
+    Retry and circuit breaker settings, with each breaker's state as a metric
+    if given a chore_metrics.Registry
+    """
+
+    def __init__(self, retries=3, backoff=0.05, cap=1.0, failures=5, reset=30,
+                 registry=None, clock=time.time, sleep=time.sleep):
+
+        self.retries = retries
+        self.backoff = backoff
+        self.cap = cap
+        self.failures = failures
+        self.reset = reset
+        self.clock = clock
+        self.sleep = sleep
+
+        self.gauge = None
+
+        if registry is not None:
+            self.gauge = registry.gauge("chore_redis_breaker_state",
+                                        "Redis circuit breaker, 0 closed, 1 half open, 2 open")
+
+        # Each client's breaker by name
+
+        self.breakers = {}
+
+    def wrap(self, client, name="primary"):
+        """
+        Wraps a client with a breaker of its own, its state labelled with name
+        """
+
+        self.breakers[name] = CircuitBreaker(self.failures, self.reset, self.clock, self.gauge, {"client": name})
+
+        return ResilientRedis(self, client, self.breakers[name])
+
+    def delay(self, attempt):
+        """
+        Full jitter exponential backoff
+        """
+
+        return random.uniform(0, min(self.cap, self.backoff * 2 ** attempt))
+
+    def attempt(self, breaker, call, retry):
+        """
+        Makes a call through a breaker, retrying failures if it's safe to
+        """
+
+        attempt = 0
+
+        while True:
+
+            breaker.allow()
+
+            try:
+                result = call()
+            except FAILURES:
+                breaker.failure()
+
+                if not retry or attempt >= self.retries:
+                    raise
+
+                self.sleep(self.delay(attempt))
+                attempt += 1
+                continue
+            except Exception:
+
+                # Anything else, like a ResponseError, means Redis answered
+
+                breaker.success()
+                raise
+
+            breaker.success()
+
+            return result
@@ -0,0 +1,275 @@
+"""
+Recurring chores
+
+Schedules are kept in Redis, each a template, who and where to create it for,
+and how often, so anything can add them and a Scheduler can pick them all up
+when it (re)starts.  The Scheduler keeps when each fires next on a
+hierarchical timing wheel, so a tick costs the same however many schedules
+there are, and creates each firing's chores with create_many(), looking
+for schedules added, changed or removed elsewhere every so often.  Before
+firing it sets a key for that schedule and time only if it isn't there, so
+restarts, or more than one Scheduler, never create the same chores twice.  If
+creating them fails, the key's cleared and the firing's tried again next
+tick, so it's never skipped, though any chores created before it failed are
+created again.
+"""
+
+import json
+import math
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+def occurrence(schedule, when):
+    """
+    The latest time a schedule fires at or before when, None if it hasn't started
+    """
+
+    if when < schedule["start"]:
+        return None
+
+    return schedule["start"] + (when - schedule["start"]) // schedule["every"] * schedule["every"]
+
+
+def following(schedule, when):
+    """
+    The first time a schedule fires after when
+    """
+
+    latest = occurrence(schedule, when)
+
+    return schedule["start"] if latest is None else latest + schedule["every"]
+
+
+class TimingWheel(object):
+    """
+    Wheels of slots, each slot of a wheel a whole turn of the one before, so
+    items are added and come due in constant time per tick
+    """
+
+    def __init__(self, slots=64, levels=4, current=0):
+
+        self.slots = slots
+        self.levels = levels
+        self.current = current
+        self.wheels = [[[] for slot in range(slots)] for level in range(levels)]
+        self.late = []
+
+    def add(self, deadline, item):
+        """
+        Puts an item in the slot for its deadline tick, on the finest wheel that
+        reaches it
+        """
+
+        delta = deadline - self.current
+
+        if delta <= 0:
+            self.late.append(item)
+            return
+
+        # Anything past the last wheel goes on it, and is put back further on
+        # as that wheel turns
+
+        for level in range(self.levels):
+            if delta < self.slots ** (level + 1) or level == self.levels - 1:
+                self.wheels[level][deadline // self.slots ** level % self.slots].append((deadline, item))
+                return
+
+    def advance(self):
+        """
+        Moves on a tick, returning the items now due
+        """
+
+        self.current += 1
+
+        # As a wheel comes round to a slot, move what's there onto finer wheels
+
+        for level in reversed(range(1, self.levels)):
+
+            if self.current % self.slots ** level:
+                continue
+
+            slot = self.wheels[level][self.current // self.slots ** level % self.slots]
+            entries, slot[:] = list(slot), []
+
+            for deadline, item in entries:
+                self.add(deadline, item)
+
+        slot = self.wheels[0][self.current % self.slots]
+        due, self.late = self.late + [item for deadline, item in slot], []
+        slot[:] = []
+
+        return due
+
+
+class Scheduler(object):
+    """
+    Creates chores from the schedules in Redis when they're due
+    """
+
+    def __init__(self, chore_redis, resolution=1, slots=64, levels=4, grace=300, chunk=100, poll=10):
+
+        self.chore_redis = chore_redis
+        self.resolution = resolution
+        self.grace = grace
+        self.chunk = chunk
+        self.poll = poll
+
+        self.schedules = {}
+        self.wheel = TimingWheel(slots, levels, self.ticks(chore_redis.now()))
+
+    def ticks(self, when):
+        """
+        Which tick a time falls in, rounding up so nothing fires early
+        """
+
+        return int(math.ceil(when / self.resolution))
+
+    def add(self, id, template, assignments, every, start=0):
+        """
+        Stores a schedule creating chores from a template for (person, node)
+        assignments every so many seconds from start, and wheels it
+        """
+
+        schedule = {
+            "id": id,
+            "template": template,
+            "assignments": [list(assignment) for assignment in assignments],
+            "every": every,
+            "start": start
+        }
+
+        self.chore_redis.redis.hset(self.chore_redis.shared("schedules"), id, json.dumps(schedule))
+        self.plan(schedule, self.chore_redis.now())
+
+        return schedule
+
+    def remove(self, id):
+
+        self.chore_redis.redis.hdel(self.chore_redis.shared("schedules"), id)
+        self.schedules.pop(id, None)
+
+    def plan(self, schedule, after):
+        """
+        Wheels when a schedule fires next
+        """
+
+        when = following(schedule, after)
+
+        self.schedules[schedule["id"]] = schedule
+        self.wheel.add(self.ticks(when), (schedule, when))
+
+    def load(self):
+        """
+        Wheels all the stored schedules, firing any whose last time was missed
+        within grace, like while restarting
+        """
+
+        now = self.chore_redis.now()
+
+        for value in self.chore_redis.redis.hgetall(self.chore_redis.shared("schedules")).values():
+
+            schedule = json.loads(value)
+            latest = occurrence(schedule, now)
+
+            if latest is not None and now - latest <= self.grace:
+                self.fire(schedule, latest)
+
+            self.plan(schedule, now)
+
+        return len(self.schedules)
+
+    def sync(self):
+        """
+        Picks up schedules added, changed or removed elsewhere since we last
+        looked, returning how many there are now
+        """
+
+        now = self.chore_redis.now()
+
+        registry = self.chore_redis.redis.hgetall(self.chore_redis.shared("schedules"))
+        stored = {schedule["id"]: schedule for schedule in map(json.loads, registry.values())}
+
+        # Those gone are skipped when they come round, and those changed
+        # wheeled again, the old one skipped the same way
+
+        for id in list(self.schedules):
+            if id not in stored:
+                del self.schedules[id]
+
+        for id, schedule in stored.items():
+            if self.schedules.get(id) != schedule:
+                self.plan(schedule, now)
+
+        return len(self.schedules)
+
+    def fire(self, schedule, when):
+        """
+        Creates a schedule's chores for a time, unless they already were,
+        returning how many were
+        """
+
+        key = self.chore_redis.shared("schedules", schedule["id"], when)
+
+        if not self.chore_redis.redis.set(key, self.chore_redis.now(), nx=True,
+                                          ex=int(math.ceil(schedule["every"] + self.grace))):
+            return 0
+
+        # If we couldn't create them, let this, or another Scheduler, try again
+
+        try:
+            self.chore_redis.create_many(schedule["template"], schedule["assignments"], self.chunk)
+        except Exception:
+            self.chore_redis.redis.delete(key)
+            raise
+
+        return len(schedule["assignments"])
+
+    def tick(self):
+        """
+        Fires everything that's come due, returning how many chores were created
+        """
+
+        created = 0
+        target = self.ticks(self.chore_redis.now())
+
+        while self.wheel.current < target:
+            for schedule, when in self.wheel.advance():
+
+                # Skip any since removed or replaced
+
+                if self.schedules.get(schedule["id"]) is not schedule:
+                    continue
+
+                # If it fails, try it again next tick
+
+                try:
+                    created += self.fire(schedule, when)
+                except Exception:
+                    logger.exception("couldn't fire schedule %s", schedule["id"])
+                    self.wheel.add(self.wheel.current, (schedule, when))
+                    continue
+
+                self.plan(schedule, when)
+
+        return created
+
+    def run(self, stop):
+        """
+        Ticks until the stop threading.Event is set, looking for changed
+        schedules every poll seconds
+        """
+
+        self.load()
+        synced = self.chore_redis.now()
+
+        while not stop.is_set():
+
+            if self.chore_redis.now() - synced >= self.poll:
+                self.sync()
+                synced = self.chore_redis.now()
+
+            self.tick()
+            stop.wait(self.resolution)
@@ -0,0 +1,193 @@
+"""
+Time compressed load simulation of chores
+
+Drives many virtual nodes through create, remind and next on a virtual clock
+against the in memory backend, as fast as it can go, to see how a reminder
+sweep daemon would keep up before deploying one.
+"""
+
+import time
+import heapq
+import random
+
+# Installed, these are in the pi_k8s_fitches package, else on the path
+
+try:
+    from . import chore_redis
+    from . import chore_hooks
+    from . import chore_backend
+except ImportError:
+    import chore_redis
+    import chore_hooks
+    import chore_backend
+
+
+class VirtualClock(object):
+    """
+    Clock that only moves when told to
+    """
+
+    def __init__(self, now=0.0):
+
+        self.now = now
+
+    def __call__(self):
+
+        return self.now
+
+    def advance(self, to):
+
+        self.now = max(self.now, to)
+
+
+class LoadHook(chore_hooks.Hook):
+    """
+    Counts the Redis commands and round trips made
+    """
+
+    def __init__(self):
+
+        self.commands = 0
+        self.round_trips = 0
+
+    def after(self, kind, name, context, seconds, error):
+
+        if kind == "command":
+            self.commands += len(context.get("commands", [None]))
+            self.round_trips += 1
+
+
+def percentile(values, fraction):
+    """
+    Nearest rank percentile, 0 if there aren't any
+    """
+
+    values = sorted(values)
+
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0
+
+
+class Simulator(object):
+    """
+    Runs virtual nodes doing a chore from a template, with a sweep reminding
+    them every so often, kids taking around pace seconds per task
+    """
+
+    def __init__(self, template, nodes, sweep=10, pace=120, start=0, seed=None, backend=None):
+
+        self.template = template
+        self.nodes = [f"node-{index}" for index in range(nodes)]
+        self.sweep = sweep
+        self.pace = pace
+        self.random = random.Random(seed)
+
+        self.clock = VirtualClock(start)
+        self.load = LoadHook()
+        self.chore_redis = chore_redis.ChoreRedis(
+            None, None, "speech",
+            backend=backend if backend is not None else chore_backend.MemoryBackend(self.clock),
+            hooks=[self.load],
+            clock=self.clock
+        )
+
+        self.events = []
+        self.sequence = 0
+        self.operations = {}
+        self.lateness = []
+
+    def schedule(self, at, kind, node=None):
+
+        self.sequence += 1
+        heapq.heappush(self.events, (at, self.sequence, kind, node))
+
+    def count(self, operation, amount=1):
+
+        self.operations[operation] = self.operations.get(operation, 0) + amount
+
+    # When the current task's next reminder is due
+
+    due = staticmethod(chore_redis.due)
+
+    def press(self, node):
+        """
+        A kid pressing the button on a node, and eventually the next one
+        """
+
+        chore = self.chore_redis.get(node)
+        self.count("get")
+
+        if chore is None or "end" in chore:
+            return
+
+        self.chore_redis.next(chore)
+        self.count("next")
+
+        if "end" not in chore:
+            self.schedule(self.clock.now + self.random.expovariate(1.0 / self.pace), "press", node)
+
+    def remind(self):
+        """
+        The sweep daemon checking every chore, noting how late reminders went out
+        """
+
+        for chore in self.chore_redis.list():
+
+            due = self.due(chore)
+
+            if self.chore_redis.remind(chore):
+                self.lateness.append(self.clock.now - due)
+
+            self.count("remind")
+
+        self.count("list")
+        self.schedule(self.clock.now + self.sweep, "sweep")
+
+    def run(self, duration):
+        """
+        Runs everything for duration virtual seconds, reporting how it went
+        """
+
+        start = self.clock.now
+        wall = time.perf_counter()
+
+        # Everyone starts together, like the morning routine
+
+        self.chore_redis.create_many(self.template, [("kid", node) for node in self.nodes])
+        self.count("create", len(self.nodes))
+
+        for node in self.nodes:
+            self.schedule(start + self.random.expovariate(1.0 / self.pace), "press", node)
+
+        self.schedule(start + self.sweep, "sweep")
+
+        while self.events and self.events[0][0] <= start + duration:
+
+            at, _, kind, node = heapq.heappop(self.events)
+            self.clock.advance(at)
+
+            if kind == "press":
+                self.press(node)
+            else:
+                self.remind()
+
+        wall = time.perf_counter() - wall
+        operations = sum(self.operations.values())
+
+        return {
+            "nodes": len(self.nodes),
+            "virtual_seconds": duration,
+            "wall_seconds": wall,
+            "operations": dict(self.operations),
+            "throughput": operations / wall if wall else 0.0,
+            "reminders": len(self.lateness),
+            "lateness": {
+                "p50": percentile(self.lateness, 0.50),
+                "p99": percentile(self.lateness, 0.99),
+                "max": max(self.lateness) if self.lateness else 0
+            },
+            "redis": {
+                "commands": self.load.commands,
+                "round_trips": self.load.round_trips,
+                "commands_per_second": self.load.commands / duration if duration else 0.0
+            }
+        }
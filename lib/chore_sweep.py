@@ -0,0 +1,74 @@
+"""
+Reminder sweeps spread over processes
+
+Decoding chores and walking their tasks is CPU bound, so one process only
+gets so far on a big sweep.  sweep() lists the chores' ids once, splits them
+into partitions by a hash of the id, one per process, and hands each process
+its ids.  Each connects on its own, fetching its chores in batches, reminding
+them and pipelining what that writes.  The parent just adds up how each went.
+
+Each process makes its own ChoreRedis with factory, which has to be picklable,
+like functools.partial(chore_redis.ChoreRedis, "redis.com", 6379, "speech").
+"""
+
+import os
+import time
+import zlib
+import concurrent.futures
+
+
+def partition(id, partitions):
+    """
+    Which partition a chore's in
+    """
+
+    return zlib.crc32(str(id).encode("utf-8")) % partitions
+
+
+def remind(factory, index, ids, batch=100):
+    """
+    Sends any reminders due for one partition's chores, given their ids, how
+    it went
+    """
+
+    start = time.time()
+    chore_redis = factory()
+
+    reminded = 0
+
+    for offset in range(0, len(ids), batch):
+        reminded += chore_redis.remind_ids(ids[offset:offset + batch])
+
+    return {
+        "partition": index,
+        "chores": len(ids),
+        "reminded": reminded,
+        "seconds": time.time() - start
+    }
+
+
+def sweep(factory, processes=None, batch=100):
+    """
+    Sends any reminders due for all chores, a partition per process
+    """
+
+    processes = processes or os.cpu_count() or 1
+
+    start = time.time()
+
+    # Scan the keyspace just the once, here, rather than in every process
+
+    slices = [[] for index in range(processes)]
+
+    for id in factory().ids(batch=batch):
+        slices[partition(id, processes)].append(id)
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        partitions = list(pool.map(remind, [factory] * processes, range(processes), slices, [batch] * processes))
+
+    return {
+        "chores": sum(result["chores"] for result in partitions),
+        "reminded": sum(result["reminded"] for result in partitions),
+        "seconds": time.time() - start,
+        "partitions": partitions
+    }
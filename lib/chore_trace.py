@@ -0,0 +1,160 @@
+"""
+Recording and replaying ChoreRedis calls
+
+Recorder is a hook writing each outermost ChoreRedis call, with when it was
+made, to a compact JSON lines file (gzipped if the name ends in .gz).  Chores
+passed to transitions are recorded as just their id, and anything else JSON
+can't hold as its repr (create_many() and apply_batch() make what they're given
+a list before hooks see it, so those replay).  Recording never breaks the call,
+failing just logs.  Replayer re-runs a trace as fast as it can, getting each
+chore fresh, and reports throughput and latency.
+"""
+
+import gzip
+import json
+import time
+import logging
+import threading
+
+# Installed, these are in the pi_k8s_fitches package, else on the path
+
+try:
+    from . import chore_hooks
+except ImportError:
+    import chore_hooks
+
+
+logger = logging.getLogger(__name__)
+
+
+def opener(path, mode):
+    """
+    Opens plain or gzipped text
+    """
+
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+
+    return open(path, mode, encoding="utf-8")
+
+
+def percentile(values, fraction):
+    """
+    Nearest rank percentile of sorted values
+    """
+
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def encode(value):
+    """
+    JSON for what json.dumps can't do, lists for sets and the repr of anything
+    else, rather than go through something the caller still needs
+    """
+
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+
+    return repr(value)
+
+
+class Recorder(chore_hooks.Hook):
+    """
+    Hook writing every outermost call to a trace file
+    """
+
+    def __init__(self, path, clock=time.time):
+
+        self.file = opener(path, "a")
+        self.clock = clock
+        self.lock = threading.Lock()
+
+    def before(self, kind, name, context):
+
+        # Only what callers asked for, not what we did for them, and
+        # nothing once we're closed
+
+        if kind != "call" or context["parent"] is not None:
+            return
+
+        args = list(context["args"])
+
+        if args and isinstance(args[0], dict) and "id" in args[0] and name not in ["create", "set"]:
+            args[0] = {"chore": args[0]["id"]}
+
+        try:
+
+            line = json.dumps([self.clock(), name, args, context["kwargs"]], separators=(",", ":"),
+                              default=encode)
+
+            with self.lock:
+                if not self.file.closed:
+                    self.file.write(line + "\n")
+
+        except Exception:
+            logger.exception("couldn't record %s", name)
+
+    def close(self):
+
+        with self.lock:
+            self.file.close()
+
+
+class Replayer(object):
+    """
+    Replays a trace file against a ChoreRedis
+    """
+
+    def __init__(self, path):
+
+        with opener(path, "r") as trace:
+            self.calls = [json.loads(line) for line in trace if line.strip()]
+
+    def replay(self, chore_redis):
+        """
+        Runs all the calls as fast as possible, timing each
+        """
+
+        latencies = {}
+        missing = 0
+        wall = time.perf_counter()
+
+        for timestamp, name, args, kwargs in self.calls:
+
+            args = list(args)
+
+            # Get chores fresh, outside the timing, like callers would have
+
+            if args and isinstance(args[0], dict) and list(args[0]) == ["chore"]:
+                args[0] = chore_redis.get(args[0]["chore"])
+                if args[0] is None:
+                    missing += 1
+                    continue
+
+            start = time.perf_counter()
+            getattr(chore_redis, name)(*args, **kwargs)
+            latencies.setdefault(name, []).append(time.perf_counter() - start)
+
+        wall = time.perf_counter() - wall
+        calls = sum(len(values) for values in latencies.values())
+        busy = sum(sum(values) for values in latencies.values())
+
+        methods = {}
+
+        for name, values in latencies.items():
+            values.sort()
+            methods[name] = {
+                "count": len(values),
+                "p50": percentile(values, 0.50),
+                "p99": percentile(values, 0.99),
+                "max": values[-1]
+            }
+
+        return {
+            "calls": calls,
+            "missing": missing,
+            "traced_seconds": self.calls[-1][0] - self.calls[0][0] if self.calls else 0,
+            "wall_seconds": wall,
+            "throughput": calls / busy if busy else 0.0,
+            "methods": methods
+        }
@@ -0,0 +1,205 @@
+"""
+Reacting to chores as they change
+
+Watcher turns on Redis keyspace notifications and subscribes to those for
+chore keys, on every primary if there's shards, instead of polling.  Changed
+ids are gathered for a short while so a burst of changes is one batch, the
+batch fetched with one MGET, and a handler called with what the chores are
+now, None for any that are gone.  Losing the connection resubscribes, and
+fetching a batch is tried again, so the threads keep going through anything,
+a handler raising just being logged.
+"""
+
+import time
+import queue
+import logging
+import threading
+
+import redis
+
+
+# Keyspace events (K) for string commands ($), generic ones like DEL (g)
+# and expiring (x)
+
+FLAGS = "K$gx"
+
+logger = logging.getLogger(__name__)
+
+
+class Watcher(object):
+    """
+    Calls a handler with {id: chore} for batches of changed chores
+    """
+
+    def __init__(self, chore_redis, handler, debounce=0.05, batch=100, configure=True, timeout=0.1):
+
+        self.chore_redis = chore_redis
+        self.handler = handler
+        self.debounce = debounce
+        self.batch = batch
+        self.configure = configure
+        self.timeout = timeout
+
+        self.changed = queue.Queue()
+        self.pubsubs = []
+        self.threads = []
+        self.running = False
+
+    def notifications(self, client):
+        """
+        Turns on the keyspace notifications we need, keeping any already on
+        """
+
+        flags = client.config_get("notify-keyspace-events").get("notify-keyspace-events", "")
+
+        # A is all the classes of events, so just K's needed with that
+
+        missing = "".join(
+            flag for flag in FLAGS
+            if flag not in flags and not (flag != "K" and "A" in flags)
+        )
+
+        if missing:
+            client.config_set("notify-keyspace-events", flags + missing)
+
+    def start(self):
+        """
+        Subscribes to each primary's notifications and starts dispatching
+        """
+
+        self.running = True
+
+        for index, client in enumerate(self.chore_redis.shards or [self.chore_redis.redis]):
+
+            if self.configure:
+                self.notifications(client)
+
+            self.pubsubs.append(self.subscribe(client))
+            self.threads.append(threading.Thread(target=self.listen, args=(client, index), daemon=True))
+
+        self.threads.append(threading.Thread(target=self.run, daemon=True))
+
+        for thread in self.threads:
+            thread.start()
+
+        return self
+
+    def stop(self):
+
+        self.running = False
+
+        for thread in self.threads:
+            thread.join()
+
+        for pubsub in self.pubsubs:
+            pubsub.close()
+
+        self.threads = []
+        self.pubsubs = []
+
+    def subscribe(self, client):
+
+        pubsub = client.pubsub()
+        pubsub.psubscribe(f"__keyspace@*__:{self.chore_redis.prefix}/*")
+
+        return pubsub
+
+    def listen(self, client, index):
+        """
+        Queues the ids of chores (not their history and such) that changed,
+        subscribing again if the connection's lost
+        """
+
+        while self.running:
+
+            try:
+                message = self.pubsubs[index].get_message(timeout=self.timeout)
+            except redis.ConnectionError:
+                logger.warning("lost chore notifications, subscribing again", exc_info=True)
+                self.resubscribe(client, index)
+                continue
+
+            if message is None or message["type"] != "pmessage":
+                continue
+
+            id = self.chore_redis.parse(message["channel"].split(b":", 1)[1])
+
+            if id is not None:
+                self.changed.put(id)
+
+    def resubscribe(self, client, index):
+        """
+        Replaces a lost subscription, waiting a bit between tries
+        """
+
+        try:
+            self.pubsubs[index].close()
+        except redis.ConnectionError:
+            pass
+
+        while self.running:
+
+            time.sleep(self.timeout)
+
+            try:
+                self.pubsubs[index] = self.subscribe(client)
+                return
+            except redis.ConnectionError:
+                logger.warning("couldn't subscribe to chore notifications", exc_info=True)
+
+    def collect(self):
+        """
+        Waits for a change, then gathers others for a bit, up to a batch's worth
+        """
+
+        try:
+            ids = {self.changed.get(timeout=self.timeout): None}
+        except queue.Empty:
+            return []
+
+        deadline = time.time() + self.debounce
+
+        while len(ids) < self.batch:
+
+            remaining = deadline - time.time()
+
+            if remaining <= 0:
+                break
+
+            try:
+                ids[self.changed.get(timeout=remaining)] = None
+            except queue.Empty:
+                break
+
+        return list(ids)
+
+    def dispatch(self, ids):
+        """
+        Calls the handler with a batch, putting it back to try again if it
+        can't be fetched and logging whatever the handler raises
+        """
+
+        try:
+            chores = self.chore_redis.get_many(ids)
+        except redis.ConnectionError:
+            logger.warning("couldn't fetch changed chores, trying again", exc_info=True)
+
+            for id in ids:
+                self.changed.put(id)
+
+            time.sleep(self.timeout)
+            return
+
+        try:
+            self.handler(dict(zip(ids, chores)))
+        except Exception:
+            logger.exception("chore handler failed")
+
+    def run(self):
+
+        while self.running:
+
+            ids = self.collect()
+
+            if ids:
+                self.dispatch(ids)
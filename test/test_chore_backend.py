@@ -0,0 +1,490 @@
+import unittest
+import mock
+
+import hashlib
+import json
+
+import redis
+
+import chore_redis
+import chore_backend
+
+class TestMemoryBackend(unittest.TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        self.backend = chore_backend.MemoryBackend()
+
+    def test_encode(self):
+
+        self.assertEqual(chore_backend.encode(b"yep"), b"yep")
+        self.assertEqual(chore_backend.encode("yep"), b"yep")
+        self.assertEqual(chore_backend.encode(1), b"1")
+        self.assertEqual(chore_backend.encode(1.5), b"1.5")
+
+    def test_pipeline(self):
+
+        pipeline = self.backend.pipeline()
+
+        self.assertEqual(pipeline.set("a", 1), pipeline)
+        pipeline.get("a")
+
+        self.assertIsNone(self.backend.get("a"))
+        self.assertEqual(pipeline.execute(), [True, b"1"])
+        self.assertEqual(pipeline.execute(), [])
+
+    def test_pubsub(self):
+
+        channel = self.backend.pubsub()
+        pattern = self.backend.pubsub()
+
+        self.assertEqual(self.backend.publish("stuff", "nobody"), 0)
+
+        channel.subscribe("stuff")
+        pattern.psubscribe("st*")
+
+        self.assertEqual(self.backend.publish("stuff", "hi"), 2)
+        self.assertEqual(self.backend.publish("stump", "there"), 1)
+
+        self.assertEqual(channel.get_message(), {
+            "type": "message",
+            "pattern": None,
+            "channel": b"stuff",
+            "data": b"hi"
+        })
+        self.assertIsNone(channel.get_message())
+        self.assertIsNone(channel.get_message(timeout=0.01))
+
+        self.assertEqual(list(pattern.messages.queue), [
+            {
+                "type": "pmessage",
+                "pattern": b"st*",
+                "channel": b"stuff",
+                "data": b"hi"
+            },
+            {
+                "type": "pmessage",
+                "pattern": b"st*",
+                "channel": b"stump",
+                "data": b"there"
+            }
+        ])
+
+        self.assertEqual(next(pattern.listen())["data"], b"hi")
+
+        channel.unsubscribe()
+        pattern.punsubscribe("st*")
+
+        self.assertEqual(self.backend.publish("stuff", "gone"), 0)
+        self.assertEqual(list(pattern.listen()), [])
+
+        pattern.close()
+        self.assertNotIn(pattern, self.backend.subscribers)
+
+    @mock.patch("chore_backend.time.time")
+    def test_notifications(self, mock_time):
+
+        mock_time.return_value = 0
+
+        keyspace = self.backend.pubsub()
+        keyspace.psubscribe("__keyspace@*__:*")
+
+        self.backend.set("a", 1)
+        self.assertIsNone(keyspace.get_message())
+
+        self.assertTrue(self.backend.config_set("notify-keyspace-events", "K$g"))
+        self.assertEqual(self.backend.config_get("notify-*"), {"notify-keyspace-events": "K$g"})
+
+        self.backend.set("a", 2, ex=1)
+        self.backend.expire("a", 1)
+        self.backend.delete("a")
+
+        self.assertEqual(
+            [(message["channel"], message["data"]) for message in list(keyspace.messages.queue)],
+            [(b"__keyspace@0__:a", b"set"), (b"__keyspace@0__:a", b"expire"), (b"__keyspace@0__:a", b"del")]
+        )
+
+        self.backend.config_set("notify-keyspace-events", "KA")
+        self.backend.set("b", 1, ex=1)
+
+        mock_time.return_value = 1
+
+        self.assertIsNone(self.backend.get("b"))
+        self.assertEqual(list(keyspace.messages.queue)[-1]["data"], b"expired")
+
+    @mock.patch("chore_backend.time.time")
+    def test_strings(self, mock_time):
+
+        mock_time.return_value = 0
+
+        self.assertTrue(self.backend.set("a", "1"))
+        self.assertIsNone(self.backend.set("a", "2", nx=True))
+        self.assertTrue(self.backend.set("b", "3", ex=5))
+        self.assertTrue(self.backend.expire("a", 10))
+        self.assertFalse(self.backend.expire("c", 10))
+
+        self.assertEqual(self.backend.get("a"), b"1")
+        self.assertEqual(self.backend.mget(["a", "b", "c"]), [b"1", b"3", None])
+        self.assertEqual(sorted(self.backend.keys()), [b"a", b"b"])
+        self.assertEqual(list(self.backend.scan_iter(match="b")), [b"b"])
+        self.assertEqual(self.backend.scan(count=1), (1, [b"a"]))
+        self.assertEqual(self.backend.scan(1, count=1), (0, [b"b"]))
+
+        mock_time.return_value = 5
+
+        self.assertIsNone(self.backend.get("b"))
+        self.assertEqual(self.backend.keys(), [b"a"])
+
+        self.assertEqual(self.backend.delete("a", "b"), 1)
+        self.assertEqual(self.backend.data, {})
+
+    def test_lock(self):
+
+        lock = self.backend.lock("a", timeout=10)
+        other = self.backend.lock("a", sleep=0.001, blocking_timeout=0.01)
+
+        self.assertTrue(lock.acquire())
+        self.assertFalse(other.acquire(blocking=False))
+        self.assertFalse(other.acquire())
+        self.assertIn("a", self.backend.expires)
+
+        self.assertRaises(redis.exceptions.LockError, other.release)
+
+        lock.release()
+
+        with other:
+            self.assertEqual(self.backend.get("a"), other.token.encode("utf-8"))
+
+        self.assertIsNone(self.backend.get("a"))
+        self.assertRaises(redis.exceptions.LockError, lock.release)
+
+    def test_lists(self):
+
+        self.assertEqual(self.backend.lpush("a", 1, 2), 2)
+        self.assertEqual(self.backend.lpush("a", 3), 3)
+        self.assertEqual(self.backend.lrange("a", 0, -1), [b"3", b"2", b"1"])
+
+        self.assertTrue(self.backend.ltrim("a", 0, 1))
+        self.assertTrue(self.backend.ltrim("b", 0, 1))
+
+        self.assertEqual(self.backend.lrange("a", 1, 1), [b"2"])
+        self.assertEqual(self.backend.lrange("b", 0, -1), [])
+
+    def test_hashes(self):
+
+        self.assertEqual(self.backend.hset("d", "e", 1), 1)
+        self.assertEqual(self.backend.hset("d", "e", 2), 0)
+        self.assertEqual(self.backend.hgetall("d"), {b"e": b"2"})
+        self.assertEqual(self.backend.hdel("d", "e", "f"), 1)
+        self.assertEqual(self.backend.hdel("d", "e"), 0)
+        self.assertNotIn("d", self.backend.data)
+
+        self.assertEqual(self.backend.hincrby("a", "b", 2), 2)
+        self.assertEqual(self.backend.hincrby("a", "b"), 3)
+        self.assertEqual(self.backend.hincrbyfloat("a", "c", 0.5), 0.5)
+
+        self.assertEqual(self.backend.hgetall("a"), {
+            b"b": b"3",
+            b"c": b"0.5"
+        })
+        self.assertEqual(self.backend.hgetall("b"), {})
+
+    def test_clock(self):
+
+        now = [100]
+        backend = chore_backend.MemoryBackend(clock=lambda: now[0])
+
+        backend.set("a", "1", ex=5)
+
+        self.assertEqual(backend.execute_command("XADD", "b", "*", "c", 1), b"100000-0")
+
+        now[0] = 105
+
+        self.assertIsNone(backend.get("a"))
+
+    @mock.patch("chore_backend.time.time")
+    def test_streams(self, mock_time):
+
+        mock_time.return_value = 1
+
+        self.assertEqual(self.backend.execute_command("XADD", "a", "MAXLEN", "~", 2, "*", "b", 1), b"1000-0")
+        self.assertEqual(self.backend.execute_command("XADD", "a", "MAXLEN", "~", 2, "*", "b", 2), b"1000-1")
+
+        mock_time.return_value = 2
+
+        self.assertEqual(self.backend.execute_command("XADD", "a", "MAXLEN", 2, "*", "b", 3), b"2000-0")
+        self.assertEqual(self.backend.execute_command("XADD", "c", "*", "d", 4), b"2000-1")
+
+        self.assertEqual(self.backend.execute_command("XRANGE", "a", "-", "+"), [
+            [b"1000-1", [b"b", b"2"]],
+            [b"2000-0", [b"b", b"3"]]
+        ])
+        self.assertEqual(self.backend.execute_command("XRANGE", "a", "-", "1000", "COUNT", 5), [
+            [b"1000-1", [b"b", b"2"]]
+        ])
+        self.assertEqual(self.backend.execute_command("XRANGE", "a", "1000-2", "+", "COUNT", 1), [
+            [b"2000-0", [b"b", b"3"]]
+        ])
+        self.assertEqual(self.backend.execute_command("XRANGE", "e", "-", "+"), [])
+
+        self.assertRaisesRegex(redis.ResponseError, "unknown command 'EVAL'",
+                               self.backend.execute_command, "EVAL", "return 1", 0)
+        self.assertRaisesRegex(redis.ResponseError, "unknown command 'XLEN'",
+                               self.backend.execute_command, "XLEN", "a")
+
+    @mock.patch("chore_backend.time.time")
+    def test_scripts(self, mock_time):
+
+        mock_time.return_value = 2
+
+        channel = self.backend.pubsub()
+        channel.subscribe("f")
+
+        publish_once = self.backend.register_script(chore_backend.PUBLISH_ONCE)
+
+        self.assertEqual(publish_once.sha, hashlib.sha1(chore_backend.PUBLISH_ONCE.encode("utf-8")).hexdigest())
+        self.assertEqual(publish_once(keys=["g"], args=[5, "f", "hi"]), 1)
+        self.assertEqual(publish_once(keys=["g"], args=[5, "f", "hi"]), -1)
+        self.assertEqual(self.backend.expires["g"], 7)
+        self.assertEqual(channel.messages.qsize(), 1)
+
+        # Queued in a pipeline until it's run
+
+        pipeline = self.backend.pipeline()
+        self.assertIs(publish_once(keys=["h"], args=[5, "f", "hi"], client=pipeline), pipeline)
+        self.assertEqual(channel.messages.qsize(), 1)
+        self.assertEqual(pipeline.execute(), [1])
+        self.assertEqual(channel.messages.qsize(), 2)
+
+        # Loads the script if Redis doesn't know the SHA1
+
+        publish_once.sha = "nope"
+        self.assertEqual(publish_once(keys=["i"], args=[5, "f", "hi"]), 1)
+        self.assertEqual(publish_once.sha, self.backend.script_load(chore_backend.PUBLISH_ONCE))
+
+        self.assertRaises(redis.exceptions.NoScriptError, self.backend.evalsha, "nope", 0)
+        self.assertRaisesRegex(redis.ResponseError, "only PUBLISH_ONCE",
+                               self.backend.script_load, "return 1")
+
+class TestChoreRedisMemory(unittest.TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        self.backend = chore_backend.MemoryBackend()
+        self.chore_redis = chore_redis.ChoreRedis(None, None, "stuff", backend=self.backend,
+                                                  events="events", archive=10, history=10, statistics=True,
+                                                  locking=5)
+
+    @mock.patch("chore_redis.time.time")
+    def test_chore(self, mock_time):
+
+        mock_time.return_value = 7
+
+        speech = self.backend.pubsub()
+        speech.subscribe("stuff")
+
+        events = self.backend.pubsub()
+        events.subscribe("events")
+
+        chore = self.chore_redis.create({
+            "text": "get ready",
+            "language": "en",
+            "tasks": [
+                {
+                    "text": "wake up"
+                }
+            ]
+        }, "kid", "bump")
+
+        self.assertEqual(self.chore_redis.list(), [chore])
+        self.assertEqual(json.loads(speech.get_message()["data"])["text"], "kid, time to get ready")
+        self.assertEqual(json.loads(events.get_message()["data"])["action"], "create")
+
+        self.assertTrue(self.chore_redis.next(chore))
+
+        self.assertEqual(self.chore_redis.list(), [])
+        self.assertIsNone(self.backend.get("/chore/bump/lock"))
+        self.assertEqual(self.chore_redis.archived(), [chore])
+        self.assertEqual(self.chore_redis.stats()["wake up"]["completed"], 1)
+        self.assertEqual(
+            [entry["action"] for batch in self.chore_redis.transitions("bump") for entry in batch],
+            ["create", "next"]
+        )
+
+    @mock.patch("chore_redis.time.time")
+    def test_idempotency(self, mock_time):
+
+        mock_time.return_value = 7
+
+        speech = self.backend.pubsub()
+        speech.subscribe("stuff")
+
+        self.chore_redis.create({
+            "text": "get ready",
+            "language": "en",
+            "tasks": [
+                {
+                    "text": "wake up",
+                    "interval": 5
+                }
+            ]
+        }, "kid", "bump")
+
+        self.chore_redis.idempotency = 10
+
+        # Two workers both seeing it's due, before either's write lands,
+        # only say it once
+
+        mock_time.return_value = 13
+
+        first = self.chore_redis.get("bump")
+        second = self.chore_redis.get("bump")
+
+        self.assertTrue(self.chore_redis.remind(first))
+
+        with mock.patch.object(self.chore_redis, "refresh"):
+            self.assertTrue(self.chore_redis.remind(second))
+
+        # Otherwise the second sees the first's reminder under the lock
+
+        third = self.chore_redis.get("bump")
+        third["tasks"][0]["notified"] = 7
+
+        self.assertFalse(self.chore_redis.remind(third))
+        self.assertEqual(third["tasks"][0]["notified"], 13)
+
+        self.assertEqual(
+            [json.loads(message["data"])["text"] for message in list(speech.messages.queue)],
+            ["kid, time to get ready", "kid, please wake up", "kid, please wake up"]
+        )
+        self.assertIn("/chore/bump/spoken/remind/0/7", self.backend.data)
+
+    @mock.patch("chore_redis.time.time")
+    def test_idempotency_check(self, mock_time):
+
+        mock_time.return_value = 7
+
+        speech = self.backend.pubsub()
+        speech.subscribe("stuff")
+
+        self.chore_redis.idempotency = 10
+
+        template = {
+            "text": "get ready",
+            "language": "en",
+            "tasks": [
+                {
+                    "text": "wake up"
+                },
+                {
+                    "text": "get dressed"
+                }
+            ]
+        }
+
+        # Creating it twice, or two workers both moving it on before either's
+        # write lands, says what starts and finishes only once
+
+        self.chore_redis.create(template, "kid", "bump")
+        self.chore_redis.create(template, "kid", "bump")
+
+        for task in range(2):
+
+            mock_time.return_value += 1
+
+            first = self.chore_redis.get("bump")
+            second = self.chore_redis.get("bump")
+
+            with mock.patch.object(self.chore_redis, "refresh"):
+                self.assertTrue(self.chore_redis.next(first))
+                self.assertTrue(self.chore_redis.next(second))
+
+        self.assertEqual([json.loads(message["data"])["text"] for message in list(speech.messages.queue)], [
+            "kid, time to get ready",
+            "kid, please wake up",
+            "kid, you did wake up",
+            "kid, please get dressed",
+            "kid, you did get dressed",
+            "kid, thank you. You did get ready"
+        ])
+
+    @mock.patch("chore_redis.time.time")
+    def test_coalesce_sweep(self, mock_time):
+
+        mock_time.return_value = 7
+
+        chores = chore_redis.ChoreRedis(None, None, "stuff", backend=self.backend, coalesce=60)
+
+        speech = self.backend.pubsub()
+        speech.subscribe("stuff")
+
+        chore = chores.create({
+            "text": "get ready",
+            "language": "en",
+            "tasks": [
+                {
+                    "text": "wake up",
+                    "interval": 5
+                },
+                {
+                    "text": "get dressed",
+                    "interval": 5
+                }
+            ]
+        }, "kid", "bump")
+        chores.timer.cancel()
+        chores.flush()
+
+        # The button press is only waiting to be written when the sweep comes
+
+        mock_time.return_value = 20
+
+        self.assertTrue(chores.next(chore))
+        chores.timer.cancel()
+
+        self.assertEqual(chores.list(), [chore])
+        self.assertEqual(chores.remind_all(), 0)
+
+        chores.flush()
+
+        self.assertEqual(chores.get("bump")["tasks"][0]["end"], 20)
+        self.assertEqual(
+            [json.loads(message["data"])["text"] for message in list(speech.messages.queue)][-2:],
+            ["kid, you did wake up", "kid, please get dressed"]
+        )
+
+        # Not written at all yet still counts, and written in a batch isn't waiting
+
+        other = dict(chore, id="dump", node="dump")
+        chores.set(other)
+        chores.timer.cancel()
+
+        self.assertEqual([listed["id"] for listed in chores.list()], ["bump", "dump"])
+
+        with chores.batch():
+            chores.set(other)
+
+        self.assertEqual(chores.dirty, {})
+
+    def test_coalesce(self):
+
+        chores = chore_redis.ChoreRedis(None, None, "stuff", backend=self.backend, coalesce=0.01)
+
+        chore = {
+            "id": "bump",
+            "node": "bump",
+            "text": "things"
+        }
+
+        chores.set(chore)
+        timer = chores.timer
+        self.assertIsNone(self.backend.get("/chore/bump"))
+
+        timer.join(1)
+
+        self.assertEqual(json.loads(self.backend.get("/chore/bump")), chore)
+        self.assertIsNone(chores.timer)
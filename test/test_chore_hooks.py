@@ -0,0 +1,141 @@
+import unittest
+
+import chore_redis
+import chore_hooks
+import chore_backend
+
+class RecordingHook(chore_hooks.Hook):
+
+    def __init__(self):
+
+        self.seen = []
+
+    def before(self, kind, name, context):
+
+        self.seen.append(("before", kind, name, context.get("id"), context.get("action"), context.get("task")))
+
+    def after(self, kind, name, context, seconds, error):
+
+        parent = context["parent"]
+
+        self.seen.append(("after", kind, name, parent["id"] if parent else None, repr(error) if error else None))
+
+class TestChoreHooks(unittest.TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        self.hook = RecordingHook()
+        self.backend = chore_backend.MemoryBackend()
+        self.chore_redis = chore_redis.ChoreRedis(None, None, "stuff", backend=self.backend, hooks=[self.hook])
+
+    def test_hook(self):
+
+        hook = chore_hooks.Hook()
+
+        self.assertIsNone(hook.before("call", "get", {}))
+        self.assertIsNone(hook.after("call", "get", {}, 0.1, None))
+
+    def test_describe(self):
+
+        chore = {"id": "bump", "tasks": [{"id": 3}]}
+
+        self.assertEqual(chore_redis.describe("get", ("bump",), {}), {
+            "args": ("bump",),
+            "kwargs": {},
+            "id": "bump",
+            "action": None,
+            "task": None
+        })
+
+        self.assertEqual(chore_redis.describe("create", ({}, "kid", "bump"), {})["id"], "bump")
+        self.assertEqual(chore_redis.describe("list", (), {})["id"], None)
+
+        context = chore_redis.describe("pause", (chore, 3), {})
+        self.assertEqual((context["id"], context["action"], context["task"]), ("bump", "pause", 3))
+
+        context = chore_redis.describe("next", (chore,), {})
+        self.assertEqual((context["id"], context["action"], context["task"]), ("bump", "next", None))
+
+        context = chore_redis.describe("set", (chore, "next", chore["tasks"][0]), {})
+        self.assertEqual((context["id"], context["action"], context["task"]), ("bump", "next", 3))
+
+        context = chore_redis.describe("set", (chore, "create", None), {})
+        self.assertEqual((context["id"], context["action"], context["task"]), ("bump", "create", None))
+
+    def test_hooks(self):
+
+        chore = {
+            "id": "bump",
+            "node": "bump",
+            "person": "kid",
+            "text": "stuff",
+            "language": "en",
+            "tasks": [
+                {
+                    "id": 0,
+                    "text": "do it",
+                    "start": 0
+                },
+                {
+                    "id": 1,
+                    "text": "next it",
+                    "start": 0,
+                    "end": 0
+                }
+            ]
+        }
+
+        self.assertIsInstance(self.chore_redis.redis, chore_hooks.HookedRedis)
+        self.assertEqual(self.chore_redis.hooks.hooks, [self.hook])
+
+        self.assertTrue(self.chore_redis.next(chore))
+
+        self.assertEqual(self.hook.seen, [
+            ("before", "call", "next", "bump", "next", None),
+            ("before", "call", "speak", "bump", None, None),
+            ("before", "command", "publish", None, None, None),
+            ("after", "command", "publish", "bump", None),
+            ("after", "call", "speak", "bump", None),
+            ("before", "call", "check", "bump", None, None),
+            ("before", "call", "speak", "bump", None, None),
+            ("before", "command", "publish", None, None, None),
+            ("after", "command", "publish", "bump", None),
+            ("after", "call", "speak", "bump", None),
+            ("after", "call", "check", "bump", None),
+            ("before", "call", "set", "bump", "next", 0),
+            ("before", "command", "execute", None, None, None),
+            ("after", "command", "execute", "bump", None),
+            ("after", "call", "set", "bump", None),
+            ("after", "call", "next", None, None)
+        ])
+        self.assertEqual(self.chore_redis.hooks.stack(), [])
+
+        self.hook.seen = []
+
+        self.assertRaises(KeyError, self.chore_redis.speak, {}, "hi")
+
+        self.assertEqual(self.hook.seen, [
+            ("before", "call", "speak", None, None, None),
+            ("after", "call", "speak", None, "KeyError('node')")
+        ])
+        self.assertEqual(self.chore_redis.hooks.stack(), [])
+
+    def test_pipeline(self):
+
+        pipeline = self.chore_redis.redis.pipeline()
+
+        self.assertIsInstance(pipeline, chore_hooks.HookedPipeline)
+        self.assertEqual(pipeline.set("a", 1), pipeline)
+        self.assertEqual(pipeline.get("a"), pipeline)
+        self.assertEqual(pipeline.commands, [("set", ("a", 1), {}), ("get", ("a",), {})])
+        self.assertEqual(pipeline.execute(), [True, b"1"])
+        self.assertEqual(pipeline.commands, [])
+
+        self.assertEqual(self.hook.seen, [
+            ("before", "command", "execute", None, None, None),
+            ("after", "command", "execute", None, None)
+        ])
+
+        self.assertEqual(self.chore_redis.redis.data, {"a": b"1"})
@@ -0,0 +1,238 @@
+import unittest
+import mock
+import tempfile
+import os
+
+import json
+
+import redis
+
+import chore_redis
+import chore_backend
+import chore_journal
+
+class TestChoreJournal(unittest.TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "journal.jsonl")
+        self.journal = chore_journal.Journal(self.path)
+        self.backend = chore_backend.MemoryBackend()
+        self.chore_redis = chore_redis.ChoreRedis(None, None, "stuff", backend=self.backend, journal=self.journal)
+
+    def tearDown(self):
+
+        self.directory.cleanup()
+
+    def chore(self, id, notified):
+
+        return {
+            "id": id,
+            "node": id,
+            "person": "kid",
+            "text": "stuff",
+            "language": "en",
+            "start": 1,
+            "tasks": [
+                {
+                    "id": 0,
+                    "text": "do it",
+                    "start": 1,
+                    "notified": notified
+                }
+            ]
+        }
+
+    def test_version(self):
+
+        self.assertEqual(chore_journal.version({}), 0)
+        self.assertEqual(chore_journal.version(self.chore("bump", 5)), 5)
+        self.assertEqual(chore_journal.version({"end": 7, "tasks": [{"notified": 5}]}), 7)
+
+    def test_append_entries(self):
+
+        self.assertFalse(self.journal.pending)
+        self.assertEqual(self.journal.entries(), [])
+
+        self.journal.append(self.chore("bump", 2))
+        self.journal.append(self.chore("dump", 3))
+        self.journal.append(self.chore("bump", 4))
+
+        with open(self.path, "a") as journal:
+            journal.write('{"version": 5, "cho')
+
+        self.assertTrue(self.journal.pending)
+        self.assertEqual(self.journal.entries(), [
+            {"version": 3, "chore": self.chore("dump", 3)},
+            {"version": 4, "chore": self.chore("bump", 4)}
+        ])
+
+        self.assertTrue(chore_journal.Journal(self.path).pending)
+
+    def test_replay(self):
+
+        self.chore_redis.set(self.chore("dump", 9))
+
+        for index in range(3):
+            self.journal.append(self.chore(f"node-{index}", 2))
+        self.journal.append(self.chore("dump", 3))
+
+        self.assertEqual(self.journal.replay(self.chore_redis, batch=2), {
+            "replayed": 3,
+            "skipped": 1
+        })
+
+        self.assertFalse(self.journal.pending)
+        self.assertEqual(self.journal.entries(), [])
+        self.assertEqual(self.chore_redis.get("node-2"), self.chore("node-2", 2))
+        self.assertEqual(self.chore_redis.get("dump"), self.chore("dump", 9))
+
+    def test_replay_failure(self):
+
+        self.journal.append(self.chore("bump", 2))
+
+        with mock.patch.object(self.backend, "mget", side_effect=redis.ConnectionError("down")):
+            self.assertRaises(redis.ConnectionError, self.journal.replay, self.chore_redis)
+
+        self.assertTrue(self.journal.pending)
+        self.assertEqual(len(self.journal.entries()), 1)
+
+    @mock.patch("chore_redis.time.time")
+    def test_offline(self, mock_time):
+
+        mock_time.return_value = 7
+
+        chore = self.chore("bump", 1)
+        self.chore_redis.set(chore)
+
+        # Redis goes away, but the button presses are kept
+
+        with mock.patch.object(self.backend, "publish", side_effect=redis.ConnectionError("down")), \
+             mock.patch.object(chore_backend.MemoryPipeline, "execute", side_effect=redis.ConnectionError("down")):
+            self.assertTrue(self.chore_redis.next(chore))
+
+        self.assertTrue(self.journal.pending)
+        self.assertEqual(self.chore_redis.get("bump"), self.chore("bump", 1))
+
+        # Once it's back, the next set catches up
+
+        self.chore_redis.set(self.chore("dump", 1))
+
+        self.assertFalse(self.journal.pending)
+        self.assertEqual(self.chore_redis.get("bump"), chore)
+        self.assertEqual(self.chore_redis.get("bump")["end"], 7)
+
+    @mock.patch("chore_redis.time.time")
+    def test_offline_reread(self, mock_time):
+
+        mock_time.return_value = 7
+
+        self.chore_redis.reread = True
+
+        chore = self.chore("bump", 1)
+        self.chore_redis.set(chore)
+
+        # Not being able to re-read it doesn't lose the button press either
+
+        with mock.patch.object(self.backend, "mget", side_effect=redis.ConnectionError("down")), \
+             mock.patch.object(self.backend, "publish", side_effect=redis.ConnectionError("down")), \
+             mock.patch.object(chore_backend.MemoryPipeline, "execute", side_effect=redis.ConnectionError("down")):
+            self.assertTrue(self.chore_redis.next(chore))
+
+        self.assertTrue(self.journal.pending)
+        self.assertEqual(self.journal.entries(), [{"version": 7, "chore": chore}])
+
+    @mock.patch("chore_redis.time.time")
+    def test_offline_batch(self, mock_time):
+
+        mock_time.return_value = 7
+
+        template = {
+            "text": "stuff",
+            "language": "en",
+            "tasks": [
+                {
+                    "text": "do it"
+                },
+                {
+                    "text": "do more"
+                }
+            ]
+        }
+
+        down = [
+            mock.patch.object(self.backend, "mget", side_effect=redis.ConnectionError("down")),
+            mock.patch.object(self.backend, "publish", side_effect=redis.ConnectionError("down")),
+            mock.patch.object(chore_backend.MemoryPipeline, "execute", side_effect=redis.ConnectionError("down"))
+        ]
+
+        for patch in down:
+            patch.start()
+
+        # Batches are journaled too, and go on from what was journaled
+
+        chores = self.chore_redis.create_many(template, [("kid", "bump"), ("kid", "dump")])
+
+        self.assertEqual([entry["chore"] for entry in self.journal.entries()], chores)
+
+        mock_time.return_value = 8
+
+        self.assertEqual(self.chore_redis.apply_batch([
+            ("bump", "next", []),
+            ("stump", "next", [])
+        ]), [True, None])
+
+        for patch in down:
+            patch.stop()
+
+        self.assertEqual(self.backend.data, {})
+
+        # Once it's back, it all catches up
+
+        self.chore_redis.set(self.chore("other", 1))
+
+        self.assertFalse(self.journal.pending)
+        self.assertEqual(self.chore_redis.get("bump")["tasks"][0]["end"], 8)
+        self.assertEqual(self.chore_redis.get("bump")["tasks"][1]["start"], 8)
+        self.assertEqual(self.chore_redis.get("dump"), chores[1])
+
+    def test_offline_without_journal(self):
+
+        self.chore_redis.journal = None
+
+        with mock.patch.object(self.backend, "publish", side_effect=redis.ConnectionError("down")):
+            self.assertRaises(redis.ConnectionError, self.chore_redis.speak, self.chore("bump", 1), "hi")
+
+        with mock.patch.object(chore_backend.MemoryPipeline, "execute", side_effect=redis.ConnectionError("down")):
+            self.assertRaises(redis.ConnectionError, self.chore_redis.set, self.chore("bump", 1))
+
+    def test_still_offline(self):
+
+        self.journal.append(self.chore("bump", 1))
+
+        with mock.patch.object(self.backend, "mget", side_effect=redis.ConnectionError("down")):
+            self.chore_redis.set(self.chore("dump", 1))
+
+        self.assertTrue(self.journal.pending)
+        self.assertEqual(json.loads(self.backend.get("/chore/dump")), self.chore("dump", 1))
+
+    def test_flush_offline(self):
+
+        self.chore_redis.coalesce = 60
+        self.chore_redis.defer(self.chore("bump", 1))
+        self.chore_redis.timer.cancel()
+
+        with mock.patch.object(chore_backend.MemoryPipeline, "execute", side_effect=redis.ConnectionError("down")):
+            self.assertEqual(self.chore_redis.flush(), 1)
+
+        self.assertEqual(self.journal.entries(), [{"version": 1, "chore": self.chore("bump", 1)}])
+
+        self.chore_redis.journal = None
+        self.chore_redis.defer(self.chore("bump", 1))
+        self.chore_redis.timer.cancel()
+
+        with mock.patch.object(chore_backend.MemoryPipeline, "execute", side_effect=redis.ConnectionError("down")):
+            self.assertRaises(redis.ConnectionError, self.chore_redis.flush)
@@ -0,0 +1,57 @@
+import unittest
+
+import json
+
+import chore_messages
+
+class TestCatalog(unittest.TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        self.catalog = chore_messages.Catalog({
+            "es": {
+                "please": "porfa, {text}"
+            },
+            "pig": {
+                "please": "easeplay {text}"
+            }
+        })
+
+    def test___init__(self):
+
+        self.assertEqual(self.catalog.messages["es"]["please"], "porfa, {text}")
+        self.assertEqual(self.catalog.messages["es"]["start"], "es hora de {text}")
+        self.assertEqual(chore_messages.MESSAGES["es"]["please"], "por favor, {text}")
+        self.assertEqual(self.catalog.default, "en")
+
+    def test_renderer(self):
+
+        renderer = self.catalog.renderer("fr", "start")
+
+        self.assertEqual(renderer(text="ranger"), "c'est l'heure de ranger")
+        self.assertIs(self.catalog.renderer("fr", "start"), renderer)
+
+        # Falls back to the default for languages, or phrases, we don't have
+
+        self.assertEqual(self.catalog.render("xx", "please", text="do it"), "please do it")
+        self.assertEqual(self.catalog.render("pig", "please", text="do it"), "easeplay do it")
+        self.assertEqual(self.catalog.render("pig", "did", text="do it"), "you did do it")
+        self.assertEqual(self.catalog.render("en", "address", person="kid", text="hi"), "kid, hi")
+
+    def test_message(self):
+
+        for timestamp, node, language, text in [
+            (7, "bump", "en", "kid, hi"),
+            (7.25, 'du"mp', "es", "niño, ¿qué?\n"),
+            (1543149296.123456, "stump", "100%", "%s, 50%")
+        ]:
+            self.assertEqual(self.catalog.message(timestamp, node, language, text), json.dumps({
+                "timestamp": timestamp,
+                "node": node,
+                "text": text,
+                "language": language
+            }))
+
+        self.assertIn("100%", self.catalog.envelopes)
@@ -0,0 +1,108 @@
+import unittest
+
+import chore_redis
+import chore_backend
+import chore_hooks
+import chore_metrics
+
+class TestChoreMetrics(unittest.TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        self.registry = chore_metrics.Registry()
+
+    def test_size(self):
+
+        self.assertEqual(chore_metrics.size(b"abc"), 3)
+        self.assertEqual(chore_metrics.size("é"), 2)
+        self.assertEqual(chore_metrics.size(12), 2)
+        self.assertEqual(chore_metrics.size(None), 0)
+        self.assertEqual(chore_metrics.size(["ab", (b"c",)]), 3)
+        self.assertEqual(chore_metrics.size({"ab": b"c"}), 3)
+
+    def test_labeled(self):
+
+        self.assertEqual(chore_metrics.labeled("a", ()), "a")
+        self.assertEqual(chore_metrics.labeled("a", (("b", "c"),), ("le", 1)), 'a{b="c",le="1"}')
+
+    def test_registry(self):
+
+        counter = self.registry.counter("things_total", "Things")
+        gauge = self.registry.gauge("state", "State")
+        histogram = self.registry.histogram("took_seconds", "Took", [1, 2])
+
+        self.assertEqual(self.registry.counter("things_total", "Things"), counter)
+
+        counter.inc(method="get")
+        counter.inc(2, method="get")
+        gauge.set(1)
+        histogram.observe(0.5, method="get")
+        histogram.observe(1.5, method="get")
+        histogram.observe(3, method="get")
+
+        self.assertEqual(self.registry.exposition(), "\n".join([
+            '# HELP state State',
+            '# TYPE state gauge',
+            'state 1',
+            '# HELP things_total Things',
+            '# TYPE things_total counter',
+            'things_total{method="get"} 3',
+            '# HELP took_seconds Took',
+            '# TYPE took_seconds histogram',
+            'took_seconds_bucket{method="get",le="1"} 1',
+            'took_seconds_bucket{method="get",le="2"} 2',
+            'took_seconds_bucket{method="get",le="+Inf"} 3',
+            'took_seconds_sum{method="get"} 5.0',
+            'took_seconds_count{method="get"} 3',
+            ''
+        ]))
+
+    def test_instrumentation(self):
+
+        backend = chore_backend.MemoryBackend()
+        backend.pubsub().subscribe("stuff")
+
+        chores = chore_redis.ChoreRedis(None, None, "stuff", backend=backend, metrics=self.registry)
+
+        self.assertIsInstance(chores.redis, chore_hooks.HookedRedis)
+        self.assertEqual(chores.redis.data, {})
+        self.assertIsInstance(chores.redis.pubsub(), chore_backend.MemoryPubSub)
+
+        chore = chores.create({
+            "text": "get ready",
+            "language": "en",
+            "tasks": [
+                {
+                    "text": "wake up"
+                }
+            ]
+        }, "kid", "bump")
+
+        self.assertEqual(chores.get("bump"), chore)
+        self.assertRaises(TypeError, chores.pause, chore, "nope")
+
+        metrics = self.registry.metrics
+
+        self.assertEqual(metrics["chore_redis_commands_total"].values, {
+            (("command", "publish"),): 2,
+            (("command", "set"),): 1,
+            (("command", "get"),): 1
+        })
+
+        # Nested calls are timed but the Redis work is all the outermost's
+
+        self.assertEqual(metrics["chore_redis_call_seconds"].values[(("method", "speak"),)][2], 2)
+        self.assertEqual(metrics["chore_redis_call_seconds"].values[(("method", "set"),)][2], 1)
+        self.assertEqual(metrics["chore_redis_call_commands"].values[(("method", "create"),)][1], 3)
+        self.assertEqual(metrics["chore_redis_call_round_trips"].values[(("method", "create"),)][1], 3)
+        self.assertNotIn((("method", "speak"),), metrics["chore_redis_call_commands"].values)
+        self.assertEqual(metrics["chore_redis_call_commands"].values[(("method", "get"),)][1], 1)
+        self.assertEqual(metrics["chore_redis_call_errors_total"].values, {
+            (("method", "pause"),): 1
+        })
+        self.assertGreater(metrics["chore_redis_call_bytes"].values[(("method", "get"),)][1], 100)
+        self.assertGreater(metrics["chore_redis_received_bytes_total"].values[()], 100)
+
+        self.assertIn('chore_redis_call_seconds_count{method="create"} 1', self.registry.exposition())
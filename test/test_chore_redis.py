@@ -1,74 +1,1002 @@
 import unittest
 import mock
 import fnmatch
+import threading
+import concurrent.futures
 
 import json
 
+import redis
+
 import chore_redis
+import chore_hooks
+import chore_backend
+import chore_resilience
+import chore_messages
+
+class MockPipeline(object):
+
+    def __init__(self, redis, transaction=True):
+
+        self.redis = redis
+        self.transaction = transaction
+        self.commands = []
+        self.scripts = set()
+
+    def __getattr__(self, name):
+
+        def command(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return command
+
+    def execute(self):
+
+        self.redis.executes += 1
+
+        results = [
+            getattr(self.redis, name)(*args, **kwargs)
+            for name, args, kwargs in self.commands
+        ]
+        self.commands = []
+        return results
+
+class MockRedis(object):
+
+    def __init__(self, host, port):
+
+        self.host = host
+        self.port = port
+        self.channel = None
+
+        self.data = {}
+        self.messages = []
+        self.events = []
+        self.expires = {}
+        self.streams = {}
+        self.executes = 0
+
+    def pipeline(self, transaction=True):
+
+        return MockPipeline(self, transaction)
+
+    def publish(self, channel, message):
+
+        if channel == "events":
+            self.events.append(message)
+            return
+
+        self.channel = channel
+        self.messages.append(message)
+
+    def set(self, key, value, ex=None):
+
+        self.data[key] = value
+
+        if ex is not None:
+            self.expires[key] = ex
+
+    def delete(self, *keys):
+
+        for key in keys:
+            self.data.pop(key, None)
+
+    def lpush(self, key, *values):
+
+        self.data.setdefault(key, [])[0:0] = reversed(values)
+
+    def ltrim(self, key, start, stop):
+
+        self.data[key] = self.data[key][start:stop + 1 if stop != -1 else None]
+
+    def lrange(self, key, start, stop):
+
+        return self.data.get(key, [])[start:stop + 1 if stop != -1 else None]
+
+    def hincrby(self, key, field, amount):
+
+        hash = self.data.setdefault(key, {})
+        hash[field] = int(hash.get(field, 0)) + amount
+
+    def hincrbyfloat(self, key, field, amount):
+
+        hash = self.data.setdefault(key, {})
+        hash[field] = float(hash.get(field, 0)) + amount
+
+    def hgetall(self, key):
+
+        return {
+            field.encode("utf-8"): str(value).encode("utf-8")
+            for field, value in self.data.get(key, {}).items()
+        }
+
+    def register_script(self, script):
+
+        return chore_backend.MemoryScript(self, script)
+
+    def evalsha(self, sha, numkeys, name, seconds, channel, message):
+
+        # Just enough of publishing once, the only script
+
+        if name in self.data:
+            return -1
+
+        self.set(name, 1, ex=seconds)
+        return self.publish(channel, message)
+
+    def execute_command(self, command, key, *args):
+
+        # Just enough of streams, with each entry a second apart
+
+        if command == "XADD":
+            stream = self.streams.setdefault(key, [])
+            entry = f"{len(stream) * 1000}-0".encode("utf-8")
+            stream.append([entry, [str(arg).encode("utf-8") for arg in args[4:]]])
+            del stream[:-args[2]]
+            return entry
+
+        if command == "XRANGE":
+
+            def position(id, default):
+                if id in ["-", "+"]:
+                    return default
+                milliseconds, _, sequence = id.partition("-")
+                return (int(milliseconds), int(sequence or 0))
+
+            start = position(args[0], (0, 0))
+            end = position(args[1], (float("inf"), 0))
+
+            return [
+                [entry, values]
+                for entry, values in self.streams.get(key, [])
+                if start <= position(entry.decode("utf-8"), None) <= end
+            ][:args[3]]
+
+    def get(self, key):
+
+        if key in self.data:
+            return self.data[key]
+
+        return None
+
+    def mget(self, keys):
+
+        return [self.get(key) for key in keys]
+
+    def keys(self, pattern):
+
+        for key in sorted(self.data.keys()):
+            if fnmatch.fnmatch(key, pattern):
+                yield key.encode('utf-8')
+
+    def scan_iter(self, match=None, count=None):
+
+        return self.keys(match or "*")
+
+class TestChoreRedisFunctions(unittest.TestCase):
+
+    def test_due(self):
+
+        self.assertIsNone(chore_redis.due({"tasks": []}))
+        self.assertIsNone(chore_redis.due({"tasks": [{"start": 0, "end": 1}]}))
+        self.assertIsNone(chore_redis.due({"tasks": [{"start": 0, "notified": 0, "interval": 5, "paused": True}]}))
+        self.assertEqual(chore_redis.due({"tasks": [{"start": 0, "notified": 0, "interval": 5}]}), 5)
+        self.assertEqual(chore_redis.due({"tasks": [{"start": 0, "notified": 0, "interval": 5, "delay": 8}]}), 8)
+
+class TestChoreRedis(unittest.TestCase):
+
+    maxDiff = None
+
+    @mock.patch("redis.StrictRedis", MockRedis)
+    def setUp(self):
+
+        self.chore_redis = chore_redis.ChoreRedis("data.com", 667, "stuff")
+
+    def test___init___(self):
+
+        self.assertEqual(self.chore_redis.redis.host, "data.com")
+        self.assertEqual(self.chore_redis.redis.port, 667)
+        self.assertEqual(self.chore_redis.channel, "stuff")
+        self.assertIsNone(self.chore_redis.events)
+        self.assertIsNone(self.chore_redis.ttl)
+        self.assertIsNone(self.chore_redis.archive)
+        self.assertIsNone(self.chore_redis.history)
+        self.assertFalse(self.chore_redis.statistics)
+        self.assertIsNone(self.chore_redis.pipe)
+        self.assertIsNone(self.chore_redis.hooks)
+        self.assertIsNone(self.chore_redis.clock)
+        self.assertIsNone(self.chore_redis.journal)
+        self.assertIsNone(self.chore_redis.coalesce)
+        self.assertEqual(self.chore_redis.dirty, {})
+        self.assertIsNone(self.chore_redis.timer)
+        self.assertEqual(self.chore_redis.prefix, "/chore")
+        self.assertFalse(self.chore_redis.cluster)
+        self.assertEqual(self.chore_redis.shards, [])
+        self.assertIsNone(self.chore_redis.replica)
+        self.assertIsNone(self.chore_redis.staleness)
+        self.assertIsNone(self.chore_redis.checked)
+        self.assertFalse(self.chore_redis.fresh)
+        self.assertEqual(len(self.chore_redis.locks), 64)
+        self.assertIsNone(self.chore_redis.locking)
+        self.assertIsNone(self.chore_redis.idempotency)
+        self.assertIsInstance(self.chore_redis.catalog, chore_messages.Catalog)
+        self.assertEqual(self.chore_redis.indexes, {})
+
+    def test___init___sentinel(self):
+
+        primary = MockRedis("primary.com", 667)
+        replica = MockRedis("replica.com", 667)
+
+        sentinel = mock.MagicMock()
+        sentinel.master_for.return_value = primary
+        sentinel.slave_for.return_value = replica
+
+        chores = chore_redis.ChoreRedis(None, None, "stuff", sentinel=sentinel, service="chores", staleness=5)
+
+        self.assertIs(chores.redis, primary)
+        self.assertIs(chores.replica, replica)
+        self.assertEqual(chores.staleness, 5)
+        sentinel.master_for.assert_called_once_with("chores")
+        sentinel.slave_for.assert_called_once_with("chores")
+
+    def test_pipe(self):
+
+        self.chore_redis.pipe = "mine"
+
+        pipes = []
+        thread = threading.Thread(target=lambda: pipes.append(self.chore_redis.pipe))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(pipes, [None])
+        self.assertEqual(self.chore_redis.pipe, "mine")
+
+    def test_lock(self):
+
+        with self.chore_redis.lock("bump"):
+            with self.chore_redis.lock("bump"):
+                pass
+
+        # Locking in Redis only on the outermost hold
+
+        self.chore_redis.locking = 10
+        self.chore_redis.redis.lock = mock.MagicMock()
+
+        with self.chore_redis.lock("bump"):
+            with self.chore_redis.lock("bump"):
+                self.assertEqual(self.chore_redis.local.held, {"bump"})
+
+        self.chore_redis.redis.lock.assert_called_once_with("/chore/bump/lock", timeout=10)
+        self.chore_redis.redis.lock.return_value.acquire.assert_called_once_with()
+        self.chore_redis.redis.lock.return_value.release.assert_called_once_with()
+        self.assertEqual(self.chore_redis.local.held, set())
+
+        # Another thread waits its turn
+
+        order = []
+
+        def other():
+            with self.chore_redis.lock("bump"):
+                order.append("other")
+
+        with self.chore_redis.lock("bump"):
+            thread = threading.Thread(target=other)
+            thread.start()
+            thread.join(0.05)
+            order.append("mine")
+
+        thread.join()
+
+        self.assertEqual(order, ["mine", "other"])
+
+    def test_holding(self):
+
+        self.chore_redis.locking = 10
+        self.chore_redis.redis.lock = mock.MagicMock()
+
+        with self.chore_redis.holding(["bump", "rump", "bump"]):
+            self.assertEqual(self.chore_redis.local.held, {"bump", "rump"})
+
+        # Always taken in the same order
+
+        self.assertEqual(
+            [call.args[0] for call in self.chore_redis.redis.lock.call_args_list],
+            [
+                f"/chore/{id}/lock"
+                for id in sorted(["bump", "rump"], key=lambda id: (self.chore_redis.stripe(id), id))
+            ]
+        )
+        self.assertEqual(self.chore_redis.local.held, set())
+
+    def test_latest(self):
+
+        self.chore_redis.redis.data["/chore/bump"] = json.dumps({"id": "bump"})
+
+        # Nothing to read unless others might change them
+
+        with mock.patch.object(self.chore_redis, "get_many") as get_many:
+            self.assertEqual(self.chore_redis.latest(["bump", "rump"]), [None, None])
+            get_many.assert_not_called()
+
+        self.chore_redis.reread = True
+        self.assertEqual(self.chore_redis.latest(["bump", "rump"]), [{"id": "bump"}, None])
+
+        # If Redis is down, it's only fine if we're journaling
+
+        with mock.patch.object(self.chore_redis, "get_many", side_effect=redis.ConnectionError("down")):
+
+            self.assertRaises(redis.ConnectionError, self.chore_redis.latest, ["bump"])
+
+            self.chore_redis.journal = mock.MagicMock()
+            self.assertEqual(self.chore_redis.latest(["bump"]), [None])
+
+    def test_refresh(self):
+
+        chore = {"id": "bump", "text": "old"}
+
+        chore_redis.ChoreRedis.refresh(chore, None)
+        self.assertEqual(chore, {"id": "bump", "text": "old"})
+
+        chore_redis.ChoreRedis.refresh(chore, {"id": "bump", "text": "new"})
+        self.assertEqual(chore, {"id": "bump", "text": "new"})
+
+    def test_reader(self):
+
+        self.assertEqual(self.chore_redis.reader(), self.chore_redis.redis)
+
+        replica = mock.MagicMock()
+        replica.info.return_value = {"master_link_status": "up", "master_last_io_seconds_ago": 3}
+
+        self.chore_redis.replica = replica
+        self.assertEqual(self.chore_redis.reader(), replica)
+        replica.info.assert_not_called()
+
+        # With a tolerance, only while it's caught up enough, checking once a second
+
+        now = [10]
+        self.chore_redis.clock = lambda: now[0]
+        self.chore_redis.staleness = 2
+
+        self.assertEqual(self.chore_redis.reader(), self.chore_redis.redis)
+        replica.info.assert_called_once_with("replication")
+
+        replica.info.return_value["master_last_io_seconds_ago"] = 1
+        self.assertEqual(self.chore_redis.reader(), self.chore_redis.redis)
+
+        now[0] = 11
+        self.assertEqual(self.chore_redis.reader(), replica)
+
+        now[0] = 12
+        replica.info.side_effect = redis.ConnectionError("down")
+        self.assertEqual(self.chore_redis.reader(), self.chore_redis.redis)
+        self.assertFalse(self.chore_redis.fresh)
+
+    def test_read(self):
+
+        chore = {
+            "id": "bump",
+            "node": "bump"
+        }
+
+        self.chore_redis.redis.data["/chore/bump"] = json.dumps(chore)
+
+        replica = MockRedis("replica.com", 667)
+        self.chore_redis.replica = replica
+
+        self.assertIsNone(self.chore_redis.get("bump"))
+        self.assertEqual(self.chore_redis.list(), [])
+
+        replica.data["/chore/bump"] = json.dumps(chore)
+
+        self.assertEqual(self.chore_redis.get("bump"), chore)
+        self.assertEqual(self.chore_redis.list(), [chore])
+
+        # If the replica's gone, read from the primary, not trying it again
+        # for a second
+
+        now = [10]
+        self.chore_redis.clock = lambda: now[0]
+
+        with mock.patch.object(replica, "get", side_effect=redis.ConnectionError("down")) as get:
+            replica.data = {}
+            self.chore_redis.redis.data["/chore/bump"] = json.dumps({"id": "dump"})
+            self.assertEqual(self.chore_redis.get("bump"), {"id": "dump"})
+            self.assertEqual(self.chore_redis.get("bump"), {"id": "dump"})
+            self.assertEqual(get.call_count, 1)
+
+        now[0] = 11
+        self.assertEqual(self.chore_redis.reader(), replica)
+
+        with mock.patch.object(self.chore_redis.redis, "get", side_effect=redis.ConnectionError("down")):
+            self.chore_redis.replica = None
+            self.assertRaises(redis.ConnectionError, self.chore_redis.get, "bump")
+
+    def test_key(self):
+
+        self.assertEqual(self.chore_redis.key("bump"), "/chore/bump")
+        self.assertEqual(self.chore_redis.key("bump", "history"), "/chore/bump/history")
+
+        self.chore_redis.prefix = "/house"
+        self.chore_redis.cluster = True
+
+        self.assertEqual(self.chore_redis.key("bump"), "/house/{bump}")
+        self.assertEqual(self.chore_redis.key("bump", "history"), "/house/{bump}/history")
+
+    def test_shared(self):
+
+        self.assertEqual(self.chore_redis.shared("archive"), "/chore-archive")
+        self.assertEqual(self.chore_redis.shared("stats", "kid", "*"), "/chore-stats/kid/*")
+
+        self.chore_redis.prefix = "/house"
+        self.assertEqual(self.chore_redis.shared("schedules", "morning", 7), "/house-schedules/morning/7")
+
+    def test_pipeline(self):
+
+        self.assertTrue(self.chore_redis.pipeline().transaction)
+
+        # A cluster can't MULTI across slots
+
+        self.chore_redis.cluster = True
+        self.assertFalse(self.chore_redis.pipeline().transaction)
+
+    def test_parse(self):
+
+        self.assertEqual(self.chore_redis.parse(b"/chore/bump"), "bump")
+        self.assertIsNone(self.chore_redis.parse("/chore/bump/history"))
+        self.assertIsNone(self.chore_redis.parse("/chore/"))
+        self.assertIsNone(self.chore_redis.parse("/chore-archive"))
+
+        self.chore_redis.cluster = True
+
+        self.assertEqual(self.chore_redis.parse("/chore/{bump}"), "bump")
+        self.assertIsNone(self.chore_redis.parse("/chore/{bump}/history"))
+        self.assertIsNone(self.chore_redis.parse("/chore/bump"))
+        self.assertIsNone(self.chore_redis.parse("/chore/{bump}{dump}"))
+
+    @mock.patch("chore_redis.time.time")
+    def test_now(self, mock_time):
+
+        mock_time.return_value = 7
+
+        self.assertEqual(self.chore_redis.now(), 7)
+
+        self.chore_redis.clock = lambda: 8
+
+        self.assertEqual(self.chore_redis.now(), 8)
+
+    def test_set(self):
+
+        chore = {
+            "id": "bump",
+            "node": "bump",
+            "person": "kid",
+            "text": "things",
+            "language": "en"
+        }
+
+        self.chore_redis.set(chore)
+
+        self.assertEqual(self.chore_redis.redis.data, {
+            "/chore/bump": json.dumps(chore)
+        })
+
+    @mock.patch("chore_redis.time.time")
+    def test_set_event(self, mock_time):
+
+        mock_time.return_value = 7
+
+        self.chore_redis.events = "events"
+
+        chore = {
+            "id": "bump",
+            "node": "bump",
+            "person": "kid",
+            "text": "things",
+            "language": "en",
+            "tasks": [
+                {
+                    "id": 0,
+                    "start": 0,
+                    "end": 7
+                }
+            ]
+        }
+
+        self.chore_redis.set(chore, "next", chore["tasks"][0], {
+            "tasks": {
+                0: {
+                    "start": 0
+                }
+            }
+        })
+
+        self.assertEqual(json.loads(self.chore_redis.redis.data["/chore/bump"]), chore)
+        self.assertEqual(json.loads(self.chore_redis.redis.events[0]), {
+            "timestamp": 7,
+            "id": "bump",
+            "node": "bump",
+            "action": "next",
+            "task": 0,
+            "diff": {
+                "tasks": {
+                    "0": {
+                        "end": 7
+                    }
+                }
+            }
+        })
+
+        self.chore_redis.set(chore)
+        self.assertEqual(len(self.chore_redis.redis.events), 1)
+
+    def test_set_ttl(self):
+
+        self.chore_redis.ttl = 60
+
+        chore = {
+            "id": "bump",
+            "node": "bump",
+            "text": "things"
+        }
+
+        self.chore_redis.set(chore)
+        self.assertEqual(self.chore_redis.redis.expires, {})
+
+        chore["end"] = 7
+
+        self.chore_redis.set(chore)
+        self.assertEqual(json.loads(self.chore_redis.redis.data["/chore/bump"]), chore)
+        self.assertEqual(self.chore_redis.redis.expires, {
+            "/chore/bump": 60
+        })
+
+    def test_set_archive(self):
+
+        self.chore_redis.archive = 2
+
+        for id in ["bump", "dump", "stump"]:
+            self.chore_redis.set({
+                "id": id,
+                "node": id,
+                "text": "things"
+            })
+            self.chore_redis.set({
+                "id": id,
+                "node": id,
+                "text": "things",
+                "end": 7
+            })
+
+        self.assertEqual(list(self.chore_redis.redis.data.keys()), ["/chore-archive"])
+        self.assertEqual(self.chore_redis.archived(), [
+            {
+                "id": "stump",
+                "node": "stump",
+                "text": "things",
+                "end": 7
+            },
+            {
+                "id": "dump",
+                "node": "dump",
+                "text": "things",
+                "end": 7
+            }
+        ])
+        self.assertEqual(self.chore_redis.archived(1, 1), [
+            {
+                "id": "dump",
+                "node": "dump",
+                "text": "things",
+                "end": 7
+            }
+        ])
+
+    def test_state(self):
+
+        self.assertEqual(self.chore_redis.state({
+            "id": "bump",
+            "text": "things",
+            "start": 1,
+            "notified": 2,
+            "tasks": [
+                {
+                    "id": 0,
+                    "text": "do it",
+                    "start": 1,
+                    "end": 2,
+                    "paused": False,
+                    "skipped": True
+                },
+                {
+                    "id": 1,
+                    "text": "next it"
+                }
+            ]
+        }), {
+            "start": 1,
+            "notified": 2,
+            "tasks": {
+                0: {
+                    "start": 1,
+                    "end": 2,
+                    "paused": False,
+                    "skipped": True
+                },
+                1: {}
+            }
+        })
+
+    def test_diff(self):
+
+        self.assertEqual(self.chore_redis.diff({
+            "end": 1,
+            "tasks": {
+                0: {"start": 1, "end": 1},
+                1: {"start": 1}
+            }
+        }, {
+            "start": 1,
+            "tasks": {
+                0: {"start": 1},
+                1: {"start": 1}
+            }
+        }), {
+            "start": 1,
+            "end": None,
+            "tasks": {
+                0: {"end": None}
+            }
+        })
+
+        self.assertEqual(self.chore_redis.diff({}, {}), {})
+
+    @mock.patch("chore_redis.time.time")
+    def test_event(self, mock_time):
+
+        mock_time.return_value = 7
+
+        chore = {
+            "id": "bump",
+            "node": "bump",
+            "person": "kid",
+            "text": "things",
+            "language": "en",
+            "start": 7,
+            "tasks": []
+        }
+
+        pipeline = self.chore_redis.redis.pipeline()
+
+        self.chore_redis.event(pipeline, chore, "create", None, {"start": 7})
+        pipeline.execute()
+        self.assertEqual(self.chore_redis.redis.events, [])
+
+        self.chore_redis.events = "events"
+
+        self.chore_redis.event(pipeline, chore, "create", None, {"start": 7})
+        pipeline.execute()
+        self.assertEqual(json.loads(self.chore_redis.redis.events[0]), {
+            "timestamp": 7,
+            "id": "bump",
+            "node": "bump",
+            "action": "create",
+            "task": None,
+            "diff": {
+                "start": 7
+            }
+        })
+
+    @mock.patch("chore_redis.time.time")
+    def test_record(self, mock_time):
+
+        mock_time.return_value = 7
+
+        chore = {
+            "id": "bump",
+            "node": "bump",
+            "tasks": [
+                {
+                    "id": 0
+                }
+            ]
+        }
+
+        pipeline = self.chore_redis.redis.pipeline()
+
+        self.chore_redis.record(pipeline, chore, "create", None, {"start": 7})
+        pipeline.execute()
+        self.assertEqual(self.chore_redis.redis.streams, {})
+
+        self.chore_redis.history = 2
+
+        for action in ["create", "next", "remind"]:
+            self.chore_redis.record(pipeline, chore, action, chore["tasks"][0], {"end": 7})
+        pipeline.execute()
+
+        self.assertEqual(self.chore_redis.redis.streams, {
+            "/chore/bump/history": [
+                [b"1000-0", [b"timestamp", b"7", b"action", b"next", b"task", b"0", b"diff", b'{"end": 7}']],
+                [b"2000-0", [b"timestamp", b"7", b"action", b"remind", b"task", b"0", b"diff", b'{"end": 7}']]
+            ]
+        })
+
+    def test_tally(self):
+
+        chore = {
+            "id": "bump",
+            "person": "kid",
+            "text": "stuff",
+            "tasks": [
+                {
+                    "id": 0,
+                    "text": "do it",
+                    "start": 1,
+                    "end": 4
+                }
+            ]
+        }
 
-class MockRedis(object):
+        pipeline = self.chore_redis.redis.pipeline()
 
-    def __init__(self, host, port):
+        self.chore_redis.tally(pipeline, chore, "complete", chore["tasks"][0])
+        self.chore_redis.tally(pipeline, chore, "remind", chore["tasks"][0])
+        pipeline.execute()
 
-        self.host = host
-        self.port = port
-        self.channel = None
+        for key in ["/chore-stats/kid/stuff", "/chore-stats/kid/*", "/chore-stats/*/stuff", "/chore-stats/*/*"]:
+            self.assertEqual(self.chore_redis.redis.data[key], {
+                "do it/completed": 1,
+                "do it/duration": 3.0,
+                "do it/reminded": 1,
+                "*/completed": 1,
+                "*/duration": 3.0,
+                "*/reminded": 1
+            })
 
-        self.data = {}
-        self.messages = []
+    @mock.patch("chore_redis.time.time")
+    def test_stats(self, mock_time):
 
-    def publish(self, channel, message):
+        self.chore_redis.statistics = True
 
-        self.channel = channel
-        self.messages.append(message)
+        mock_time.return_value = 1
 
-    def set(self, key, value):
+        chore = self.chore_redis.create({
+            "text": "stuff",
+            "language": "en",
+            "tasks": [
+                {
+                    "text": "do it"
+                },
+                {
+                    "text": "skip it"
+                },
+                {
+                    "text": "next it"
+                }
+            ]
+        }, "kid", "bump")
 
-        self.data[key] = value
+        mock_time.return_value = 3
 
-    def get(self, key):
+        self.chore_redis.complete(chore, 0)
+        self.chore_redis.skip(chore, 1)
 
-        if key in self.data:
-            return self.data[key]
+        mock_time.return_value = 8
 
-        return None
+        self.chore_redis.next(chore)
 
-    def keys(self, pattern):
+        self.assertEqual(self.chore_redis.stats(person="kid"), {
+            "*": {
+                "completed": 2,
+                "duration": 7.0,
+                "average": 3.5,
+                "skipped": 1
+            },
+            "do it": {
+                "completed": 1,
+                "duration": 2.0,
+                "average": 2.0
+            },
+            "skip it": {
+                "skipped": 1
+            },
+            "next it": {
+                "completed": 1,
+                "duration": 5.0,
+                "average": 5.0
+            }
+        })
+        self.assertEqual(self.chore_redis.stats(), self.chore_redis.stats(template="stuff"))
+        self.assertEqual(self.chore_redis.stats(person="kid", template="things"), {})
 
-        for key in sorted(self.data.keys()):
-            if fnmatch.fnmatch(key, pattern):
-                yield key.encode('utf-8')
+    @mock.patch("chore_redis.time.time")
+    def test_transitions(self, mock_time):
 
-class TestChoreRedis(unittest.TestCase):
+        mock_time.return_value = 7
 
-    maxDiff = None
+        self.chore_redis.history = 10
 
-    @mock.patch("redis.StrictRedis", MockRedis)
-    def setUp(self):
+        chore = {
+            "id": "bump",
+            "node": "bump",
+            "person": "kid",
+            "text": "stuff",
+            "language": "en",
+            "tasks": [
+                {
+                    "id": 0,
+                    "text": "do it"
+                },
+                {
+                    "id": 1,
+                    "text": "next it"
+                }
+            ]
+        }
 
-        self.chore_redis = chore_redis.ChoreRedis("data.com", 667, "stuff")
+        self.chore_redis.set(chore, "create", None, {})
+        self.chore_redis.complete(chore, 0)
+        self.chore_redis.pause(chore, 1)
+
+        self.assertEqual(list(self.chore_redis.transitions("bump", batch=2)), [
+            [
+                {
+                    "id": "0-0",
+                    "timestamp": 7.0,
+                    "action": "create",
+                    "task": None,
+                    "diff": {
+                        "tasks": {
+                            "0": {},
+                            "1": {}
+                        }
+                    }
+                },
+                {
+                    "id": "1000-0",
+                    "timestamp": 7.0,
+                    "action": "complete",
+                    "task": 0,
+                    "diff": {
+                        "tasks": {
+                            "0": {
+                                "start": 7,
+                                "end": 7,
+                                "notified": 7
+                            },
+                            "1": {
+                                "start": 7,
+                                "notified": 7
+                            }
+                        }
+                    }
+                }
+            ],
+            [
+                {
+                    "id": "2000-0",
+                    "timestamp": 7.0,
+                    "action": "pause",
+                    "task": 1,
+                    "diff": {
+                        "tasks": {
+                            "1": {
+                                "paused": True
+                            }
+                        }
+                    }
+                }
+            ]
+        ])
 
-    def test___init___(self):
+        self.assertEqual(
+            [entry["action"] for batch in self.chore_redis.transitions("bump", start=1, end=2) for entry in batch],
+            ["complete", "pause"]
+        )
+        self.assertEqual(list(self.chore_redis.transitions("dump")), [])
 
-        self.assertEqual(self.chore_redis.redis.host, "data.com")
-        self.assertEqual(self.chore_redis.redis.port, 667)
-        self.assertEqual(self.chore_redis.channel, "stuff")
+    @mock.patch("chore_redis.threading.Timer")
+    def test_set_coalesce(self, mock_timer):
 
-    def test_set(self):
+        self.chore_redis.coalesce = 0.5
+        self.chore_redis.events = "events"
 
         chore = {
             "id": "bump",
             "node": "bump",
             "person": "kid",
             "text": "things",
-            "language": "en"
+            "language": "en",
+            "tasks": []
         }
 
+        self.chore_redis.set(chore, "create")
+        chore["text"] = "stuff"
+        self.chore_redis.set(chore)
+
+        # Nothing's written, but the event went right away
+
+        self.assertEqual(self.chore_redis.redis.data, {})
+        self.assertEqual(len(self.chore_redis.redis.events), 1)
+        self.assertEqual(self.chore_redis.dirty, {"bump": json.dumps(chore)})
+        mock_timer.assert_called_once_with(0.5, self.chore_redis.flushing)
+        mock_timer.return_value.start.assert_called_once_with()
+
+        self.assertEqual(self.chore_redis.get("bump"), chore)
+        self.assertEqual(self.chore_redis.get_many(["bump", "dump"]), [chore, None])
+
+        executes = self.chore_redis.redis.executes
+
+        self.assertEqual(self.chore_redis.flush(), 1)
+
+        self.assertEqual(self.chore_redis.redis.executes, executes + 1)
+        self.assertEqual(self.chore_redis.redis.data, {
+            "/chore/bump": json.dumps(chore)
+        })
+        self.assertEqual(self.chore_redis.dirty, {})
+        self.assertIsNone(self.chore_redis.timer)
+        mock_timer.return_value.cancel.assert_called_once_with()
+
+        self.assertEqual(self.chore_redis.flush(), 0)
+        self.assertEqual(self.chore_redis.redis.executes, executes + 1)
+
+        # What's waiting is as it was when set
+
         self.chore_redis.set(chore)
+        chore["text"] = "changed"
+
+        self.assertEqual(self.chore_redis.get("bump")["text"], "stuff")
+
+        # If Redis is down, they're kept and the timer's started again
+
+        mock_timer.reset_mock()
+
+        with mock.patch.object(MockPipeline, "execute", side_effect=redis.ConnectionError("down")):
+            self.assertRaises(redis.ConnectionError, self.chore_redis.flush)
+            self.chore_redis.flushing()
+
+        self.assertEqual(json.loads(self.chore_redis.dirty["bump"])["text"], "stuff")
+        self.assertEqual(mock_timer.call_count, 2)
+        self.assertIsNotNone(self.chore_redis.timer)
+
+    def test_batch(self):
+
+        chore = {
+            "id": "bump",
+            "node": "bump",
+            "person": "kid",
+            "text": "things",
+            "language": "en"
+        }
+
+        with self.chore_redis.batch() as pipeline:
 
+            self.assertEqual(self.chore_redis.pipe, pipeline)
+
+            with self.chore_redis.batch() as inner:
+                self.assertEqual(inner, pipeline)
+                self.chore_redis.speak(chore, "hi")
+
+            self.chore_redis.set(chore)
+
+            self.assertEqual(self.chore_redis.redis.data, {})
+            self.assertEqual(self.chore_redis.redis.messages, [])
+
+        self.assertIsNone(self.chore_redis.pipe)
+        self.assertEqual(self.chore_redis.redis.executes, 1)
         self.assertEqual(self.chore_redis.redis.data, {
             "/chore/bump": json.dumps(chore)
         })
+        self.assertEqual(len(self.chore_redis.redis.messages), 1)
+
+        def fail():
+            with self.chore_redis.batch():
+                self.chore_redis.set(chore)
+                raise Exception("whoops")
+
+        self.assertRaisesRegex(Exception, "whoops", fail)
+        self.assertIsNone(self.chore_redis.pipe)
+        self.assertEqual(self.chore_redis.redis.executes, 1)
 
     def test_get(self):
 
@@ -86,6 +1014,30 @@ class TestChoreRedis(unittest.TestCase):
 
         self.assertIsNone(self.chore_redis.get("dump"))
 
+    def test_get_many(self):
+
+        chore = {
+            "id": "bump",
+            "node": "bump",
+            "person": "kid",
+            "text": "things",
+            "language": "en"
+        }
+
+        self.chore_redis.redis.data["/chore/bump"] = json.dumps(chore)
+
+        self.assertEqual(self.chore_redis.get_many(["dump", "bump"]), [None, chore])
+        self.assertEqual(self.chore_redis.get_many([]), [])
+
+        # In a cluster, pipelined rather than MGET across slots
+
+        self.chore_redis.cluster = True
+        self.chore_redis.redis.data["/chore/{bump}"] = json.dumps(chore)
+        self.chore_redis.redis.executes = 0
+
+        self.assertEqual(self.chore_redis.get_many(["dump", "bump"]), [None, chore])
+        self.assertEqual(self.chore_redis.redis.executes, 1)
+
     @mock.patch("chore_redis.time.time")
     def test_speak(self, mock_time):
 
@@ -109,6 +1061,121 @@ class TestChoreRedis(unittest.TestCase):
             "language": "en"
         })
 
+        # Keys don't matter unless deduplicating
+
+        self.chore_redis.speak(chore, "hi", "remind/0/1")
+        self.assertEqual(len(self.chore_redis.redis.messages), 2)
+
+        self.chore_redis.idempotency = 5
+
+        self.chore_redis.speak(chore, "hi", "remind/0/1")
+        self.chore_redis.speak(chore, "hi", "remind/0/1")
+        self.chore_redis.speak(chore, "hi")
+
+        self.assertEqual(len(self.chore_redis.redis.messages), 4)
+        self.assertEqual(self.chore_redis.redis.expires["/chore/bump/spoken/remind/0/1"], 5)
+
+    def test_speak_pipeline(self):
+
+        # Wrapped so redis-py can't tell it's a pipeline, the script's still
+        # loaded before it runs, then run by its SHA1
+
+        chores = chore_redis.ChoreRedis(None, None, "stuff", backend=redis.StrictRedis(),
+                                        resilience=chore_resilience.Resilience(), hooks=[chore_hooks.Hook()])
+        chores.idempotency = 5
+
+        chores.pipe = chores.redis.pipeline()
+        chores.speak({"id": "bump", "node": "bump", "person": "kid", "language": "en"}, "hi", "remind/0/1")
+
+        pipeline = chores.pipe.pipeline.pipeline
+
+        self.assertEqual(pipeline.scripts, set([chores.publish_once]))
+        self.assertEqual(pipeline.command_stack[0][0][:4], ("EVALSHA", chores.publish_once.sha, 1, "/chore/bump/spoken/remind/0/1"))
+
+    def test_task(self):
+
+        chore = {
+            "id": "bump",
+            "tasks": [
+                {"id": "wake", "text": "wake up"},
+                {"id": 0, "text": "brush teeth"},
+                {"text": "get dressed"}
+            ]
+        }
+
+        self.assertEqual(self.chore_redis.task(chore, "wake")["text"], "wake up")
+        self.assertEqual(self.chore_redis.indexes, {"bump": (3, {"wake": 0, 0: 1, 2: 2})})
+
+        # Ids win over positions
+
+        self.assertEqual(self.chore_redis.task(chore, 0)["text"], "brush teeth")
+        self.assertEqual(self.chore_redis.task(chore, 2)["text"], "get dressed")
+
+        # If the tasks moved, it notices
+
+        chore["tasks"].reverse()
+
+        self.assertEqual(self.chore_redis.task(chore, "wake")["text"], "wake up")
+        self.assertEqual(self.chore_redis.indexes["bump"], (3, {"wake": 2, 0: 1}))
+
+        # Else it's a position, remembered as not being an id
+
+        self.assertEqual(self.chore_redis.task(chore, 1)["text"], "brush teeth")
+        self.assertEqual(self.chore_redis.indexes["bump"], (3, {"wake": 2, 0: 1, 1: None}))
+
+        indexes = self.chore_redis.indexes["bump"]
+
+        self.assertEqual(self.chore_redis.task(chore, 1)["text"], "brush teeth")
+        self.assertIs(self.chore_redis.indexes["bump"], indexes)
+
+        self.assertRaises(IndexError, self.chore_redis.task, chore, 3)
+
+        # Forgotten once it's done
+
+        chore["end"] = 7
+        self.chore_redis.write(self.chore_redis.redis.pipeline(), chore)
+
+        self.assertEqual(self.chore_redis.indexes, {})
+
+    @mock.patch("chore_redis.time.time")
+    def test_phrase(self, mock_time):
+
+        mock_time.return_value = 7
+
+        chore = {
+            "id": "bump",
+            "node": "bump",
+            "person": "niña",
+            "text": "prepararte",
+            "language": "es"
+        }
+
+        self.assertEqual(self.chore_redis.phrase(chore, "start", chore["text"]), "es hora de prepararte")
+
+        self.chore_redis.speak(chore, self.chore_redis.phrase(chore, "start", chore["text"]))
+
+        self.assertEqual(json.loads(self.chore_redis.redis.messages[0]), {
+            "timestamp": 7,
+            "node": "bump",
+            "text": "niña, es hora de prepararte",
+            "language": "es"
+        })
+
+    def test_utterance(self):
+
+        before = {
+            "notified": 1,
+            "tasks": {
+                0: {
+                    "notified": 2
+                }
+            }
+        }
+
+        self.assertEqual(self.chore_redis.utterance(before, "incomplete"), "incomplete//1")
+        self.assertEqual(self.chore_redis.utterance(before, "remind", {"id": 0}), "remind/0/2")
+        self.assertEqual(self.chore_redis.utterance({}, "remind", {"id": 1}), "remind/1/None")
+
     def test_list(self):
 
         self.chore_redis.set({
@@ -148,6 +1215,107 @@ class TestChoreRedis(unittest.TestCase):
             }
         ])
 
+    def test_list_shards(self):
+
+        shards = [MockRedis("one.com", 667), MockRedis("two.com", 667)]
+
+        chores = chore_redis.ChoreRedis(None, None, "stuff", backend=MockRedis("data.com", 667),
+                                        cluster=True, shards=shards)
+
+        shards[0].data["/chore/{bump}"] = json.dumps({"id": "bump"})
+        shards[0].data["/chore/{bump}/history"] = "stream"
+        shards[1].data["/chore/{dump}"] = json.dumps({"id": "dump"})
+        shards[1].data["/chore/{stump}"] = json.dumps({"id": "stump"})
+
+        self.assertEqual(chores.list(), [{"id": "bump"}, {"id": "dump"}, {"id": "stump"}])
+
+        with mock.patch("chore_redis.concurrent.futures.ThreadPoolExecutor",
+                        wraps=concurrent.futures.ThreadPoolExecutor) as pool:
+            self.assertEqual(chores.ids(), ["bump", "dump", "stump"])
+
+        pool.assert_called_once_with(2)
+
+        # A cluster needs a client that knows it's one
+
+        self.assertRaisesRegex(ValueError, "cluster aware client", chore_redis.ChoreRedis,
+                               "data.com", 667, "stuff", cluster=True)
+
+        self.assertEqual(len(chores.scan(shards[1], batch=1)), 2)
+
+    @mock.patch("chore_redis.time.time")
+    def test_remind_all(self, mock_time):
+
+        mock_time.return_value = 7
+
+        for node in ["bump", "dump", "stump"]:
+            self.chore_redis.set({
+                "id": node,
+                "node": node,
+                "person": "kid",
+                "text": "people",
+                "language": "en",
+                "tasks": [
+                    {
+                        "id": 0,
+                        "text": "do it",
+                        "start": 0,
+                        "notified": 0 if node != "dump" else 7,
+                        "interval": 5
+                    }
+                ]
+            })
+
+        self.chore_redis.redis.executes = 0
+
+        self.assertEqual(self.chore_redis.remind_all(batch=2), 2)
+        self.assertEqual(self.chore_redis.redis.executes, 2)
+        self.assertEqual(self.chore_redis.get("stump")["tasks"][0]["notified"], 7)
+        self.assertEqual(len(self.chore_redis.redis.messages), 2)
+
+        mock_time.return_value = 13
+
+        self.assertEqual(self.chore_redis.remind_all(workers=3, batch=1), 3)
+        self.assertEqual(self.chore_redis.redis.executes, 5)
+
+    @mock.patch("chore_redis.time.time")
+    def test_remind_due(self, mock_time):
+
+        mock_time.return_value = 20
+
+        for node, text, notified in [
+            ("bump", "chores", 10), ("dump", "chores", 0), ("stump", "homework", 10), ("lump", "chores", 20)
+        ]:
+            self.chore_redis.set({
+                "id": node,
+                "node": node,
+                "person": "kid",
+                "text": text,
+                "language": "en",
+                "tasks": [
+                    {
+                        "id": 0,
+                        "text": "do it",
+                        "start": 0,
+                        "notified": notified,
+                        "interval": 5
+                    }
+                ]
+            })
+
+        # Homework 5 late times 4 beats chores 15 late
+
+        self.assertEqual(self.chore_redis.remind_due(budget=1, priorities={"homework": 4}), 1)
+        self.assertEqual(self.chore_redis.get("stump")["tasks"][0]["notified"], 20)
+        self.assertEqual(self.chore_redis.get("dump")["tasks"][0]["notified"], 0)
+
+        self.assertEqual(self.chore_redis.remind_due(budget=1), 1)
+        self.assertEqual(self.chore_redis.get("dump")["tasks"][0]["notified"], 20)
+
+        self.assertEqual(self.chore_redis.remind_due(batch=1), 1)
+        self.assertEqual(self.chore_redis.get("bump")["tasks"][0]["notified"], 20)
+
+        self.assertEqual(self.chore_redis.remind_due(), 0)
+
     @mock.patch("chore_redis.time.time")
     def test_check(self, mock_time):
 
@@ -393,6 +1561,126 @@ class TestChoreRedis(unittest.TestCase):
             "language": "en"
         })
 
+    @mock.patch("chore_redis.time.time")
+    def test_create_many(self, mock_time):
+
+        mock_time.return_value = 7
+
+        template = {
+            "text": "get ready",
+            "language": "en",
+            "tasks": [
+                {
+                    "text": "wake up"
+                }
+            ]
+        }
+
+        chores = self.chore_redis.create_many(template, [
+            ("kid", "bump"),
+            ("kid", "dump"),
+            ("adult", "stump")
+        ], chunk=2)
+
+        self.assertEqual([chore["id"] for chore in chores], ["bump", "dump", "stump"])
+        self.assertEqual(chores[2], {
+            "id": "stump",
+            "person": "adult",
+            "node": "stump",
+            "text": "get ready",
+            "language": "en",
+            "start": 7,
+            "notified": 7,
+            "tasks": [
+                {
+                    "id": 0,
+                    "text": "wake up",
+                    "start": 7,
+                    "notified": 7
+                }
+            ]
+        })
+        self.assertEqual(self.chore_redis.list(), chores)
+        self.assertEqual(self.chore_redis.redis.executes, 2)
+        self.assertEqual(len(self.chore_redis.redis.messages), 6)
+        self.assertEqual(json.loads(self.chore_redis.redis.messages[5]), {
+            "timestamp": 7,
+            "node": "stump",
+            "text": "adult, please wake up",
+            "language": "en"
+        })
+        self.assertNotIn("id", template["tasks"][0])
+
+    @mock.patch("chore_redis.time.time")
+    def test_apply_batch(self, mock_time):
+
+        mock_time.return_value = 7
+
+        for node in ["bump", "dump"]:
+            self.chore_redis.set({
+                "id": node,
+                "node": node,
+                "person": "kid",
+                "text": "stuff",
+                "language": "en",
+                "tasks": [
+                    {
+                        "id": 0,
+                        "text": "do it",
+                        "start": 0
+                    },
+                    {
+                        "id": 1,
+                        "text": "next it"
+                    }
+                ]
+            })
+
+        executes = self.chore_redis.redis.executes
+
+        # The locks are held until the changes are sent
+
+        held = []
+        execute = MockPipeline.execute
+
+        def holding(pipeline):
+            held.append(set(self.chore_redis.local.held))
+            return execute(pipeline)
+
+        with mock.patch.object(MockPipeline, "execute", holding):
+            self.assertEqual(self.chore_redis.apply_batch([
+                ("bump", "next", []),
+                ("dump", "pause", [1]),
+                ("bump", "next", []),
+                ("stump", "next", []),
+                ("dump", "pause", [1])
+            ]), [True, True, True, None, False])
+
+        self.assertEqual(held, [{"bump", "dump", "stump"}])
+        self.assertEqual(self.chore_redis.local.held, set())
+        self.assertEqual(self.chore_redis.redis.executes, executes + 1)
+        self.assertIn("end", self.chore_redis.get("bump"))
+        self.assertTrue(self.chore_redis.get("dump")["tasks"][1]["paused"])
+        self.assertEqual([json.loads(message)["text"] for message in self.chore_redis.redis.messages], [
+            "kid, you did do it",
+            "kid, please next it",
+            "kid, you do not have to next it yet",
+            "kid, you did next it",
+            "kid, thank you. You did stuff"
+        ])
+
+        self.assertRaisesRegex(ValueError, "unknown action set", self.chore_redis.apply_batch, [
+            ("bump", "next", []),
+            ("bump", "set", [])
+        ])
+        self.assertEqual(self.chore_redis.redis.executes, executes + 1)
+
+        # Any iterable will do
+
+        self.assertEqual(self.chore_redis.apply_batch(
+            (id, "pause", [1]) for id in ["dump", "stump"]
+        ), [False, None])
+
     @mock.patch("chore_redis.time.time")
     def test_remind(self, mock_time):
 
@@ -0,0 +1,219 @@
+import unittest
+import mock
+
+import redis
+
+import chore_redis
+import chore_backend
+import chore_metrics
+import chore_resilience
+
+class FlakyBackend(chore_backend.MemoryBackend):
+
+    def __init__(self):
+
+        super(FlakyBackend, self).__init__()
+        self.down = 0
+        self.calls = 0
+
+    def flake(self):
+
+        self.calls += 1
+
+        if self.down:
+            self.down -= 1
+            raise redis.ConnectionError("down")
+
+    def get(self, key):
+
+        self.flake()
+        return super(FlakyBackend, self).get(key)
+
+    def publish(self, channel, message):
+
+        self.flake()
+        return super(FlakyBackend, self).publish(channel, message)
+
+    def scan(self, cursor=0, match=None, count=None):
+
+        self.flake()
+        return super(FlakyBackend, self).scan(cursor, match, count)
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+
+        self.now = 0
+        self.registry = chore_metrics.Registry()
+        self.breaker = chore_resilience.CircuitBreaker(2, 10, lambda: self.now,
+                                                       self.registry.gauge("state", "State"))
+
+    def test_breaker(self):
+
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertEqual(self.registry.metrics["state"].values, {(): 0})
+
+        self.breaker.allow()
+        self.breaker.failure()
+        self.breaker.allow()
+        self.breaker.failure()
+
+        self.assertEqual(self.breaker.state, "open")
+        self.assertEqual(self.registry.metrics["state"].values, {(): 2})
+        self.assertRaisesRegex(chore_resilience.CircuitOpen, "open", self.breaker.allow)
+
+        # After the reset, one gets to try
+
+        self.now = 10
+
+        self.breaker.allow()
+        self.assertEqual(self.breaker.state, "half_open")
+        self.assertEqual(self.registry.metrics["state"].values, {(): 1})
+        self.assertRaises(chore_resilience.CircuitOpen, self.breaker.allow)
+
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state, "open")
+        self.assertEqual(self.breaker.opened, 10)
+
+        self.now = 20
+
+        self.breaker.allow()
+        self.breaker.success()
+
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertEqual(self.breaker.failed, 0)
+        self.assertEqual(self.registry.metrics["state"].values, {(): 0})
+        self.breaker.allow()
+
+    def test_circuit_open(self):
+
+        self.assertTrue(issubclass(chore_resilience.CircuitOpen, redis.ConnectionError))
+
+class TestResilience(unittest.TestCase):
+
+    def setUp(self):
+
+        self.sleeps = []
+        self.backend = FlakyBackend()
+        self.resilience = chore_resilience.Resilience(retries=2, backoff=0.1, cap=0.15, failures=4,
+                                                      sleep=self.sleeps.append)
+        self.chore_redis = chore_redis.ChoreRedis(None, None, "stuff", backend=self.backend,
+                                                  resilience=self.resilience)
+
+    @mock.patch("chore_resilience.random.uniform")
+    def test_delay(self, mock_uniform):
+
+        mock_uniform.side_effect = lambda low, high: high
+
+        self.assertEqual(self.resilience.delay(0), 0.1)
+        self.assertEqual(self.resilience.delay(1), 0.15)
+
+    def test_reads(self):
+
+        self.assertIsInstance(self.chore_redis.redis, chore_resilience.ResilientRedis)
+        self.assertEqual(self.chore_redis.redis.data, {})
+
+        self.backend.down = 2
+        self.assertIsNone(self.chore_redis.get("bump"))
+        self.assertEqual(self.backend.calls, 3)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertEqual(self.resilience.breakers["primary"].state, "closed")
+
+        self.backend.down = 3
+        self.assertRaisesRegex(redis.ConnectionError, "down", self.chore_redis.get, "bump")
+        self.assertEqual(self.backend.calls, 6)
+
+        # Fourth failure in a row opens it, so it doesn't even try
+
+        self.backend.down = 1
+        self.assertRaises(chore_resilience.CircuitOpen, self.chore_redis.get, "bump")
+        self.assertEqual(self.backend.calls, 7)
+        self.assertRaises(chore_resilience.CircuitOpen, self.chore_redis.get, "bump")
+        self.assertEqual(self.backend.calls, 7)
+
+    def test_scan(self):
+
+        for index in range(3):
+            self.backend.set(f"/chore/node-{index}", "{}")
+
+        self.backend.down = 1
+
+        self.assertEqual(sorted(self.chore_redis.redis.scan_iter(match="/chore/*", count=2)), [
+            b"/chore/node-0", b"/chore/node-1", b"/chore/node-2"
+        ])
+        self.assertEqual(self.backend.calls, 3)
+        self.assertEqual(len(self.sleeps), 1)
+
+        self.backend.down = 3
+        self.assertRaises(redis.ConnectionError, self.chore_redis.list)
+        self.assertEqual(self.resilience.breakers["primary"].failed, 3)
+
+    def test_other_errors(self):
+
+        now = [0]
+        self.resilience.breakers["primary"].clock = lambda: now[0]
+        self.resilience.breakers["primary"].reset = 10
+
+        for failure in range(4):
+            self.resilience.breakers["primary"].failure()
+
+        self.assertEqual(self.resilience.breakers["primary"].state, "open")
+
+        # Redis answering the trial, even with an error, closes it again
+
+        now[0] = 11
+
+        with mock.patch.object(self.backend, "get", side_effect=redis.ResponseError("WRONGTYPE")):
+            self.assertRaises(redis.ResponseError, self.chore_redis.get, "bump")
+
+        self.assertEqual(self.resilience.breakers["primary"].state, "closed")
+        self.assertIsNone(self.chore_redis.get("bump"))
+
+    def test_breakers(self):
+
+        registry = chore_metrics.Registry()
+        resilience = chore_resilience.Resilience(retries=0, failures=1, registry=registry,
+                                                 sleep=self.sleeps.append)
+
+        replica = FlakyBackend()
+        shard = chore_backend.MemoryBackend()
+
+        chores = chore_redis.ChoreRedis(None, None, "stuff", backend=self.backend, replica=replica,
+                                        shards=[shard], resilience=resilience)
+
+        # The replica going down leaves the primary and shard be
+
+        replica.down = 1
+        self.assertIsNone(chores.get("bump"))
+
+        self.assertEqual(resilience.breakers["replica"].state, "open")
+        self.assertEqual(resilience.breakers["primary"].state, "closed")
+        self.assertEqual(resilience.breakers["shard-0"].state, "closed")
+        self.assertEqual(registry.metrics["chore_redis_breaker_state"].values, {
+            (("client", "primary"),): 0,
+            (("client", "replica"),): 2,
+            (("client", "shard-0"),): 0
+        })
+
+    def test_writes(self):
+
+        chore = {
+            "id": "bump",
+            "node": "bump",
+            "person": "kid",
+            "language": "en"
+        }
+
+        self.backend.down = 1
+        self.assertRaises(redis.ConnectionError, self.chore_redis.speak, chore, "hi")
+        self.assertEqual(self.backend.calls, 1)
+        self.assertEqual(self.sleeps, [])
+
+        self.chore_redis.speak(chore, "hi")
+        self.chore_redis.set(chore)
+        self.assertEqual(self.chore_redis.get("bump"), chore)
+
+        with mock.patch.object(chore_backend.MemoryPipeline, "execute", side_effect=redis.ConnectionError("down")):
+            self.assertRaises(redis.ConnectionError, self.chore_redis.set, chore)
+
+        self.assertEqual(self.resilience.breakers["primary"].failed, 1)
@@ -0,0 +1,183 @@
+import unittest
+import mock
+
+import json
+import threading
+
+import redis
+
+import chore_redis
+import chore_backend
+import chore_schedule
+
+class TestTimingWheel(unittest.TestCase):
+
+    def test_occurrence(self):
+
+        schedule = {"start": 100, "every": 10}
+
+        self.assertIsNone(chore_schedule.occurrence(schedule, 99))
+        self.assertEqual(chore_schedule.occurrence(schedule, 100), 100)
+        self.assertEqual(chore_schedule.occurrence(schedule, 125), 120)
+
+        self.assertEqual(chore_schedule.following(schedule, 0), 100)
+        self.assertEqual(chore_schedule.following(schedule, 100), 110)
+        self.assertEqual(chore_schedule.following(schedule, 125), 130)
+
+    def test_wheel(self):
+
+        wheel = chore_schedule.TimingWheel(slots=4, levels=2, current=0)
+
+        # Within the first wheel, the second, and past both
+
+        for deadline in [1, 3, 4, 6, 15, 16, 40]:
+            wheel.add(deadline, deadline)
+
+        wheel.add(0, "late")
+
+        fired = {}
+
+        for tick in range(1, 45):
+            for item in wheel.advance():
+                fired[item] = tick
+
+        self.assertEqual(fired, {"late": 1, 1: 1, 3: 3, 4: 4, 6: 6, 15: 15, 16: 16, 40: 40})
+        self.assertEqual(wheel.wheels, [[[], [], [], []], [[], [], [], []]])
+
+class TestScheduler(unittest.TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        self.now = 1000
+        self.backend = chore_backend.MemoryBackend()
+        self.chore_redis = chore_redis.ChoreRedis(None, None, "stuff", backend=self.backend,
+                                                  clock=lambda: self.now)
+        self.scheduler = chore_schedule.Scheduler(self.chore_redis, slots=8, levels=3)
+
+        self.template = {
+            "text": "get ready",
+            "language": "en",
+            "tasks": [
+                {
+                    "text": "wake up"
+                }
+            ]
+        }
+
+    def test_add_remove(self):
+
+        schedule = self.scheduler.add("morning", self.template, [("kid", "bump")], 60, start=30)
+
+        self.assertEqual(json.loads(self.backend.hgetall("/chore-schedules")[b"morning"]), schedule)
+        self.assertEqual(schedule["assignments"], [["kid", "bump"]])
+        self.assertEqual(self.scheduler.schedules, {"morning": schedule})
+
+        self.scheduler.remove("morning")
+
+        self.assertEqual(self.backend.hgetall("/chore-schedules"), {})
+        self.assertEqual(self.scheduler.schedules, {})
+
+        self.now = 1100
+        self.assertEqual(self.scheduler.tick(), 0)
+
+    def test_tick(self):
+
+        self.scheduler.add("morning", self.template, [("kid", "bump"), ("kid", "dump")], 60, start=30)
+
+        self.now = 1049
+        self.assertEqual(self.scheduler.tick(), 0)
+        self.assertIsNone(self.chore_redis.get("bump"))
+
+        self.now = 1050
+        self.assertEqual(self.scheduler.tick(), 2)
+        self.assertEqual(self.chore_redis.get("bump")["start"], 1050)
+
+        # Missing ticks still fires each time
+
+        self.now = 1200
+        self.assertEqual(self.scheduler.tick(), 4)
+
+    def test_restart(self):
+
+        self.scheduler.add("morning", self.template, [("kid", "bump")], 60, start=30)
+
+        self.now = 1050
+        self.assertEqual(self.scheduler.tick(), 1)
+
+        # Coming back right after doesn't fire again, but does catch up on what
+        # was missed while down
+
+        restarted = chore_schedule.Scheduler(self.chore_redis, slots=8, levels=3)
+        self.assertEqual(restarted.load(), 1)
+        self.assertEqual(restarted.tick(), 0)
+
+        self.now = 1115
+
+        restarted = chore_schedule.Scheduler(self.chore_redis, slots=8, levels=3)
+        restarted.load()
+        self.assertEqual(self.chore_redis.get("bump")["start"], 1115)
+
+        self.now = 1170
+        self.assertEqual(restarted.tick(), 1)
+
+        # Too long down, it just waits for next time
+
+        self.now = 1625
+
+        restarted = chore_schedule.Scheduler(self.chore_redis, slots=8, levels=3, grace=30)
+        restarted.load()
+        self.assertEqual(self.chore_redis.get("bump")["start"], 1170)
+
+    def test_sync(self):
+
+        elsewhere = chore_schedule.Scheduler(self.chore_redis, slots=8, levels=3)
+
+        elsewhere.add("morning", self.template, [("kid", "bump")], 60, start=30)
+        elsewhere.add("evening", self.template, [("kid", "dump")], 60, start=30)
+
+        self.assertEqual(self.scheduler.sync(), 2)
+
+        # Changed and removed elsewhere too
+
+        elsewhere.add("morning", self.template, [("kid", "stump")], 60, start=30)
+        elsewhere.remove("evening")
+
+        self.assertEqual(self.scheduler.sync(), 1)
+        self.assertEqual(self.scheduler.schedules["morning"]["assignments"], [["kid", "stump"]])
+
+        self.now = 1050
+        self.assertEqual(self.scheduler.tick(), 1)
+        self.assertIsNotNone(self.chore_redis.get("stump"))
+        self.assertIsNone(self.chore_redis.get("bump"))
+        self.assertIsNone(self.chore_redis.get("dump"))
+
+    def test_fire_failure(self):
+
+        self.scheduler.add("morning", self.template, [("kid", "bump")], 60, start=30)
+
+        self.now = 1050
+
+        with mock.patch.object(self.chore_redis, "create_many", side_effect=redis.ConnectionError("down")):
+            with self.assertLogs("chore_schedule", "ERROR"):
+                self.assertEqual(self.scheduler.tick(), 0)
+
+        self.assertNotIn("/chore-schedules/morning/1050", self.backend.data)
+
+        # Tried again next tick
+
+        self.now = 1051
+        self.assertEqual(self.scheduler.tick(), 1)
+        self.assertEqual(self.chore_redis.get("bump")["start"], 1051)
+        self.assertIn("/chore-schedules/morning/1050", self.backend.data)
+
+    def test_run(self):
+
+        stop = threading.Event()
+        stop.set()
+
+        self.scheduler.add("morning", self.template, [("kid", "bump")], 60, start=1000)
+        self.scheduler.run(stop)
+
+        self.assertEqual(self.chore_redis.get("bump")["start"], 1000)
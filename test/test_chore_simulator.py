@@ -0,0 +1,66 @@
+import unittest
+
+import chore_simulator
+
+class TestChoreSimulator(unittest.TestCase):
+
+    maxDiff = None
+
+    def test_clock(self):
+
+        clock = chore_simulator.VirtualClock(5)
+
+        self.assertEqual(clock(), 5)
+
+        clock.advance(7)
+        self.assertEqual(clock(), 7)
+
+        clock.advance(6)
+        self.assertEqual(clock(), 7)
+
+    def test_percentile(self):
+
+        self.assertEqual(chore_simulator.percentile([], 0.5), 0)
+        self.assertEqual(chore_simulator.percentile([3, 1, 2], 0.5), 2)
+        self.assertEqual(chore_simulator.percentile([3, 1, 2], 0.99), 3)
+
+    def test_due(self):
+
+        due = chore_simulator.Simulator.due
+
+        self.assertIsNone(due({"tasks": [{"start": 0, "end": 1}]}))
+        self.assertIsNone(due({"tasks": [{"start": 0, "notified": 0}]}))
+        self.assertIsNone(due({"tasks": [{"start": 0, "notified": 0, "interval": 5, "paused": True}]}))
+        self.assertEqual(due({"tasks": [{"start": 0, "notified": 0, "interval": 5}]}), 5)
+        self.assertEqual(due({"tasks": [{"start": 0, "notified": 0, "interval": 5, "delay": 8}]}), 8)
+
+    def test_run(self):
+
+        simulator = chore_simulator.Simulator({
+            "text": "get ready",
+            "language": "en",
+            "tasks": [
+                {
+                    "text": "wake up",
+                    "interval": 15
+                },
+                {
+                    "text": "get dressed",
+                    "interval": 15
+                }
+            ]
+        }, 20, sweep=10, pace=60, seed=1)
+
+        report = simulator.run(600)
+
+        self.assertEqual(report["nodes"], 20)
+        self.assertEqual(report["virtual_seconds"], 600)
+        self.assertEqual(report["operations"]["create"], 20)
+        self.assertEqual(report["operations"]["list"], 60)
+        self.assertEqual(report["operations"]["next"], 40)
+        self.assertGreater(report["reminders"], 0)
+        self.assertGreaterEqual(report["lateness"]["p50"], 0)
+        self.assertLessEqual(report["lateness"]["max"], 10)
+        self.assertGreater(report["redis"]["commands"], report["redis"]["round_trips"] - 1)
+        self.assertEqual(simulator.clock(), 600)
+        self.assertTrue(all("end" in chore for chore in simulator.chore_redis.list()))
@@ -0,0 +1,89 @@
+import unittest
+import mock
+
+import concurrent.futures
+
+import chore_redis
+import chore_backend
+import chore_sweep
+
+class TestChoreSweep(unittest.TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        self.backend = chore_backend.MemoryBackend()
+        self.chore_redis = chore_redis.ChoreRedis(None, None, "stuff", backend=self.backend)
+
+        for index in range(10):
+            self.chore_redis.set({
+                "id": f"node-{index}",
+                "node": f"node-{index}",
+                "person": "kid",
+                "text": "stuff",
+                "language": "en",
+                "tasks": [
+                    {
+                        "id": 0,
+                        "text": "do it",
+                        "start": 0,
+                        "notified": 0,
+                        "interval": 5
+                    }
+                ]
+            })
+
+    def factory(self):
+
+        return self.chore_redis
+
+    def test_partition(self):
+
+        self.assertEqual(chore_sweep.partition("node-0", 1), 0)
+        self.assertEqual(chore_sweep.partition("node-0", 3), chore_sweep.partition("node-0", 3))
+        self.assertEqual(
+            sorted(set(chore_sweep.partition(f"node-{index}", 3) for index in range(10))),
+            [0, 1, 2]
+        )
+
+    def test_remind(self):
+
+        ids = [f"node-{index}" for index in range(10)] + ["gone"]
+
+        results = [chore_sweep.remind(self.factory, index, ids[index::3], batch=2) for index in range(3)]
+
+        self.assertEqual([result["partition"] for result in results], [0, 1, 2])
+        self.assertEqual(sum(result["chores"] for result in results), 11)
+        self.assertEqual(sum(result["reminded"] for result in results), 10)
+
+        self.assertEqual(chore_sweep.remind(self.factory, 0, ids)["reminded"], 0)
+
+    def test_remind_once(self):
+
+        ids = [f"node-{index}" for index in range(10)]
+
+        # Each chore's got and decoded just the once
+
+        with mock.patch.object(chore_redis.json, "loads", wraps=chore_redis.json.loads) as loads:
+            self.assertEqual(chore_sweep.remind(self.factory, 0, ids)["reminded"], 10)
+
+        self.assertEqual(loads.call_count, 10)
+
+    @mock.patch("chore_sweep.concurrent.futures.ProcessPoolExecutor", concurrent.futures.ThreadPoolExecutor)
+    def test_sweep(self):
+
+        # Only the parent scans
+
+        with mock.patch.object(self.backend, "scan_iter", wraps=self.backend.scan_iter) as scan_iter:
+            result = chore_sweep.sweep(self.factory, processes=2)
+
+        scan_iter.assert_called_once_with(match="/chore/*", count=100)
+
+        self.assertEqual(result["chores"], 10)
+        self.assertEqual(result["reminded"], 10)
+        self.assertEqual(len(result["partitions"]), 2)
+        self.assertEqual(
+            sum(result["chores"] for result in result["partitions"]),
+            10
+        )
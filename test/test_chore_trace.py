@@ -0,0 +1,171 @@
+import unittest
+import tempfile
+import os
+import mock
+
+import json
+
+import chore_redis
+import chore_trace
+import chore_backend
+
+class TestChoreTrace(unittest.TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+
+        self.directory.cleanup()
+
+    def test_opener(self):
+
+        for name in ["trace.jsonl", "trace.jsonl.gz"]:
+
+            path = os.path.join(self.directory.name, name)
+
+            with chore_trace.opener(path, "w") as trace:
+                trace.write("hi\n")
+
+            with chore_trace.opener(path, "r") as trace:
+                self.assertEqual(trace.read(), "hi\n")
+
+        with open(os.path.join(self.directory.name, "trace.jsonl.gz"), "rb") as trace:
+            self.assertEqual(trace.read(2), b"\x1f\x8b")
+
+    def test_percentile(self):
+
+        self.assertEqual(chore_trace.percentile([1, 2, 3], 0.5), 2)
+        self.assertEqual(chore_trace.percentile([1, 2, 3], 0.99), 3)
+
+    def test_record_replay(self):
+
+        path = os.path.join(self.directory.name, "trace.jsonl.gz")
+
+        times = iter(range(10))
+        recorder = chore_trace.Recorder(path, clock=lambda: next(times))
+
+        recording = chore_redis.ChoreRedis(None, None, "speech", backend=chore_backend.MemoryBackend(),
+                                           hooks=[recorder])
+
+        chore = recording.create({
+            "text": "get ready",
+            "language": "en",
+            "tasks": [
+                {
+                    "text": "wake up"
+                },
+                {
+                    "text": "get dressed"
+                }
+            ]
+        }, "kid", "bump")
+
+        recording.pause(chore, 1)
+        recording.next(chore)
+        recording.get("bump")
+        recorder.close()
+
+        replayer = chore_trace.Replayer(path)
+
+        self.assertEqual([call[:2] for call in replayer.calls], [
+            [0, "create"],
+            [1, "pause"],
+            [2, "next"],
+            [3, "get"]
+        ])
+        self.assertEqual(replayer.calls[1][2], [{"chore": "bump"}, 1])
+
+        # Replaying gets to the same place, and can be done again
+
+        for attempt in range(2):
+
+            backend = chore_backend.MemoryBackend()
+            replaying = chore_redis.ChoreRedis(None, None, "speech", backend=backend)
+
+            report = replayer.replay(replaying)
+
+            self.assertEqual(
+                [sorted(task) for task in replaying.get("bump")["tasks"]],
+                [sorted(task) for task in recording.get("bump")["tasks"]]
+            )
+            self.assertEqual(report["calls"], 4)
+            self.assertEqual(report["missing"], 0)
+            self.assertEqual(report["traced_seconds"], 3)
+            self.assertEqual(sorted(report["methods"]), ["create", "get", "next", "pause"])
+            self.assertEqual(report["methods"]["next"]["count"], 1)
+            self.assertGreater(report["throughput"], 0)
+
+    def test_replay_missing(self):
+
+        path = os.path.join(self.directory.name, "trace.jsonl")
+
+        with open(path, "w") as trace:
+            trace.write(json.dumps([0, "next", [{"chore": "bump"}], {}]) + "\n\n")
+
+        report = chore_trace.Replayer(path).replay(
+            chore_redis.ChoreRedis(None, None, "speech", backend=chore_backend.MemoryBackend())
+        )
+
+        self.assertEqual(report["calls"], 0)
+        self.assertEqual(report["missing"], 1)
+        self.assertEqual(report["throughput"], 0.0)
+
+    def test_record_anything(self):
+
+        path = os.path.join(self.directory.name, "trace.jsonl")
+
+        recorder = chore_trace.Recorder(path, clock=lambda: 0)
+        recording = chore_redis.ChoreRedis(None, None, "speech", backend=chore_backend.MemoryBackend(),
+                                           hooks=[recorder])
+
+        # Generators are recorded as what they went through, so they replay
+
+        chores = recording.create_many({
+            "text": "get ready",
+            "language": "en",
+            "tasks": [
+                {
+                    "text": "wake up"
+                },
+                {
+                    "text": "get dressed"
+                }
+            ]
+        }, ((person, node) for person, node in zip(["kid", "kid"], ["bump", "dump"])))
+
+        self.assertEqual([chore["id"] for chore in chores], ["bump", "dump"])
+        self.assertEqual(recording.apply_batch((id, "next", []) for id in ["bump", "dump"]), [True, True])
+
+        # What JSON can't hold otherwise is its repr
+
+        recording.get(chore_redis)
+
+        # And failing to record doesn't break the call
+
+        recorder.clock = mock.MagicMock(side_effect=ValueError("no time"))
+
+        with self.assertLogs("chore_trace", "ERROR"):
+            self.assertEqual(recording.get("bump")["id"], "bump")
+
+        recorder.close()
+
+        replayer = chore_trace.Replayer(path)
+
+        self.assertEqual([call[1] for call in replayer.calls], ["create_many", "apply_batch", "get"])
+        self.assertEqual(replayer.calls[0][2][1], [["kid", "bump"], ["kid", "dump"]])
+        self.assertTrue(replayer.calls[2][2][0].startswith("<module 'chore_redis'"))
+
+        replaying = chore_redis.ChoreRedis(None, None, "speech", backend=chore_backend.MemoryBackend())
+        report = replayer.replay(replaying)
+
+        self.assertEqual(report["calls"], 3)
+
+        for id in ["bump", "dump"]:
+            self.assertEqual(
+                [sorted(task) for task in replaying.get(id)["tasks"]],
+                [sorted(task) for task in recording.get(id)["tasks"]]
+            )
@@ -0,0 +1,126 @@
+import unittest
+import mock
+
+import threading
+
+import redis
+
+import chore_redis
+import chore_backend
+import chore_watch
+
+class TestWatcher(unittest.TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        self.backend = chore_backend.MemoryBackend()
+        self.chore_redis = chore_redis.ChoreRedis(None, None, "stuff", backend=self.backend, history=10)
+
+        self.batches = []
+        self.received = threading.Event()
+
+    def handler(self, chores):
+
+        self.batches.append(chores)
+        self.received.set()
+
+    def test_notifications(self):
+
+        watcher = chore_watch.Watcher(self.chore_redis, self.handler)
+
+        watcher.notifications(self.backend)
+        self.assertEqual(self.backend.config["notify-keyspace-events"], "K$gx")
+
+        self.backend.config_set("notify-keyspace-events", "El")
+        watcher.notifications(self.backend)
+        self.assertEqual(self.backend.config["notify-keyspace-events"], "ElK$gx")
+
+        self.backend.config_set("notify-keyspace-events", "KA")
+        watcher.notifications(self.backend)
+        self.assertEqual(self.backend.config["notify-keyspace-events"], "KA")
+
+    def test_collect(self):
+
+        watcher = chore_watch.Watcher(self.chore_redis, self.handler, debounce=0.01, batch=2, timeout=0.01)
+
+        self.assertEqual(watcher.collect(), [])
+
+        for id in ["bump", "dump", "bump", "stump"]:
+            watcher.changed.put(id)
+
+        self.assertEqual(watcher.collect(), ["bump", "dump"])
+        self.assertEqual(watcher.collect(), ["bump", "stump"])
+
+    def test_watch(self):
+
+        watcher = self.chore_redis.watch(self.handler, debounce=0.05, timeout=0.01)
+
+        self.chore_redis.set({"id": "bump", "node": "bump"}, "create")
+        self.chore_redis.set({"id": "dump", "node": "dump"})
+        self.chore_redis.set({"id": "bump", "node": "bump", "text": "again"})
+
+        self.assertTrue(self.received.wait(1))
+        self.received.clear()
+
+        self.assertEqual(self.batches, [{
+            "bump": {"id": "bump", "node": "bump", "text": "again"},
+            "dump": {"id": "dump", "node": "dump"}
+        }])
+
+        # Gone is None, and other keys aren't chores
+
+        self.backend.set("/chore/bump/other", 1)
+        self.backend.delete("/chore/dump")
+
+        self.assertTrue(self.received.wait(1))
+        self.assertEqual(self.batches[-1], {"dump": None})
+
+        watcher.stop()
+
+        self.assertEqual(self.backend.subscribers, set())
+        self.assertEqual(watcher.threads, [])
+
+    def test_dispatch(self):
+
+        watcher = chore_watch.Watcher(self.chore_redis, self.handler, timeout=0.01)
+
+        self.chore_redis.set({"id": "bump", "node": "bump"})
+
+        # Can't fetch, so it's put back to try again
+
+        with mock.patch.object(self.chore_redis, "get_many", side_effect=redis.ConnectionError("down")):
+            with self.assertLogs("chore_watch", "WARNING"):
+                watcher.dispatch(["bump"])
+
+        self.assertEqual(watcher.collect(), ["bump"])
+        self.assertEqual(self.batches, [])
+
+        # The handler raising is just logged
+
+        watcher.handler = mock.MagicMock(side_effect=ValueError("oops"))
+
+        with self.assertLogs("chore_watch", "ERROR"):
+            watcher.dispatch(["bump"])
+
+        watcher.handler.assert_called_once_with({"bump": {"id": "bump", "node": "bump"}})
+
+    def test_resubscribe(self):
+
+        watcher = self.chore_redis.watch(self.handler, debounce=0.01, timeout=0.01)
+        lost = watcher.pubsubs[0]
+
+        with self.assertLogs("chore_watch", "WARNING"):
+            with mock.patch.object(lost, "get_message", side_effect=redis.ConnectionError("down")):
+                while watcher.pubsubs[0] is lost:
+                    self.received.wait(0.01)
+
+        self.chore_redis.set({"id": "bump", "node": "bump"})
+
+        self.assertTrue(self.received.wait(1))
+        self.assertEqual(self.batches, [{"bump": {"id": "bump", "node": "bump"}}])
+
+        watcher.stop()
+
+        self.assertEqual(self.backend.subscribers, set())
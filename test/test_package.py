@@ -0,0 +1,38 @@
+import unittest
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib")
+
+class TestPackage(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+
+        self.directory.cleanup()
+
+    def test_installed(self):
+
+        # Laid out like setup.py installs it, with only the package on the path
+
+        shutil.copytree(LIB, os.path.join(self.directory.name, "pi_k8s_fitches"),
+                        ignore=shutil.ignore_patterns("__pycache__"))
+
+        modules = sorted(name[:-3] for name in os.listdir(LIB) if name.startswith("chore_") and name.endswith(".py"))
+
+        result = subprocess.run(
+            [sys.executable, "-c", f"from pi_k8s_fitches import {', '.join(modules)}"],
+            cwd=self.directory.name,
+            env=dict(os.environ, PYTHONPATH=self.directory.name),
+            capture_output=True,
+            text=True
+        )
+
+        self.assertEqual(result.returncode, 0, result.stderr)